@@ -0,0 +1,102 @@
+"""
+Benchmarks the per-state work of the mechanism search over a directory of SiC-format reaction files:
+
+    python3 -m sic.benchmark reaction_files
+
+Every reactant and product set in the directory is set up the way get_mechanism sets up a state
+(canonical SMILES, explicit hydrogens, connectivity table), and then the analysis generate_choices does
+on each state before building any reactions (state_analysis: pKa assignment followed by segmentation) is timed.
+
+The analysis is timed twice: once with the compiled SMARTS patterns reused between states (how the search runs),
+and once with the pattern registry cleared before every state, i.e. paying for pybel.Smarts every time the
+way every state used to.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from openbabel import pybel
+
+from sic.brain import state_analysis
+from sic.sic_io import sic_io
+from sic.structure import connectivity_table, patterns
+
+def load_states(directory):
+    """
+    Returns a Molecule for every reactant and product set that parses in the SiC-format files under directory.
+    """
+
+    states = []
+    for path in sorted(Path(directory).rglob("*")):
+        if not path.is_file():
+            continue
+        try:
+            with open(path) as sic_input:
+                react_obj = sic_io.parse_sic_file(sic_input)
+            for side in ("reactants","products"):
+                if react_obj[side]:
+                    states.append(make_state(sic_io.create_state_smiles(react_obj[side])))
+        except (OSError,IndexError,ValueError) as e:
+            print("Skipping {}: {}".format(path,e))
+    return states
+
+def make_state(smiles):
+    """
+    Reads smiles into a Molecule prepared like the root state in get_mechanism.
+    """
+
+    mol = pybel.readstring("smi",smiles)
+    mol = pybel.readstring("smi",mol.write("can"))
+    mol.removeh()
+    mol.addh()
+    mol.connectivity_table = connectivity_table.ConnectivityTable(mol)
+    return mol
+
+def analyze_state(mol):
+    """
+    The part of generate_choices that looks at a state on its own.
+    """
+
+    return state_analysis.analyze_molecule(mol)
+
+def time_states(states,repeats,prepare=None):
+    """
+    Runs analyze_state over every state repeats times, calling prepare() before each state if given.
+    Returns the average time per state in milliseconds.
+    """
+
+    elapsed = 0.0
+    for i in range(repeats):
+        for mol in states:
+            if prepare:
+                prepare()
+            start = time.perf_counter()
+            analyze_state(mol)
+            elapsed += time.perf_counter() - start
+    return 1000.0 * elapsed / (repeats * len(states))
+
+def run(directory,repeats=20):
+    """
+    Runs the benchmark and returns {"states": number of states, "uncached": ms per state, "cached": ms per state}.
+    """
+
+    states = load_states(directory)
+    if not states:
+        raise ValueError("No reactions found in {}.".format(directory))
+    results = {"states": len(states)}
+    results["uncached"] = time_states(states,repeats,prepare=patterns.clear)
+    patterns.clear()
+    analyze_state(states[0]) #compile everything again before timing the normal case
+    results["cached"] = time_states(states,repeats)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time SiC³'s per-state analysis (pKa and segmentation) on SiC-format reaction files")
+    parser.add_argument("directory",help="Directory containing SiC-format input files, e.g. reaction_files")
+    parser.add_argument("-r","--repeats",type=int,default=20,help="Times to analyze every state")
+    args = parser.parse_args()
+    results = run(args.directory,args.repeats)
+    print("{} states, {} repeats".format(results["states"],args.repeats))
+    print("Compiling patterns for every state: {:.3f} ms per state".format(results["uncached"]))
+    print("Shared compiled patterns: {:.3f} ms per state".format(results["cached"]))
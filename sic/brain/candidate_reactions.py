@@ -0,0 +1,153 @@
+"""
+Turns the candidate reactions generate_choices finds for a state into the states they lead to: each one is made
+and cross checked on the state's own molecule, which the cross checks only read, and only if it can happen at all is
+the molecule copied for it to be rearranged on. Most candidates can't, so most copies are never made (see count_rejected).
+
+States with enough candidates can have them worked through on a pool of EXPANSION_WORKERS processes instead
+(SIC_EXPANSION_WORKERS in the environment, 0 by default, which keeps everything in the search's own process).
+OpenBabel's objects can't be pickled, so the state's molecule goes to the workers as a molecule table
+(see struct_ops.get_molecule_table) along with its pKa values, the sources and sinks go without their molecule,
+and every child comes back the same way, with the bond edits that made it and its scored reaction, to be rebuilt here.
+Either way the children come out in the same order, so the search goes the same way.
+"""
+
+import concurrent.futures
+import copy
+import itertools
+import multiprocessing
+import os
+import threading
+
+from sic import utils
+from sic.reaction_types import reaction_factory
+from sic.structure import struct_ops
+
+TWO_PRODUCT_INTERACTIONS = ["AE","ADE3","E2"] #if the interaction is "AE","ADE3", or "E2", there should be two correct products
+EXPANSION_WORKERS = int(os.environ.get("SIC_EXPANSION_WORKERS","0"))
+MIN_POOL_CANDIDATES = 8 #fewer candidates than this aren't worth sending to other processes
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def react(molecule,interaction,sources,sinks):
+    """
+    Makes the reaction of type interaction between sources and sinks (lists of Source and Sink objects) of molecule
+    and returns [(reaction,new molecule)], with the reaction carried out on a copy of molecule if its cross check
+    is above 0, followed by the second product the same way for interactions that give two.
+    """
+
+    children = []
+    reaction = reaction_factory.produce_reaction(interaction,sources,sinks,mol=molecule)
+    #TODO: Add a method to the Reaction class that tells whether there are two copies of the source or the sink to check
+    if reaction.cross_check() > 0: #make sure it is actually a possibility
+        children.append(carry_out(molecule,reaction))
+        if interaction in TWO_PRODUCT_INTERACTIONS:
+            reaction = reaction_factory.produce_reaction(interaction,sources,sinks,mol=molecule,second_product=True)
+            print("Made reaction2 of type {}, cross check is {}".format(interaction,reaction.cross_check()))
+            if reaction.cross_check() > 0:
+                children.append(carry_out(molecule,reaction))
+    return children
+
+def carry_out(molecule,reaction):
+    """
+    Rearranges reaction, cross checked on molecule, on a copy of molecule, and returns (reaction,the copy).
+    """
+
+    new_mol = struct_ops.copy_molecule(molecule)
+    #shift_molecule_references moves the Source and Sink objects themselves, which every reaction between them shares,
+    #so the reaction gets its own to keep pointing at its molecule
+    reaction.sources = utils.shift_molecule_references([copy.copy(site) for site in reaction.sources],new_mol)
+    reaction.sinks = utils.shift_molecule_references([copy.copy(site) for site in reaction.sinks],new_mol)
+    reaction.rearrange()
+    return reaction,new_mol
+
+def count_rejected(candidates,results):
+    """
+    Returns how many reactions react turned down for candidates, given what react_all gave for them
+    (results): reactions whose cross check was 0, and so never needed a copy of the molecule.
+    """
+
+    tried = 0
+    for (interaction,sources,sinks),children in zip(candidates,results):
+        tried += 2 if children and interaction in TWO_PRODUCT_INTERACTIONS else 1
+    return tried - sum(len(children) for children in results)
+
+def react_all(molecule,candidates):
+    """
+    Returns [react(molecule,interaction,sources,sinks) for interaction,sources,sinks in candidates],
+    working through them on the pool if it's turned on and there are at least MIN_POOL_CANDIDATES.
+    """
+
+    if EXPANSION_WORKERS > 0 and len(candidates) >= MIN_POOL_CANDIDATES:
+        return react_on_pool(molecule,candidates)
+    return [react(molecule,interaction,sources,sinks) for interaction,sources,sinks in candidates]
+
+def get_executor():
+    """
+    Returns the pool of EXPANSION_WORKERS processes, starting it the first time.
+    Workers are spawned rather than forked, since the search's process has mapping threads running.
+    """
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ProcessPoolExecutor(max_workers=EXPANSION_WORKERS,mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def detach(site):
+    """
+    Returns a copy of a Source or Sink without its molecule, so it can be pickled.
+    """
+
+    site = copy.copy(site)
+    site.molecule = None
+    return site
+
+def react_on_pool(molecule,candidates):
+    """
+    react_all on the pool: candidates are split into one run of consecutive ones per worker, so the molecule
+    only goes to each worker once per state.
+    """
+
+    table = struct_ops.get_molecule_table(molecule)
+    packed = [(interaction,[detach(site) for site in sources],[detach(site) for site in sinks]) for interaction,sources,sinks in candidates]
+    chunk_size = -(-len(packed) // EXPANSION_WORKERS)
+    chunks = [packed[start:start + chunk_size] for start in range(0,len(packed),chunk_size)]
+    results = []
+    for chunk in get_executor().map(react_chunk,itertools.repeat(table),itertools.repeat(molecule.pka_index),chunks):
+        for children in chunk:
+            results.append([rebuild_child(molecule,reaction,child_table,edits) for reaction,child_table,edits in children])
+    return results
+
+def react_chunk(table,pka_index,candidates):
+    """
+    Runs on a worker: react on the molecule of table (with pka_index as its pKa values) for each of candidates.
+    Returns, for each candidate, [(reaction,molecule table,bond edits)] for its children, with the reactions'
+    sources and sinks detached from their molecules and the bond edits being the ones the reaction made.
+    """
+
+    molecule = struct_ops.read_molecule_table(table)
+    molecule.pka_index = pka_index
+    molecule.edit_log = [] #so that every child's edit log only has the edits that made it
+    results = [react(molecule,interaction,sources,sinks) for interaction,sources,sinks in candidates]
+    packed = [[(reaction,struct_ops.get_molecule_table(new_mol),new_mol.edit_log) for reaction,new_mol in children] for children in results]
+    for children in results:
+        for reaction,new_mol in children:
+            for site in reaction.sources + reaction.sinks:
+                site.molecule = None
+    return packed
+
+def rebuild_child(molecule,reaction,table,edits):
+    """
+    Turns a child react_chunk sent back into (reaction,new molecule) like react gives, new molecule being
+    a copy of molecule with edits made (stereo included, as the molecule table has none).
+    """
+
+    new_mol = struct_ops.read_molecule_table(table)
+    struct_ops.copy_attributes(molecule,new_mol)
+    struct_ops.copy_stereo(molecule,new_mol)
+    if hasattr(new_mol,"edit_log"):
+        new_mol.edit_log.extend(edits)
+    reaction.sources = utils.shift_molecule_references(reaction.sources,new_mol)
+    reaction.sinks = utils.shift_molecule_references(reaction.sinks,new_mol)
+    return reaction,new_mol
@@ -1,60 +1,137 @@
 """
 Decision-making engine for SiC³. Invoked by sic.py (and by extension sigc.py) to perform mechanistic examinations.
 Uses all the segmentation and pka tools in the other modules.
+
+get_mechanism can walk the tree of states with any of the searches in SEARCHES:
+
+- greedy: follows the first reaction that gets closer to product, backing up a level when none does
+- astar: best-first (A*), expands the states with the fewest reactions so far plus the fewest that could
+  still be needed (see ReactionState.get_steps_left), so it finds the shortest mechanism, even one that has
+  to move away from product for a step, and doesn't go down dead ends as far
+- beam: keeps only the width most promising states at each depth (see get_beam_score), so it runs
+  generate_choices at most width times per reaction step, however many possibilities there are
+
+Every search keeps a TranspositionTable, so a state reached by more than one path is only expanded once.
+
+NOTE: The names in SEARCHES are what get_mechanism, sic.py's --search and the server accept.
 """
 
+import heapq
+import itertools
+import os
 import time
 
 from openbabel import pybel
 
-from .reaction_state import ReactionState
-from sic.pka import pka
-from sic.reaction_types import interactions,  reaction_factory
-from sic.segmentation import segmentation
-from sic.structure import connectivity_table, struct_ops
-    
-def generate_choices(state):
-    #first, assign pka and get sources/sinks
-    #NOTE: Figure out how to optimize so we don't recalculate these too much, especially pKa
-    pka.get_all_pka(state.molecule)
+from . import candidate_reactions, state_analysis
+from .reaction_state import ReactionState, TranspositionTable
+from sic.reaction_types.interaction_index import INTERACTION_INDEX
+from sic.structure import balance, connectivity_table, properties
+
+def get_candidate_key(interaction,sources,sinks,molecule,classes=None,atomic_nums=None):
+    """
+    Returns a key for the reaction of type interaction between sources and sinks (lists of Source and Sink objects)
+    that only depends on which heavy atoms take part, plus, for each hydrogen, which atom it's on and, if classes
+    (see properties.get_symmetry_classes) is given, its symmetry class.
+    With classes, two reactions with the same key only differ in which of several equivalent hydrogens on the same
+    atom they move (e.g. the three of a hydronium ion), so they give the same cross check and molecules that only
+    differ in hydrogen numbering, which closer_to_product can't tell apart either (it doesn't number hydrogens).
+    Symmetric heavy atoms are never merged, since the atom mapping tells those apart.
+    atomic_nums can be given as every atom's atomic number (see AtomSnapshot) to save asking OpenBabel.
+    """
+
+    if atomic_nums is None:
+        obmol = molecule.OBMol
+        atomic_nums = [0] + [obmol.GetAtom(atom_idx).GetAtomicNum() for atom_idx in range(1,obmol.NumAtoms() + 1)]
+    key = [interaction]
+    for part in list(sources) + list(sinks):
+        atoms = []
+        for role,atom_idx in sorted(part.atoms.items()):
+            if atomic_nums[atom_idx] == 1:
+                bonded_to = tuple(sorted(molecule.connectivity_table.get_atoms_bonded(atom_idx)))
+                atom_idx = ("H",bonded_to,classes[atom_idx] if classes else None)
+            atoms.append((role,atom_idx))
+        key.append((part.subtype,tuple(atoms)))
+    return tuple(key)
+
+#leave spectators out of the search (see get_spectator_atoms), off unless SIC_EXCLUDE_SPECTATORS is set
+EXCLUDE_SPECTATORS = os.environ.get("SIC_EXCLUDE_SPECTATORS","") not in ("","0")
+
+def get_spectator_atoms(state):
+    """
+    Returns the atoms of state's molecule that no reaction needs to touch: those of the root's spectator
+    fragments (see ReactionTarget.get_spectators) that nothing has reacted with on the way to state.
+    Returns an empty set unless EXCLUDE_SPECTATORS is on: a catalyst (e.g. the [OH-] of an aldol) is the same
+    in reactants and products too, but the mechanism can't go without it.
+    """
+
+    if not EXCLUDE_SPECTATORS or not state.target:
+        return set()
+    root = state
+    while root.parent_state:
+        root = root.parent_state
+    edited = set(atom for bond in getattr(state.molecule,"edit_log",()) for atom in bond) #every edit since the root
+    atoms = set()
+    for fragment in state.target.get_spectators(root.molecule):
+        if edited.isdisjoint(fragment):
+            atoms.update(fragment)
+    return atoms
+
+def generate_choices(state,table=None):
+    #a state the search already expanded by another path (see TranspositionTable) shares what that one found
+    if table is not None:
+        original = table.get_original(state)
+        if original is not state:
+            state.analysis = original.analysis
+            state.possibilities = original.possibilities
+            return
+        if state.get_state_key() in table.states:
+            return #expanded already, e.g. search_greedy backing up to it
+        table.add(state)
+    #first, assign pka and get sources/sinks (only the sinks the sources can react with), once per state
+    analysis = state_analysis.analyze(state)
+    atomic_nums = analysis.snapshot.atomic_nums
 #    print "Current state: {}".format(state.molecule.write("can"))
 #    print "Initial bond distance: {}".format(properties.get_bond_distance(state.molecule,state.product,state.mapping)) 
-    possible_sites = segmentation.segment_molecule(state.molecule)
-    #and now for each source-sink pair, get the interactions
-    for source in possible_sites["sources"]:
-        for sink in possible_sites["sinks"]:
-            interaction_tuple = (source.subtype,sink.subtype)
-#            print "Interaction: {}".format(interaction_tuple)
-            possible_interactions = interactions.INTERACTIONS[interaction_tuple] if interaction_tuple in interactions.INTERACTIONS else []
-            #listify so that our interface works - if you have multiple sources or multiple sinks, this automagically takes care of it
-            #but don't listify if already a list
-#            print "Possible interactions: {}".format(possible_interactions)
-            interaction_source = source
-            interaction_sink = sink
-            if type(source) != type([]):
-                interaction_source = [source]
-            if type(sink) != type([]):
-                interaction_sink = [sink]
-            for interaction in possible_interactions:  
-                new_mol = struct_ops.copy_molecule(state.molecule)
-                reaction = reaction_factory.produce_reaction(interaction,interaction_source,interaction_sink,mol=new_mol)
-#                print "Made reaction of type {}, cross check is {}".format(interaction,reaction.cross_check())
-                if reaction.cross_check() > 0: #make sure it is actually a possibility
-                #TODO: Add a method to the Reaction class that tells whether there are two copies of the source or the sink to check
-                    new_state = ReactionState(new_mol,parent_state=state,parent_reaction=reaction)
-                    #NOTE: A mysterious bug happens where if you don't run this line here, suddenly the molecule attached to your sources is not the same as the one on the ReactionState...
-                    reaction.rearrange()
-                    #DO NOT MOVE REACTION.REARRANGE AWAY FROM HERE
-                    state.possibilities.add(new_state)
-                    two_products_interactions = ["AE","ADE3","E2"]#Tif the interaction is "AE","ADE3", or "E2", there should be two correct products 
-                    if interaction in two_products_interactions:
-                        new_mol = struct_ops.copy_molecule(state.molecule)
-                        reaction = reaction_factory.produce_reaction(interaction,interaction_source,interaction_sink,mol=new_mol, second_product = True)
-                        print("Made reaction2 of type {}, cross check is {}".format(interaction,reaction.cross_check()))
-                        if reaction.cross_check() > 0:
-                            new_state = ReactionState(new_mol,parent_state=state,parent_reaction=reaction)
-                            reaction.rearrange()
-                            state.possibilities.add(new_state)
+    possible_sites = {"sources" : analysis.sources, "sinks" : analysis.sinks}
+    #spectators (e.g. counter-ions) are left as they are, they stay in the molecule and the written-up mechanism
+    spectators = get_spectator_atoms(state)
+    if spectators:
+        for site_type in ("sources","sinks"):
+            possible_sites[site_type] = [site for site in possible_sites[site_type] if spectators.isdisjoint(site.atoms.values())]
+    #equivalent hydrogens give one Source/Sink each, so skip reactions that are the same as one made already (see get_candidate_key)
+    made = {} #{key without symmetry classes : [(sources,sinks) of the reactions made with that key]}
+    classes = None #only worked out once two reactions share a key
+    state.symmetric_duplicates = 0
+    candidates = [] #(interaction,sources,sinks) for every reaction to try
+    #and now for each source-sink pair that has interactions, get them
+    for source,sink,possible_interactions in INTERACTION_INDEX.get_pairs(possible_sites["sources"],possible_sites["sinks"]):
+        #listify so that our interface works - if you have multiple sources or multiple sinks, this automagically takes care of it
+        #but don't listify if already a list
+#        print "Possible interactions: {}".format(possible_interactions)
+        interaction_source = source
+        interaction_sink = sink
+        if type(source) != type([]):
+            interaction_source = [source]
+        if type(sink) != type([]):
+            interaction_sink = [sink]
+        for interaction in possible_interactions:  
+            key = get_candidate_key(interaction,interaction_source,interaction_sink,state.molecule,atomic_nums=atomic_nums)
+            if key in made:
+                if classes is None:
+                    classes = properties.get_symmetry_classes(state.molecule)
+                symmetric_key = get_candidate_key(interaction,interaction_source,interaction_sink,state.molecule,classes,atomic_nums)
+                if any(symmetric_key == get_candidate_key(interaction,sources,sinks,state.molecule,classes,atomic_nums) for sources,sinks in made[key]):
+                    state.symmetric_duplicates += 1
+                    continue
+            made.setdefault(key,[]).append((interaction_source,interaction_sink))
+            candidates.append((interaction,interaction_source,interaction_sink))
+    #make, cross check and carry out each of them (on the pool of processes if it's turned on, see candidate_reactions)
+    results = candidate_reactions.react_all(state.molecule,candidates)
+    state.copies_avoided = candidate_reactions.count_rejected(candidates,results)
+    for children in results:
+        for reaction,new_mol in children:
+            state.possibilities.add(ReactionState(new_mol,parent_state=state,parent_reaction=reaction))
     #TODO: Make this logging.debug...
 #    print "%s possibilities" % len(state.possibilities)
 #    print "Current state is: %s" % state.molecule.write("can")
@@ -68,7 +145,7 @@ def generate_choices(state):
 
 def go_up_a_level(state,master):
     """
-    Utility function for get_mechanism.
+    Utility function for search_greedy.
     Takes a state and goes up a level if there is a level to rise, returning
     the parent of the current state.
     Flags the state as "already examined fully" since this function is called
@@ -81,46 +158,33 @@ def go_up_a_level(state,master):
         master.pop()
         return state.parent_state
     else:
+        #if the mapping failed, that's the real reason there's no path, so let its error through first
+        state.target.resolve()
         raise ValueError("No pathh was found between reactants and products.")
 
-def get_mechanism(reactants,products,solvent=False,max_counter=15):
+def search_greedy(root,max_counter=15):
     """
-    Takes in the reactaants and products as SMILES strings with . separating each molecule in both,
-    and returns a list with the ReactionState objects that represent how we got there.
+    From root, keeps following the first possibility (by cross check) that is closer to product, going back up a level
+    (see go_up_a_level) when a state has none left, until it gets to product.
+    A state that's the same as one already given up on (see TranspositionTable) is given up on too.
+    Returns (the states from root to product, the states generate_choices was run on, in order).
+    Raises a ValueError if there's no path, or after max_counter steps.
     """
-    start_time = time.time()
-    #TODO: Add check for atom balance, raise ValueError if wrong.
-    path_to_product = [] #keeps track of the reaction state that we want to print out at the end
+    current_state = root
+    path_to_product = [root] #since the first state HAS to be the first step in the mechanism
     #path_to_product holds onyl the states that get you to the product, and nothing else in the tree.
-    #read in reactants and products
-    react_mol = pybel.readstring("smi",reactants)
-    prod_mol = pybel.readstring("smi",products)
-    #now create a ReactionState out of the reactants - this will be the root
-    before_java = time.time()
-    current_state = ReactionState(react_mol,prod=prod_mol) #product becomes part of the tree
-    after_java = time.time()
-    #doing the ReactionState initializer changes the internal reactant and product, so put them back in
-    #TODO: Make this cleaner
-    react_mol = current_state.molecule
-    prod_mol = current_state.product
-    react_mol.removeh() #this looks stupid, but sometimes hydrogens are added explicitly, counteracting our assumption that all backbone atoms come before all H atoms
-    #since breaking this assumption makes bond distance stop working, this seemingly-stupid function call is VITAL and should NOT BE REMOVED
-    react_mol.addh()
-    prod_mol.removeh()
-    prod_mol.addh()
-    react_mol.connectivity_table = connectivity_table.ConnectivityTable(react_mol)
-    prod_mol.connectivity_table = connectivity_table.ConnectivityTable(prod_mol)
-    print(react_mol.connectivity_table.closer_to_product_table)
-    path_to_product.append(current_state) #since the first state HAS to be the first step in the mechanism
+    expanded = []
+    table = TranspositionTable()
     counter = 0
-    print(react_mol.write("can"))
-    print(prod_mol.write("can"))
     while not current_state.matches_product():
         #from current_state, generate choices
-        generate_choices(current_state)
+        generate_choices(current_state,table)
+        if current_state not in expanded: #backing up comes back to states already expanded
+            expanded.append(current_state)
         if len(current_state.possibilities) > 0:
             for possibility in current_state.possibilities:
-                if not hasattr(possibility,'examined'): #if we didn't look at it and conclude none of its paths get us to product...
+                #if we didn't look at it (or at the same state reached another way) and conclude none of its paths get us to product...
+                if not hasattr(table.get_original(possibility),'examined'):
                     #check if closer to product
                     if possibility.closer_to_product():
                         current_state = possibility
@@ -136,8 +200,165 @@ def get_mechanism(reactants,products,solvent=False,max_counter=15):
         counter += 1
         if counter >= max_counter:
             raise ValueError("Could not find a reaction after {} steps.".format(counter))
+    return path_to_product,expanded
+
+def search_best_first(root,max_counter=200):
+    """
+    A* search from root: always expands the state with the fewest reactions from root plus ReactionState.get_steps_left,
+    which never overestimates, so the first path to product it expands has as few reactions as any.
+    Ties go to the state nearest product, then to the reaction with the best cross check.
+    A reaction doesn't have to get closer to product to be followed, unlike in search_greedy.
+    Each state (see TranspositionTable) is only expanded once, reached by the fewest reactions found.
+    Returns (the states from root to product, the states generate_choices was run on, in order).
+    Raises a ValueError if there's no path, or after max_counter expansions.
+    """
+    order = itertools.count() #so that states never get compared, and equal ones come out first in, first out
+    #heap of (reactions + steps left, steps left, bond distance, -cross check, order, reactions, state)
+    frontier = [(0,0,0,0,next(order),0,root)]
+    fewest_reactions = {root.get_state_key() : 0} #{state key : fewest reactions any path found so far takes to it}
+    table = TranspositionTable()
+    expanded = []
+    while frontier:
+        reactions,state = heapq.heappop(frontier)[-2:]
+        if state.matches_product():
+            path_to_product = [state]
+            while path_to_product[-1].parent_state:
+                path_to_product.append(path_to_product[-1].parent_state)
+            return path_to_product[::-1],expanded
+        if table.get_original(state) is not state:
+            continue #reached again by another path, and the one that got there first was expanded already
+        if len(expanded) >= max_counter:
+            raise ValueError("Could not find a reaction after {} expansions.".format(len(expanded)))
+        generate_choices(state,table)
+        expanded.append(state)
+        reactions += 1
+        for possibility in state.possibilities:
+            key = possibility.get_state_key()
+            if reactions >= fewest_reactions.get(key,reactions + 1):
+                continue
+            fewest_reactions[key] = reactions
+            steps_left = possibility.get_steps_left()
+            heapq.heappush(frontier,(reactions + steps_left,steps_left,possibility.get_bond_distance(),-possibility.parent_reaction.cross_check(),next(order),reactions,possibility))
+    #if the mapping failed, that's the real reason there's no path, so let its error through first
+    root.target.resolve()
+    raise ValueError("No path was found between reactants and products.")
+
+BEAM_WIDTH = 5 #default width for search_beam
+BEAM_DEPTH = 10 #default depth for search_beam
+CROSS_CHECK_WEIGHT = 1.0 #how many bonds closer to product a reaction with a cross check of 1 is worth to search_beam
+
+def get_beam_score(state):
+    """
+    Returns how promising search_beam finds state, lower being better: its bond distance to product,
+    less CROSS_CHECK_WEIGHT times the cross check of the reaction that made it.
+    """
+    return state.get_bond_distance() - CROSS_CHECK_WEIGHT * state.parent_reaction.cross_check()
+
+def search_beam(root,max_counter=BEAM_DEPTH,width=BEAM_WIDTH):
+    """
+    Beam search from root: expands every state at one depth, and only keeps the width possibilities with the best
+    get_beam_score for the next, going at most max_counter reactions deep. Possibilities that are the same as a state
+    seen before (by state key, see TranspositionTable) are dropped. Unlike the other searches, it can miss a mechanism that a state it dropped leads to.
+    Returns (the states from root to product, the states generate_choices was run on, in order).
+    Raises a ValueError if no state is left, or none of them is product after max_counter reactions,
+    or if width or max_counter is below 1.
+    """
+    if width < 1 or max_counter < 1:
+        raise ValueError("The beam search needs a width and depth of at least 1.")
+    if root.matches_product():
+        return [root],[]
+    beam = [root]
+    seen = set([root.get_state_key()])
+    table = TranspositionTable()
+    expanded = []
+    for depth in range(max_counter):
+        candidates = []
+        for state in beam:
+            generate_choices(state,table)
+            expanded.append(state)
+            for possibility in state.possibilities:
+                key = possibility.get_state_key()
+                if key in seen:
+                    continue
+                seen.add(key)
+                if possibility.matches_product():
+                    path_to_product = [possibility]
+                    while path_to_product[-1].parent_state:
+                        path_to_product.append(path_to_product[-1].parent_state)
+                    return path_to_product[::-1],expanded
+                candidates.append(possibility)
+        if not candidates:
+            #if the mapping failed, that's the real reason there's no path, so let its error through first
+            root.target.resolve()
+            raise ValueError("No path was found between reactants and products.")
+        candidates.sort(key=get_beam_score) #stable, so ties keep the order generate_choices gave them (by cross check)
+        beam = candidates[:width]
+    raise ValueError("Could not find a reaction in {} steps.".format(max_counter))
+
+SEARCHES = {
+        "greedy": search_greedy,
+        "astar": search_best_first,
+        "beam": search_beam
+        }
+
+#{search : {option get_mechanism takes : the search's keyword argument for it}}
+SEARCH_OPTIONS = {
+        "greedy": {},
+        "astar": {},
+        "beam": {"width": "width", "depth": "max_counter"}
+        }
+
+DEFAULT_SEARCH = os.environ.get("SIC_SEARCH","greedy")
+
+def get_mechanism(reactants,products,solvent=False,max_counter=None,mapper=None,search=None,**search_options):
+    """
+    Takes in the reactaants and products as SMILES strings with . separating each molecule in both,
+    and returns a list with the ReactionState objects that represent how we got there.
+    mapper picks the atom mapping backend (see sic.mapping.mappers), None for the default.
+    search picks how the tree of states is searched (see SEARCHES), None for DEFAULT_SEARCH (SIC_SEARCH in the environment),
+    and max_counter caps the steps it takes (None for the search's own cap). Any other keyword arguments are
+    options of the search (see SEARCH_OPTIONS), e.g. width and depth for search_beam.
+    Raises a ValueError for unknown searches, options the search doesn't take, or an option that sets max_counter
+    (e.g. depth) given along with max_counter itself.
+    """
+    search = search if search else DEFAULT_SEARCH
+    if search not in SEARCHES:
+        raise ValueError("Search {} is not supported. Choose one of: {}".format(search,", ".join(sorted(SEARCHES))))
+    options = {}
+    for option,value in search_options.items():
+        if option not in SEARCH_OPTIONS[search]:
+            raise ValueError("Search {} has no option {}.".format(search,option))
+        if SEARCH_OPTIONS[search][option] == "max_counter" and max_counter is not None:
+            raise ValueError("Give either max_counter or {}, not both.".format(option))
+        options[SEARCH_OPTIONS[search][option]] = value
+    start_time = time.time()
+    #read in reactants and products
+    react_mol = pybel.readstring("smi",reactants)
+    prod_mol = pybel.readstring("smi",products)
+    #an unbalanced reaction can never be mapped or reached, so give up before paying for either
+    balance.validate_balance(react_mol,prod_mol)
+    #now create a ReactionState out of the reactants - this will be the root
+    #product becomes part of the tree, and mapping starts in the background; the first expansion runs alongside it
+    current_state = ReactionState(react_mol,prod=prod_mol,mapper=mapper)
+    #doing the ReactionState initializer changes the internal reactant, so put it back in (the product is prepared by ReactionTarget)
+    #TODO: Make this cleaner
+    react_mol = current_state.molecule
+    react_mol.removeh() #this looks stupid, but sometimes hydrogens are added explicitly, counteracting our assumption that all backbone atoms come before all H atoms
+    #since breaking this assumption makes bond distance stop working, this seemingly-stupid function call is VITAL and should NOT BE REMOVED
+    react_mol.addh()
+    react_mol.connectivity_table = connectivity_table.ConnectivityTable(react_mol)
+    print(react_mol.connectivity_table.closer_to_product_table)
+    print(react_mol.write("can"))
+    print(current_state.target.product_smiles)
+    if max_counter is not None:
+        options["max_counter"] = max_counter
+    path_to_product,expanded = SEARCHES[search](current_state,**options)
     #when we hit product, return
     final_time = time.time()
     print("Total time (with java): %s" % (final_time - start_time))
-    print("Total time (without java): %s" % (final_time - start_time - (after_java - before_java)))
+    print("Total time (without java): %s" % (final_time - start_time - current_state.target.wait_time))
+    print("States expanded (%s search): %s" % (search,len(expanded)))
+    print("Symmetric duplicate reactions skipped: %s" % sum(state.symmetric_duplicates for state in expanded))
+    print("Molecule copies avoided by cross checking first: %s" % sum(state.copies_avoided for state in expanded))
+    print("Spectator fragments left out of the search: %s" % len(current_state.target.spectators or []))
     return path_to_product
@@ -8,9 +8,17 @@ Each ReactionState keeps track of:
     - The ReactionType that got it there (if any; root has none). This contains the cross_check score, which allows you to give the user messages.
     - The possible paths from this ReactionState, which are themselves ReactionStates.
     - The Molecule object that represents this reaction state.
+    - Its pKa values and sources/sinks, once generate_choices has worked them out (see state_analysis).
+    - The state it's the same as, if a search already expanded that one (see TranspositionTable).
 
-All ReactionStates share a "product" object, which ensures the tree structure and allows for utility functions
+All ReactionStates in a tree share a "product" object, which ensures the tree structure and allows for utility functions
 related to how close a ReactionState is to product. Modify self.product at your own risk.
+The product and mapping are handed down from the root to its children rather than stored on the class,
+so that several mechanism searches can run at the same time (e.g. in the server's threads) without
+overwriting each other's.
+The mapping is started in the background when the root is made (see ReactionTarget), so the search can
+work out the reactants' pKa and sources/sinks while ReactionDecoder runs. Only the first look at
+state.product or state.mapping waits for it.
 
 At any point where molecules need to be rearranged by a mechanism, a new Molecule should be created by doing mol.write("can") and using readstring
 on that SMILES string. This new Molecule should then be rearranged before creating a new ReactionState.
@@ -19,15 +27,82 @@ This class also contains utility functions to check whether a reaction state is
 and whether it matches the product exactly.
 """
 
+import math
+import threading
+import time
+
 from openbabel.pybel import readstring
 import sortedcontainers
 
-from sic.structure import similarity, properties
+from sic.mapping import graph_mapper
+from sic.reaction_types.reaction_factory import MAX_BOND_EDITS
+from sic.structure import properties
+from sic.structure.connectivity_table import ConnectivityTable
+from sic.utils import write_mol
+
+class ReactionTarget(object):
+    """
+    The product and reactant -> product mapping shared by every state in a tree.
+    The mapping is computed on a background thread from the moment this is made, and resolve() waits for it.
+    Atom indices in the mapping refer to the root state's molecule, i.e. to reactant_smiles, whatever
+    order the mapper wrote its own reactant SMILES in.
+    """
+
+    def __init__(self,reactants,products,reactant_smiles,mapper=None):
+        self.reactant_smiles = reactant_smiles
+        #canonical SMILES doesn't depend on atom order, so this is enough for matches_product without waiting on the mapper
+        self.product_smiles = write_mol(products)
+        #reactants and products belong to the mapping thread from here on
+        self.future = properties.get_mapping_async(reactants,products,mapper=mapper)
+        self.product = None
+        self.mapping = None
+        self.wait_time = 0.0 #how long the search sat waiting for the mapping
+        self.spectators = None #see get_spectators
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "ReactionTarget<Product:{},Mapped:{}>".format(self.product_smiles,self.mapping is not None)
+
+    def resolve(self):
+        """
+        Waits for the mapping if it isn't there yet and returns (product,mapping).
+        Mapping errors (e.g. a ValueError from ReactionDecoder) are raised here, every time this is called.
+        """
+
+        with self.lock:
+            if self.mapping is None:
+                before = time.time()
+                mapping,really_canonical_reactants,really_canonical_products = self.future.result()
+                self.wait_time += time.time() - before
+                product = readstring("smi",really_canonical_products)
+                product.removeh() #same reason as for the reactants in get_mechanism, heavy atoms have to come before H atoms
+                product.addh()
+                product.connectivity_table = ConnectivityTable(product)
+                self.product = product
+                self.mapping = graph_mapper.reindex_mapping(mapping,really_canonical_reactants,self.reactant_smiles)
+            return self.product,self.mapping
+
+    def get_spectators(self,root_molecule):
+        """
+        Returns the spectator fragments of the root state's molecule (see properties.get_spectator_fragments),
+        worked out the first time they're asked for. Waits for the mapping, so the states a search leaves them out of
+        don't depend on how fast the mapper was; if the mapping failed, there are none.
+        """
+
+        if self.spectators is None:
+            try:
+                product,mapping = self.resolve()
+            except Exception:
+                self.spectators = [] #the search reports mapping errors when it needs the mapping, not here
+                return self.spectators
+            self.spectators = properties.get_spectator_fragments(root_molecule,product,mapping)
+        return self.spectators
 
 class ReactionState(object):
-    product = None
-    mapping = None #one mapping from reactants to products for all states, because it is a property of each atom...
-    def __init__(self,molecule,parent_state=None,parent_reaction=None,prod=None):
+    def __init__(self,molecule,parent_state=None,parent_reaction=None,prod=None,mapper=None):
         self.molecule = molecule
         self.parent_state = parent_state #doesn't matter if None gets assigned
         self.parent_reaction = parent_reaction
@@ -35,24 +110,46 @@ class ReactionState(object):
         #since cross_check() is on [0,1], subtract score from 1 and take abs.
         #in this scheme, 1 -> 0 and 0 -> 1, making it go in the right order.
         self.possibilities = sortedcontainers.SortedListWithKey(key=lambda x: 1.0 - x.parent_reaction.cross_check())
+        self.target = None
+        self.symmetric_duplicates = 0 #reactions generate_choices skipped as symmetric duplicates of others
+        self.copies_avoided = 0 #reactions generate_choices turned down without copying the molecule for them
+        self.analysis = None #StateAnalysis, see state_analysis.analyze
+        self.bond_distance = None #see get_bond_distance
+        self.state_key = None #see get_state_key
+        self.same_as = None #the state a TranspositionTable merged this one into, if any
         if prod:
-            #These are sort of static but not really. We want to be able to replace these as we go,
-            #because otherwise when this runs as a webserver we have trouble.
-            type(self).product = prod
+            #These are sort of static but not really. They belong to the whole tree, but not to the class,
+            #because otherwise when this runs as a webserver concurrent searches trample each other.
             #initialize mapping, do NOT redo mapping, ever!
-            #overwrite product and current_state when given mapping
-            #no separate if clause for self.product since mapping and product should be defined at the same time
-            mapping,really_canonical_reactants,really_canonical_products = properties.get_mapping(self.molecule,type(self).product)
-            type(self).mapping = mapping
-            type(self).product = readstring("smi",really_canonical_products)
-            #overwrite current state as well
-            self.molecule = readstring("smi",really_canonical_reactants)
+            #the root is rewritten as canonical SMILES so its atom order is fixed before the mapping comes back,
+            #and the mapping thread gets molecules of its own since OpenBabel molecules aren't safe to share
+            #mapper only matters here, picks the atom mapping backend (see sic.mapping.mappers)
+            reactant_smiles = write_mol(self.molecule)
+            self.molecule = readstring("smi",reactant_smiles)
+            self.target = ReactionTarget(readstring("smi",reactant_smiles),prod,reactant_smiles,mapper=mapper)
+        elif parent_state:
+            self.target = parent_state.target
 
     def __repr__(self):
         """
         Returns a representation of this object for easy debugging.
         """
         return "ReactionState<ParentReaction:{},Possibilities:{}>".format(self.parent_reaction,self.possibilities)
+
+    @property
+    def product(self):
+        """
+        The product Molecule, waiting for the mapping first if it isn't done yet.
+        """
+        return self.target.resolve()[0] if self.target else None
+
+    @property
+    def mapping(self):
+        """
+        One mapping from reactants to products for all states in a tree, because it is a property of each atom...
+        Waits for the mapper if it isn't done yet.
+        """
+        return self.target.resolve()[1] if self.target else None
     
     def to_json_dict(self):
         """
@@ -69,8 +166,9 @@ class ReactionState(object):
     def matches_product(self):
         """
         Checks whether this reaction state is equal to the product.
+        Same test as similarity.is_same_molecule, but against the target's SMILES, so it doesn't wait on the mapping.
         """
-        return similarity.is_same_molecule(self.molecule,self.product)
+        return write_mol(self.molecule) == self.target.product_smiles
 
     def closer_to_product(self):
         """
@@ -90,3 +188,66 @@ class ReactionState(object):
         if current_distance == 0 and not self.matches_product(): #mapper or frozenset issue, investigate this later
             return False
         return current_distance < previous_distance
+
+    def get_bond_distance(self):
+        """
+        Returns the bond distance (see properties.get_bond_distance) from this state to product,
+        worked out the first time it's asked for. Only ask once the state's molecule is rearranged.
+        """
+        if self.bond_distance is None:
+            self.bond_distance = properties.get_bond_distance(self.molecule,self.product,self.mapping)
+        return self.bond_distance
+
+    def get_state_key(self):
+        """
+        Returns the key (see properties.get_state_key) states reached by different paths share when they're the same,
+        worked out the first time it's asked for. Only ask once the state's molecule is rearranged.
+        """
+        if self.state_key is None:
+            self.state_key = properties.get_state_key(self.molecule)
+        return self.state_key
+
+    def get_steps_left(self):
+        """
+        Returns a lower bound on the number of reactions between this state and product: no reaction
+        changes more than MAX_BOND_EDITS bonds, and each changed bond changes the bond distance by at most one.
+        Returns 0 if the state matches product.
+        """
+        if self.matches_product():
+            return 0
+        return max(1,math.ceil(self.get_bond_distance() / MAX_BOND_EDITS))
+
+class TranspositionTable(object):
+    """
+    The states one search has expanded, by state key (see ReactionState.get_state_key), so that a state reached
+    again by another path (e.g. protonating A then B rather than B then A) is only expanded once: the duplicate
+    becomes a reference to the state that was (state.same_as), and shares its possibilities and examined flag.
+    Since states with the same key have the same bond distance, the search can't tell them apart anyway.
+    """
+
+    def __init__(self):
+        self.states = {} #{state key : the first state with that key to be expanded}
+        self.merged = 0 #states found to be the same as one expanded before
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "TranspositionTable<States:{},Merged:{}>".format(len(self.states),self.merged)
+
+    def add(self,state):
+        """
+        Records state as expanded, unless a state with the same key already was.
+        """
+        self.states.setdefault(state.get_state_key(),state)
+
+    def get_original(self,state):
+        """
+        Returns the expanded state state is the same as (setting state.same_as to it), or state itself if no state
+        with its key has been expanded or it's the one that was.
+        """
+        original = self.states.get(state.get_state_key(),state)
+        if original is not state and state.same_as is None:
+            state.same_as = original
+            self.merged += 1
+        return original
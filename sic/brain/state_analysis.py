@@ -0,0 +1,58 @@
+"""
+Everything generate_choices works out about a state on its own before it builds any reactions: its atoms' properties,
+pKa values and sources/sinks, done in one go and kept on the state (state.analysis) so that going back up to a state
+doesn't work them out again.
+
+Atom properties are read from OpenBabel once, into an AtomSnapshot taken from the parent state's, and pKa assignment,
+segmentation and the Source/Sink objects all read them from there. The snapshot also works out the atoms the last
+reaction changed (and what's around them) just once for both the pKa chart and, if segmentation is incremental
+(see segmentation.find_groups), the source/sink patterns to update from.
+"""
+
+from sic.pka import pka
+from sic.reaction_types.interaction_index import INTERACTION_INDEX
+from sic.segmentation import segmentation
+from sic.structure.atom_snapshot import AtomSnapshot
+
+class StateAnalysis(object):
+    """
+    The analysis of one molecule:
+
+    - snapshot: an AtomSnapshot of the molecule
+    - pka_index: the molecule's PkaIndex (also left on the molecule as molecule.pka_index, see pka.get_all_pka)
+    - sources: List of all sources in the molecule, as Source objects
+    - sinks: List of the sinks that can react with one of the sources, as Sink objects
+    """
+
+    def __init__(self,snapshot,pka_index,sources,sinks):
+        self.snapshot = snapshot
+        self.pka_index = pka_index
+        self.sources = sources
+        self.sinks = sinks
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "StateAnalysis<Sources:{},Sinks:{}>".format(len(self.sources),len(self.sinks))
+
+def analyze_molecule(molecule,parent=None,interaction_index=INTERACTION_INDEX):
+    """
+    Assigns pKa values to molecule and segments it (only the sinks interaction_index pairs with its sources),
+    returning a StateAnalysis. parent can be the StateAnalysis of the molecule this one was copied from.
+    """
+
+    snapshot = AtomSnapshot(molecule,parent.snapshot if parent else None)
+    pka.get_all_pka(molecule,snapshot)
+    sites = segmentation.segment_molecule(molecule,interaction_index,snapshot)
+    return StateAnalysis(snapshot,molecule.pka_index,sites["sources"],sites["sinks"])
+
+def analyze(state):
+    """
+    Returns state.analysis, working it out first if it hasn't been yet.
+    """
+
+    if state.analysis is None:
+        parent = state.parent_state.analysis if state.parent_state else None
+        state.analysis = analyze_molecule(state.molecule,parent)
+    return state.analysis
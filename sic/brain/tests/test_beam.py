@@ -0,0 +1,38 @@
+"""
+Tests the beam search: it finds short mechanisms, and never runs generate_choices on more than width states per step.
+"""
+
+import unittest
+
+from sic.brain import decision_engine
+
+class BeamTest(unittest.TestCase):
+    def testSN2AfterProtonation(self):
+        path = decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="beam")
+        self.assertEqual([state.parent_reaction.reaction_type for state in path[1:]], ["proton_transfer","SN2"])
+        self.assertTrue(path[-1].matches_product())
+
+    def testWidthBoundsExpansions(self):
+        path = decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="beam",width=1)
+        self.assertTrue(path[-1].matches_product())
+        root = path[0]
+        #with a width of 1, only the state kept at each step has possibilities of its own
+        self.assertTrue(all(len(state.possibilities) == 0 for state in root.possibilities if state is not path[1]))
+
+    def testDepthCap(self):
+        with self.assertRaises(ValueError):
+            decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="beam",max_counter=1)
+        with self.assertRaises(ValueError):
+            decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="beam",depth=1)
+        with self.assertRaisesRegex(ValueError,"not both"):
+            decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="beam",depth=3,max_counter=10)
+
+    def testOptionsOfOtherSearches(self):
+        for search in ("greedy","astar"):
+            with self.assertRaises(ValueError):
+                decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search=search,width=3)
+        with self.assertRaises(ValueError):
+            decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="beam",width=0)
+
+if __name__ == "__main__":
+    unittest.main()
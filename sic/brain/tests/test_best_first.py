@@ -0,0 +1,36 @@
+"""
+Tests the best-first (A*) search: it finds the shortest mechanism, and ReactionState.get_steps_left never
+says more reactions are needed than there are.
+"""
+
+import unittest
+
+from sic.brain import decision_engine
+
+class BestFirstTest(unittest.TestCase):
+    def testSN2AfterProtonation(self):
+        """
+        Heptanol and HBr: the alcohol is protonated, then bromide displaces water.
+        """
+
+        path = decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="astar")
+        self.assertEqual([state.parent_reaction.reaction_type for state in path[1:]], ["proton_transfer","SN2"])
+        self.assertTrue(path[-1].matches_product())
+        for steps_taken,state in enumerate(path):
+            self.assertLessEqual(state.get_steps_left(), len(path) - 1 - steps_taken)
+
+    def testSameAsGreedy(self):
+        greedy = decision_engine.get_mechanism("CCC(I)(CC)CC","CC[C+](CC)CC.[I-]",mapper="graph",search="greedy")
+        best_first = decision_engine.get_mechanism("CCC(I)(CC)CC","CC[C+](CC)CC.[I-]",mapper="graph",search="astar")
+        self.assertEqual([state.molecule.write("can") for state in best_first], [state.molecule.write("can") for state in greedy])
+
+    def testExpansionCap(self):
+        with self.assertRaises(ValueError):
+            decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="astar",max_counter=1)
+
+    def testUnknownSearch(self):
+        with self.assertRaises(ValueError):
+            decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="sideways")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Tests that the molecule is only copied for candidate reactions that pass their cross check, and that candidate
+reactions worked through on the pool give the same children as making them in the search's own process:
+molecule tables rebuild the same molecule, and the mechanisms found are the same either way.
+The pool is stood in for by an executor that runs in this process but pickles everything that goes through it.
+"""
+
+import pickle
+import unittest
+
+from sic.brain import candidate_reactions, decision_engine
+from sic.brain.reaction_state import ReactionState
+from sic.structure import connectivity_table, struct_ops
+from sic.tests.molecules import make_molecule
+
+COPY_MOLECULE = struct_ops.copy_molecule
+
+class PicklingExecutor(object):
+    """
+    Runs map in this process, with its arguments and results pickled on the way like a ProcessPoolExecutor would.
+    """
+
+    def map(self,function,*iterables):
+        for args in zip(*iterables):
+            yield pickle.loads(pickle.dumps(function(*pickle.loads(pickle.dumps(args)))))
+
+class CandidateReactionsTest(unittest.TestCase):
+    def setUp(self):
+        self.settings = (candidate_reactions.EXPANSION_WORKERS,candidate_reactions.MIN_POOL_CANDIDATES,candidate_reactions.get_executor)
+
+    def tearDown(self):
+        candidate_reactions.EXPANSION_WORKERS,candidate_reactions.MIN_POOL_CANDIDATES,candidate_reactions.get_executor = self.settings
+        struct_ops.copy_molecule = COPY_MOLECULE
+
+    def testOnlyAcceptedCopied(self):
+        copies = []
+        struct_ops.copy_molecule = lambda mol: copies.append(mol) or COPY_MOLECULE(mol)
+        state = ReactionState(make_molecule("CCCCCCCO.Br"))
+        decision_engine.generate_choices(state)
+        self.assertEqual(len(copies), len(state.possibilities))
+        self.assertGreater(state.copies_avoided, 0)
+        for possibility in state.possibilities:
+            self.assertGreater(possibility.parent_reaction.cross_check(), 0)
+            for site in possibility.parent_reaction.sources + possibility.parent_reaction.sinks:
+                self.assertIs(site.molecule, possibility.molecule)
+
+    def testMoleculeTable(self):
+        mol = make_molecule("CC(=O)[O-].c1ccccc1[NH3+]")
+        mol.write("can") #aromaticity is perceived
+        rebuilt = struct_ops.read_molecule_table(pickle.loads(pickle.dumps(struct_ops.get_molecule_table(mol))))
+        self.assertEqual(rebuilt.write("can"), mol.write("can"))
+        self.assertEqual([atom.atomicnum for atom in rebuilt.atoms], [atom.atomicnum for atom in mol.atoms])
+        self.assertEqual(rebuilt.connectivity_table.connectivity_table, mol.connectivity_table.connectivity_table)
+
+    def testSameAsInProcess(self):
+        serial = decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="astar")
+        candidate_reactions.EXPANSION_WORKERS = 2
+        candidate_reactions.MIN_POOL_CANDIDATES = 1
+        candidate_reactions.get_executor = PicklingExecutor
+        pooled = decision_engine.get_mechanism("CCCCCCCO.Br","CCCCCCCBr.O",mapper="graph",search="astar")
+        self.assertEqual([state.molecule.write("can") for state in pooled], [state.molecule.write("can") for state in serial])
+        self.assertEqual([state.molecule.edit_log for state in pooled[1:]], [state.molecule.edit_log for state in serial[1:]])
+        for state in pooled[1:]:
+            for site in state.parent_reaction.sources + state.parent_reaction.sinks:
+                self.assertIs(site.molecule, state.molecule)
+
+if __name__ == "__main__":
+    unittest.main()
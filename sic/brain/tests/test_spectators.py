@@ -0,0 +1,69 @@
+"""
+Tests that fragments which are the same in reactants and products are found, and that generate_choices
+leaves them alone when EXCLUDE_SPECTATORS is on, and only then (catalysts are the same on both sides too).
+"""
+
+import unittest
+
+from openbabel.pybel import readstring
+
+from sic.brain import decision_engine
+from sic.brain.reaction_state import ReactionState
+from sic.structure import connectivity_table, properties
+from sic.tests.molecules import make_molecule
+
+class SpectatorTest(unittest.TestCase):
+    def setUp(self):
+        self.exclude = decision_engine.EXCLUDE_SPECTATORS
+
+    def tearDown(self):
+        decision_engine.EXCLUDE_SPECTATORS = self.exclude
+
+    def testSpectatorFragments(self):
+        reactants = make_molecule("Cl.O.[Na+].CC")
+        products = make_molecule("[Cl-].[OH3+].[Na+].CC")
+        mapping = {1:1,2:2,3:3,4:4,5:5}
+        fragments = properties.get_spectator_fragments(reactants,products,mapping)
+        self.assertEqual(sorted(sorted(fragment) for fragment in fragments), [[3],[4,5,9,10,11,12,13,14]])
+
+    def testBondedInProduct(self):
+        """
+        A fragment whose atoms end up bonded to something else isn't a spectator, even with all its own bonds kept.
+        """
+
+        reactants = make_molecule("[Cl-].[CH3+]")
+        products = make_molecule("ClC")
+        self.assertEqual(properties.get_spectator_fragments(reactants,products,{1:1,2:2}), [])
+
+    def testLeftOut(self):
+        """
+        Chloride could take the proton from HBr, but it's a spectator here.
+        """
+
+        decision_engine.EXCLUDE_SPECTATORS = True
+        mol = readstring("smi","[OH-].Br.[Cl-]")
+        state = ReactionState(mol,prod=readstring("smi","O.[Br-].[Cl-]"),mapper="graph")
+        state.molecule.addh()
+        state.molecule.connectivity_table = connectivity_table.ConnectivityTable(state.molecule)
+        chlorine = [atom.idx for atom in state.molecule.atoms if atom.atomicnum == 17][0]
+        self.assertEqual(decision_engine.get_spectator_atoms(state), set([chlorine]))
+        decision_engine.generate_choices(state)
+        self.assertTrue(state.possibilities)
+        for possibility in state.possibilities:
+            self.assertEqual(possibility.molecule.OBMol.GetAtom(chlorine).GetFormalCharge(), -1)
+
+    def testCatalystKept(self):
+        """
+        The hydroxide of an aldol addition comes out the same as it went in, but it makes the enolate.
+        """
+
+        decision_engine.EXCLUDE_SPECTATORS = False
+        mol = readstring("smi","CCC=O.CCC=O.[OH-]")
+        state = ReactionState(mol,prod=readstring("smi","CCC(O)C(C)C=O.[OH-]"),mapper="graph")
+        state.molecule.addh()
+        state.molecule.connectivity_table = connectivity_table.ConnectivityTable(state.molecule)
+        self.assertTrue(state.target.get_spectators(state.molecule)) #found, but not left out
+        self.assertEqual(decision_engine.get_spectator_atoms(state), set())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+Tests that a state's analysis, with its atom snapshot taken from its parent's, gives the same atom properties,
+pKa values and sources/sinks as working everything out from scratch.
+"""
+
+import unittest
+
+from sic.brain import state_analysis
+from sic.brain.reaction_state import ReactionState
+from sic.pka import pka
+from sic.reaction_types.interaction_index import INTERACTION_INDEX
+from sic.segmentation import segmentation
+from sic.structure import struct_ops
+from sic.structure.atom_snapshot import AtomSnapshot
+from sic.tests.molecules import make_molecule
+
+def transfer_proton(mol):
+    struct_ops.make_bond(2,3,mol) #water O (2) onto the HCl hydrogen (3)
+    struct_ops.break_bond(3,1,mol) #Cl (1) leaves with the electrons
+
+class StateAnalysisTest(unittest.TestCase):
+    def testSnapshotFromParent(self):
+        mol = make_molecule("Cl.O")
+        parent = state_analysis.analyze_molecule(mol)
+        copy = struct_ops.copy_molecule(mol)
+        transfer_proton(copy)
+        snapshot = AtomSnapshot(copy,parent.snapshot)
+        fresh = AtomSnapshot(copy)
+        self.assertIs(snapshot.atomic_nums, parent.snapshot.atomic_nums)
+        self.assertEqual(snapshot.atomic_nums, fresh.atomic_nums)
+        self.assertEqual(snapshot.charges, fresh.charges)
+        self.assertEqual(snapshot.hydrogens, fresh.hydrogens)
+        self.assertEqual((snapshot.charges[1],snapshot.charges[2],snapshot.hydrogens[2]), (-1,1,3))
+        self.assertEqual(parent.snapshot.charges[1], 0) #the parent's snapshot is left alone
+
+    def testSameAsFromScratch(self):
+        mol = make_molecule("Cl.O")
+        parent = state_analysis.analyze_molecule(mol)
+        copy = struct_ops.copy_molecule(mol)
+        transfer_proton(copy)
+        analysis = state_analysis.analyze_molecule(copy,parent)
+        fresh = make_molecule(copy.write("can").strip())
+        self.assertEqual(copy.write("can"), fresh.write("can"))
+        pka.get_all_pka(fresh)
+        sites = segmentation.segment_molecule(fresh,INTERACTION_INDEX)
+        self.assertEqual(sorted(source.subtype for source in analysis.sources), sorted(source.subtype for source in sites["sources"]))
+        self.assertEqual(sorted(sink.subtype for sink in analysis.sinks), sorted(sink.subtype for sink in sites["sinks"]))
+        self.assertEqual(analysis.pka_index.get(1), fresh.pka_index.get(1)) #chloride keeps its number, it's first in both SMILES
+
+    def testKeptOnState(self):
+        state = ReactionState(make_molecule("CCO"))
+        analysis = state_analysis.analyze(state)
+        self.assertIs(state.analysis, analysis)
+        self.assertIs(state_analysis.analyze(state), analysis)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Tests that generate_choices makes one reaction for a set of equivalent hydrogens, and still makes
+every reaction that isn't symmetric to another one.
+"""
+
+import unittest
+
+from openbabel.pybel import readstring
+
+from sic.brain import decision_engine
+from sic.brain.reaction_state import ReactionState
+from sic.structure import properties
+from sic.tests.molecules import make_molecule
+
+class SymmetricDuplicatesTest(unittest.TestCase):
+    def testSymmetryClasses(self):
+        mol = readstring("smi","C[OH2+]")
+        mol.addh()
+        classes = properties.get_symmetry_classes(mol)
+        self.assertEqual(classes[3], classes[5]) #the three hydrogens on the methyl
+        self.assertEqual(classes[6], classes[7]) #and the two on O
+        self.assertNotEqual(classes[3], classes[6])
+
+    def testHydronium(self):
+        """
+        Ethoxide can take any of the three hydrogens of hydronium, which is only one reaction.
+        """
+
+        state = ReactionState(make_molecule("CC[O-].[OH3+]"))
+        decision_engine.generate_choices(state)
+        transfers = [possibility for possibility in state.possibilities if possibility.parent_reaction.reaction_type == "proton_transfer"]
+        self.assertEqual(len(transfers), 1)
+        self.assertEqual(state.symmetric_duplicates, 2)
+
+    def testKey(self):
+        """
+        Equivalent hydrogens on different atoms are not merged, since the atoms they're on aren't the same.
+        """
+
+        state = ReactionState(make_molecule("OCCO.[OH-]"))
+        decision_engine.generate_choices(state)
+        transfers = [possibility for possibility in state.possibilities if possibility.parent_reaction.reaction_type == "proton_transfer"]
+        self.assertEqual(len(transfers), 2)
+        self.assertEqual(state.symmetric_duplicates, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Tests that states reached by different paths are merged by the TranspositionTable: states that only differ in which
+hydrogen moved share a key, the duplicate becomes a reference to the state expanded first, and shares its possibilities.
+"""
+
+import unittest
+
+from sic.brain import decision_engine
+from sic.brain.reaction_state import ReactionState, TranspositionTable
+from sic.structure import connectivity_table, struct_ops
+from sic.tests.molecules import make_molecule
+
+def transfer_proton(mol,hydrogen):
+    new_mol = struct_ops.copy_molecule(mol)
+    struct_ops.make_bond(2,hydrogen,new_mol) #second water's O (2) onto one of the hydronium's hydrogens
+    struct_ops.break_bond(hydrogen,1,new_mol) #hydronium's O (1) keeps the electrons
+    return new_mol
+
+class TranspositionTest(unittest.TestCase):
+    def setUp(self):
+        self.hydronium = make_molecule("[OH3+].O")
+        #atoms 3, 4 and 5 are the hydronium's hydrogens
+        self.first = ReactionState(transfer_proton(self.hydronium,3))
+        self.second = ReactionState(transfer_proton(self.hydronium,4))
+
+    def testKeyIgnoresWhichHydrogen(self):
+        self.assertNotEqual(self.first.molecule.connectivity_table.connectivity_table[2], self.second.molecule.connectivity_table.connectivity_table[2])
+        self.assertEqual(self.first.get_state_key(), self.second.get_state_key())
+        self.assertNotEqual(self.first.get_state_key(), ReactionState(self.hydronium).get_state_key()) #the charge moved
+
+    def testDuplicateBecomesReference(self):
+        table = TranspositionTable()
+        self.assertIs(table.get_original(self.second), self.second) #nothing expanded yet
+        table.add(self.first)
+        self.assertIs(table.get_original(self.first), self.first)
+        self.assertIs(table.get_original(self.second), self.first)
+        self.assertIs(self.second.same_as, self.first)
+        self.assertEqual(table.merged, 1)
+
+    def testExpandedOnce(self):
+        table = TranspositionTable()
+        decision_engine.generate_choices(self.first,table)
+        decision_engine.generate_choices(self.second,table)
+        self.assertIs(self.second.possibilities, self.first.possibilities)
+        self.assertIs(self.second.analysis, self.first.analysis)
+
+    def testBackingUp(self):
+        """
+        Going back up to a state (like search_greedy does) doesn't make its possibilities again.
+        """
+
+        table = TranspositionTable()
+        root = ReactionState(self.hydronium)
+        decision_engine.generate_choices(root,table)
+        possibilities = list(root.possibilities)
+        self.assertTrue(possibilities)
+        decision_engine.generate_choices(possibilities[0],table)
+        decision_engine.generate_choices(root,table)
+        self.assertEqual(list(root.possibilities), possibilities)
+
+if __name__ == "__main__":
+    unittest.main()
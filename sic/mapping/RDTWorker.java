@@ -0,0 +1,71 @@
+/*
+ * Persistent ReactionDecoder worker for SiC³.
+ *
+ * Keeps one JVM (and RDT's loaded classes) warm and answers mapping requests over stdin/stdout,
+ * one request per line, so that Python does not pay JVM startup for every reaction.
+ * Launched by sic/mapping/worker_pool.py as:
+ *
+ *     java -cp rdt-...-jar-with-dependencies.jar RDTWorker.java
+ *
+ * Protocol (UTF-8, newline terminated):
+ *     -> PING                      <- PONG
+ *     -> MAP reactants>>products   <- OK mapped_reaction_smiles | ERR message
+ * The worker prints READY once it is able to take requests. Anything RDT itself prints is discarded,
+ * so stdout only ever carries protocol lines.
+ */
+
+import java.io.BufferedReader;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+
+import org.openscience.cdk.interfaces.IReaction;
+import org.openscience.cdk.silent.SilentChemObjectBuilder;
+import org.openscience.cdk.smiles.SmiFlavor;
+import org.openscience.cdk.smiles.SmilesGenerator;
+import org.openscience.cdk.smiles.SmilesParser;
+import uk.ac.ebi.reactionblast.mechanism.MappingSolution;
+import uk.ac.ebi.reactionblast.mechanism.ReactionMechanismTool;
+import uk.ac.ebi.reactionblast.tools.StandardizeReaction;
+
+public class RDTWorker {
+
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        // RDT is chatty on stdout, keep it off the protocol channel
+        System.setOut(new PrintStream(OutputStream.nullOutputStream()));
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        SmilesParser parser = new SmilesParser(SilentChemObjectBuilder.getInstance());
+        SmilesGenerator generator = new SmilesGenerator(SmiFlavor.AtomAtomMap);
+        protocol.println("READY");
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.equals("PING")) {
+                protocol.println("PONG");
+            } else if (line.startsWith("MAP ")) {
+                protocol.println(map(line.substring(4), parser, generator));
+            } else {
+                protocol.println("ERR Unknown command: " + line);
+            }
+        }
+    }
+
+    private static String map(String reactionSmiles, SmilesParser parser, SmilesGenerator generator) {
+        try {
+            IReaction reaction = parser.parseReactionSmiles(reactionSmiles);
+            reaction.setID("SiC");
+            ReactionMechanismTool tool = new ReactionMechanismTool(reaction, true, true, false, new StandardizeReaction());
+            MappingSolution solution = tool.getSelectedSolution();
+            if (solution == null) {
+                return "ERR Could not find map between reactants and products.";
+            }
+            return "OK " + generator.create(solution.getReaction());
+        } catch (Throwable t) {
+            // one line per response, whatever the exception says
+            return "ERR " + String.valueOf(t).replace('\n', ' ').replace('\r', ' ');
+        }
+    }
+}
@@ -0,0 +1,203 @@
+"""
+Content-addressed cache for atom-atom mappings.
+
+The same reactions get submitted over and over, and a mapping only depends on the reactants and products,
+so get_mapping results are cached under the "reactants>>products" string that properties.get_mapping
+builds with utils.write_mol. Each entry holds the mapping dict and ReactionDecoder's canonical reactant
+and product SMILES, i.e. exactly what get_mapping returns.
+Keys are prefixed with the backend's name and version (see get_key), so mappings from different backends are
+kept apart, and bumping a backend's entry in mappers.VERSIONS stops mappings it made before the change from
+being served. Those are left in the file, they just aren't read any more.
+
+There are two tiers: a small in-memory LRU in front of a SQLite file that survives restarts.
+The file lives next to runserver.py unless SIC_MAPPING_CACHE says otherwise; set it to an empty string
+to keep the cache in memory only.
+
+The cache can be pre-warmed from a directory of SiC-format files:
+
+    python3 -m sic.mapping.cache reaction_files
+"""
+
+import argparse
+import collections
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from sic.mapping import mappers
+
+DEFAULT_CACHE_PATH = os.environ.get("SIC_MAPPING_CACHE",str(Path(__file__).parent.parent.parent.joinpath("mapping_cache.sqlite3")))
+DEFAULT_LRU_SIZE = 512
+
+class MappingCache(object):
+    """
+    Maps "reactants>>products" strings to (mapping,reactants,products) tuples.
+    If path is falsy, only the in-memory tier is used.
+    Safe to share between threads.
+    """
+
+    def __init__(self,path=DEFAULT_CACHE_PATH,max_entries=DEFAULT_LRU_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict() #oldest first, so popitem(last=False) evicts
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path,check_same_thread=False) #we do our own locking
+            self.db.execute("CREATE TABLE IF NOT EXISTS mappings (reaction TEXT PRIMARY KEY, mapping TEXT NOT NULL, reactants TEXT NOT NULL, products TEXT NOT NULL)")
+            self.db.commit()
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "MappingCache<Path:{},InMemory:{},Hits:{},Misses:{}>".format(self.path,len(self.entries),self.hits,self.misses)
+
+    def get(self,reaction):
+        """
+        Returns the cached (mapping,reactants,products) for a reaction string, or None.
+        The mapping dict is a copy, so callers are free to modify it.
+        """
+
+        with self.lock:
+            if reaction in self.entries:
+                self.entries.move_to_end(reaction)
+                entry = self.entries[reaction]
+            else:
+                entry = self._load(reaction)
+                if entry is None:
+                    self.misses += 1
+                    return None
+                self._remember(reaction,entry)
+            self.hits += 1
+        mapping,reactants,products = entry
+        return (dict(mapping),reactants,products)
+
+    def put(self,reaction,result):
+        """
+        Stores a (mapping,reactants,products) tuple, as returned by get_mapping, in both tiers.
+        """
+
+        mapping,reactants,products = result
+        entry = (dict(mapping),reactants,products)
+        with self.lock:
+            self._remember(reaction,entry)
+            if self.db:
+                #JSON keys are always strings, _load turns them back into atom indices
+                self.db.execute("INSERT OR REPLACE INTO mappings VALUES (?,?,?,?)",(reaction,json.dumps(entry[0]),reactants,products))
+                self.db.commit()
+
+    def clear(self):
+        """
+        Empties both tiers.
+        """
+
+        with self.lock:
+            self.entries.clear()
+            if self.db:
+                self.db.execute("DELETE FROM mappings")
+                self.db.commit()
+
+    def close(self):
+        with self.lock:
+            if self.db:
+                self.db.close()
+                self.db = None
+
+    def _remember(self,reaction,entry):
+        self.entries[reaction] = entry
+        self.entries.move_to_end(reaction)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _load(self,reaction):
+        if not self.db:
+            return None
+        row = self.db.execute("SELECT mapping,reactants,products FROM mappings WHERE reaction = ?",(reaction,)).fetchone()
+        if row is None:
+            return None
+        mapping = dict((int(k),v) for k,v in json.loads(row[0]).items())
+        return (mapping,row[1],row[2])
+
+def get_key(reaction,mapper="rdt"):
+    """
+    Returns the cache key for a "reactants>>products" string mapped by a particular backend,
+    e.g. "graph@2:CCO>>CC=O.[H][H]".
+    """
+
+    return "%s@%d:%s" % (mapper,mappers.VERSIONS[mapper],reaction)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def configure_cache(path=DEFAULT_CACHE_PATH,max_entries=DEFAULT_LRU_SIZE):
+    """
+    Replaces the shared cache with one at path (None or "" for memory only), closing the current one.
+    """
+
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = MappingCache(path=path,max_entries=max_entries)
+
+def get_cache():
+    """
+    Returns the shared MappingCache, opening it the first time it is asked for.
+    """
+
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MappingCache()
+        return _cache
+
+def prewarm(directory,mapper=None):
+    """
+    Maps every SiC-format reaction file under directory (recursively) so that their mappings land in the
+    shared cache. mapper is passed on to get_mappings, which maps them all as one batch.
+    Files that don't parse or don't map are reported and skipped.
+    Returns the number of reactions that are now cached.
+    """
+
+    #imported here because properties imports this module
+    from openbabel import pybel
+    from sic.sic_io import sic_io
+    from sic.structure import properties
+
+    paths = []
+    pairs = []
+    for path in sorted(Path(directory).rglob("*")):
+        if not path.is_file():
+            continue
+        try:
+            with open(path) as sic_input:
+                react_obj = sic_io.parse_sic_file(sic_input)
+            if not react_obj["reactants"] or not react_obj["products"]:
+                raise ValueError("Reactants and products are both required.")
+            #same steps as sic.find_mechanism and ReactionState, so the cache keys match
+            reactants = pybel.readstring("smi",sic_io.create_state_smiles(react_obj["reactants"]))
+            products = pybel.readstring("smi",sic_io.create_state_smiles(react_obj["products"]))
+        except (OSError,IndexError,ValueError) as e:
+            print("Skipping {}: {}".format(path,e))
+            continue
+        paths.append(path)
+        pairs.append((reactants,products))
+    cached = 0
+    for path,outcome in zip(paths,properties.get_mappings(pairs,mapper=mapper)):
+        if outcome["error"]:
+            print("Skipping {}: {}".format(path,outcome["error"]))
+        else:
+            cached += 1
+    return cached
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-warm the SiC³ atom-mapping cache from SiC-format reaction files")
+    parser.add_argument("directory",help="Directory containing SiC-format input files, e.g. reaction_files")
+    parser.add_argument("-m","--mapper",help="Atom mapper to pre-warm the cache for (see sic/mapping/mappers.py)")
+    args = parser.parse_args()
+    print("{} reactions cached.".format(prewarm(args.directory,mapper=args.mapper)))
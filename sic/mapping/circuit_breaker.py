@@ -0,0 +1,169 @@
+"""
+Circuit breaker for atom-mapper backends that can fail as a whole, i.e. ReactionDecoder.
+
+When RDT keeps failing (the JVM won't start, the JAR is missing, every request times out), sending it
+more requests just ties up server threads for the length of the mapping deadline each time. After
+FAILURE_THRESHOLD failures in a row the breaker opens, and calls fail straight away with a
+CircuitOpenError (or go to a fallback mapper, see mappers.FALLBACK_MAPPER). After RESET_TIMEOUT seconds
+one trial call is let through; if it works the breaker closes again, otherwise it stays open for
+another RESET_TIMEOUT.
+
+Only RuntimeErrors count as failures. A ValueError means the mapper answered but couldn't map that
+particular reaction, which says nothing bad about the mapper, and a worker_pool.PoolBusyError means
+it was never asked, because every worker was busy with other requests.
+
+Every breaker keeps counters, which get_stats() returns, so mapping failures under load can be seen
+(the server shows them at /mapping_stats).
+"""
+
+import os
+import threading
+import time
+
+from sic.mapping import rdt, worker_pool
+
+FAILURE_THRESHOLD = int(os.environ.get("SIC_BREAKER_FAILURES",5)) #failures in a row before the breaker opens
+RESET_TIMEOUT = float(os.environ.get("SIC_BREAKER_RESET",60)) #seconds before an open breaker lets a trial call through
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling a mapper whose breaker is open.
+    """
+
+class CircuitBreaker(object):
+    """
+    Tracks the failures of one mapper and decides whether it should be called at all.
+    Safe to share between threads. clock can be replaced for testing.
+
+    Counters:
+
+    - calls: calls that were let through to the mapper
+    - successes: calls that returned a mapping
+    - input_errors: calls that raised a ValueError (bad reaction, not a bad mapper)
+    - failures: calls that raised a RuntimeError, timeouts included
+    - timeouts: failures that were rdt.MappingTimeoutErrors
+    - busy: calls that raised a worker_pool.PoolBusyError (not failures, the mapper was never asked)
+    - rejected: calls refused because the breaker was open
+    - fallbacks: failed or refused calls that went to a fallback mapper instead (counted by the caller)
+    - opened: how many times the breaker has opened
+    """
+
+    def __init__(self,name,failure_threshold=FAILURE_THRESHOLD,reset_timeout=RESET_TIMEOUT,clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.counters = dict((counter,0) for counter in ("calls","successes","input_errors","failures","timeouts","busy","rejected","fallbacks","opened"))
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "CircuitBreaker<Name:{},State:{},Failures:{}>".format(self.name,self.state,self.consecutive_failures)
+
+    def allow(self):
+        """
+        Returns True if a call may go ahead. An open breaker lets one trial call through once
+        reset_timeout has passed; everything else is refused (and counted) until that call reports back.
+        """
+
+        with self.lock:
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self.trial_running):
+                self.trial_running = self.state == HALF_OPEN
+                self.counters["calls"] += 1
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record(self,outcome):
+        """
+        Records what an allowed call came back with: a result, or the exception it raised/returned.
+        """
+
+        with self.lock:
+            self.trial_running = False
+            if isinstance(outcome,worker_pool.PoolBusyError):
+                self.counters["busy"] += 1 #neither a failure nor a success, the breaker stays as it was
+                return
+            failed = isinstance(outcome,Exception) and not isinstance(outcome,ValueError)
+            if not failed:
+                #a ValueError still means the mapper is working, it just didn't like the reaction
+                self.counters["input_errors" if isinstance(outcome,ValueError) else "successes"] += 1
+                self.consecutive_failures = 0
+                self.state = CLOSED
+                return
+            self.counters["failures"] += 1
+            if isinstance(outcome,rdt.MappingTimeoutError):
+                self.counters["timeouts"] += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.counters["opened"] += 1
+                    print("{} mapper failed {} times in a row, not calling it for {} seconds".format(self.name,self.consecutive_failures,self.reset_timeout))
+                self.state = OPEN
+                self.opened_at = self.clock()
+
+    def count_fallback(self):
+        with self.lock:
+            self.counters["fallbacks"] += 1
+
+    def call(self,function,*args):
+        """
+        Calls function(*args) if the breaker allows it, raising a CircuitOpenError otherwise.
+        """
+
+        if not self.allow():
+            raise CircuitOpenError("The {} mapper failed too often recently and is switched off for now.".format(self.name))
+        try:
+            result = function(*args)
+        except (ValueError,RuntimeError) as e:
+            self.record(e)
+            raise
+        except BaseException:
+            self.record(RuntimeError("Mapper call interrupted."))
+            raise
+        self.record(result)
+        return result
+
+    def call_batch(self,batch_function,pairs):
+        """
+        Batch version of call for BATCH_MAPPERS-style functions: every pair gets a CircuitOpenError if the
+        breaker is open, and otherwise every result or returned exception is recorded like a separate call.
+        """
+
+        if not self.allow():
+            error = CircuitOpenError("The {} mapper failed too often recently and is switched off for now.".format(self.name))
+            return [error] * len(pairs)
+        try:
+            results = batch_function(pairs)
+        except (ValueError,RuntimeError) as e:
+            self.record(e)
+            raise
+        for i,outcome in enumerate(results):
+            if i > 0:
+                with self.lock:
+                    self.counters["calls"] += 1
+            self.record(outcome)
+        return results
+
+    def get_stats(self):
+        """
+        Returns the counters along with the breaker's state and current run of failures.
+        """
+
+        with self.lock:
+            stats = dict(self.counters)
+            stats["state"] = self.state
+            stats["consecutive_failures"] = self.consecutive_failures
+            return stats
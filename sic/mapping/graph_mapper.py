@@ -0,0 +1,212 @@
+"""
+In-process atom mapper that doesn't need ReactionDecoder (or Java at all).
+
+Finds the atom-atom mapping that needs the fewest bond edits to turn the reactants into the products,
+measured the same way properties.get_bond_distance measures it: the sum of bond-order differences between
+mapped heavy atoms, plus the difference in the number of hydrogens on each mapped atom. This is the
+"minimal chemical distance" idea behind most maximum-common-substructure mappers, and for the small
+textbook reactions SiC³ deals with it gives the same answer as RDT.
+
+The search is a depth-first branch and bound over the ConnectivityTable graphs of both sides. Reactant
+atoms are assigned in an order that keeps each new atom next to already-assigned ones, product candidates
+are tried cheapest-first, and any partial mapping that already costs as much as the best complete one is
+dropped. Searches that go past MAX_NODES return the best mapping found so far.
+"""
+
+from openbabel import openbabel, pybel
+
+from sic import utils
+from sic.structure.connectivity_table import ConnectivityTable
+
+MAX_NODES = 20000 #search nodes before we settle for the best mapping found so far
+
+class ReactionGraph(object):
+    """
+    The parts of a ConnectivityTable the mapper needs, for one side of a reaction.
+    Only the atoms written out in the SMILES are mappable; hydrogens are counted per atom, the way
+    the closer_to_product table counts them.
+
+    - smiles: the SMILES string the atom indices refer to
+    - elements: {atom_idx : atomic number}
+    - neighbors: {atom_idx : {bonded_atom_idx : bond order}}
+    - hydrogens: {atom_idx : number of H atoms bonded}
+    - charges: {atom_idx : formal charge}
+    """
+
+    def __init__(self,smiles):
+        self.smiles = smiles
+        mol = pybel.readstring("smi",smiles)
+        atom_count = mol.OBMol.NumAtoms() #before addh, so only the atoms that are in the SMILES
+        mol.addh()
+        table = ConnectivityTable(mol)
+        atoms = range(1,atom_count + 1)
+        self.elements = dict((idx,mol.OBMol.GetAtom(idx).GetAtomicNum()) for idx in atoms)
+        self.charges = dict((idx,mol.OBMol.GetAtom(idx).GetFormalCharge()) for idx in atoms)
+        self.neighbors = dict((idx,{}) for idx in atoms)
+        self.hydrogens = dict((idx,0) for idx in atoms)
+        for bond,order in table.closer_to_product_table.items():
+            if "H" in bond:
+                for atom in bond:
+                    if atom != "H" and atom in self.hydrogens:
+                        self.hydrogens[atom] += order
+            else:
+                start,end = bond
+                if start in self.neighbors and end in self.neighbors:
+                    self.neighbors[start][end] = order
+                    self.neighbors[end][start] = order
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "ReactionGraph<SMILES:{},Atoms:{}>".format(self.smiles,len(self.elements))
+
+    def atoms_by_element(self):
+        """
+        Returns {element : [atom indices]}, with each list in ascending order.
+        """
+        by_element = {}
+        for idx,element in sorted(self.elements.items()):
+            by_element.setdefault(element,[]).append(idx)
+        return by_element
+
+def map_reaction(reactants,products,max_nodes=MAX_NODES):
+    """
+    Mapper backend with the same interface as the ReactionDecoder one: takes reactant and product
+    Molecules and returns (mapping,reactant_smiles,product_smiles), where mapping is
+    {reactant_atom_idx : product_atom_idx} over the atoms of the two SMILES strings.
+    Raises a ValueError if the two sides don't have the same atoms.
+    """
+
+    react_graph = ReactionGraph(utils.write_mol(reactants))
+    prod_graph = ReactionGraph(utils.write_mol(products))
+    return (map_graphs(react_graph,prod_graph,max_nodes),react_graph.smiles,prod_graph.smiles)
+
+def map_graphs(react_graph,prod_graph,max_nodes=MAX_NODES):
+    """
+    Returns the {reactant_atom_idx : product_atom_idx} mapping with the fewest bond edits between two
+    ReactionGraphs (or the best one found within max_nodes search nodes).
+    """
+
+    react_elements = react_graph.atoms_by_element()
+    prod_elements = prod_graph.atoms_by_element()
+    if dict((k,len(v)) for k,v in react_elements.items()) != dict((k,len(v)) for k,v in prod_elements.items()):
+        raise ValueError("Could not find map between reactants and products: they do not contain the same atoms.")
+    order = assignment_order(react_graph,react_elements)
+    search = {"best_cost": float("inf"), "best": None, "nodes": 0}
+    forward = {} #reactant atom -> product atom
+    backward = {} #product atom -> reactant atom
+
+    def extend(depth,cost):
+        if depth == len(order):
+            search["best_cost"] = cost
+            search["best"] = dict(forward)
+            return
+        search["nodes"] += 1
+        if search["nodes"] > max_nodes and search["best"] is not None:
+            return
+        atom = order[depth]
+        candidates = []
+        for prod_atom in prod_elements[react_graph.elements[atom]]:
+            if prod_atom not in backward:
+                candidates.append((added_cost(atom,prod_atom,react_graph,prod_graph,forward,backward),prod_atom))
+        candidates.sort()
+        for extra,prod_atom in candidates:
+            if cost + extra >= search["best_cost"]:
+                break #sorted, so nothing after this is any better
+            forward[atom] = prod_atom
+            backward[prod_atom] = atom
+            extend(depth + 1,cost + extra)
+            del forward[atom]
+            del backward[prod_atom]
+
+    extend(0,0)
+    return search["best"]
+
+def added_cost(atom,prod_atom,react_graph,prod_graph,forward,backward):
+    """
+    Bond edits that mapping atom onto prod_atom adds to a partial mapping: the hydrogen difference
+    on the pair, plus every bond between the pair and already-mapped atoms that doesn't match.
+    """
+
+    cost = abs(react_graph.hydrogens[atom] - prod_graph.hydrogens[prod_atom])
+    react_bonds = react_graph.neighbors[atom]
+    prod_bonds = prod_graph.neighbors[prod_atom]
+    for bonded,order in react_bonds.items():
+        if bonded in forward:
+            cost += abs(order - prod_bonds.get(forward[bonded],0))
+    for bonded,order in prod_bonds.items():
+        if bonded in backward and backward[bonded] not in react_bonds:
+            cost += order #bond made in the product that isn't there in the reactants
+    return cost
+
+def assignment_order(react_graph,react_elements):
+    """
+    Orders the reactant atoms for the search: start from the atom with the rarest element, then keep taking
+    the atom with the most bonds to atoms already in the order, so every choice is constrained by earlier ones.
+    Rarer elements (fewer candidates) and lower indices break ties, which keeps the result deterministic.
+    """
+
+    order = []
+    remaining = set(react_graph.elements)
+    def priority(atom):
+        placed_neighbors = sum(1 for bonded in react_graph.neighbors[atom] if bonded not in remaining)
+        return (-placed_neighbors,len(react_elements[react_graph.elements[atom]]),-len(react_graph.neighbors[atom]),atom)
+    while remaining:
+        atom = min(remaining,key=priority)
+        order.append(atom)
+        remaining.remove(atom)
+    return order
+
+def get_edit_count(mapping,react_graph,prod_graph):
+    """
+    Returns the bond edits a complete mapping between two ReactionGraphs stands for, counted like map_graphs counts them.
+    """
+
+    cost = sum(abs(react_graph.hydrogens[atom] - prod_graph.hydrogens[prod_atom]) for atom,prod_atom in mapping.items())
+    mapped_bonds = set()
+    for atom,bonds in react_graph.neighbors.items():
+        for bonded,order in bonds.items():
+            if atom < bonded:
+                cost += abs(order - prod_graph.neighbors[mapping[atom]].get(mapping[bonded],0))
+                mapped_bonds.add(frozenset((mapping[atom],mapping[bonded])))
+    for prod_atom,bonds in prod_graph.neighbors.items():
+        for bonded,order in bonds.items():
+            if prod_atom < bonded and frozenset((prod_atom,bonded)) not in mapped_bonds:
+                cost += order #bond made in the product that isn't there in the reactants
+    return cost
+
+def get_canonical_labels(smiles):
+    """
+    Returns OpenBabel's canonical label for every atom of smiles, indexed by atom index (index 0 is unused).
+    Two SMILES strings for the same molecule give their matching atoms the same labels.
+    """
+
+    obmol = pybel.readstring("smi",smiles).OBMol
+    classes = openbabel.vectorUnsignedInt()
+    openbabel.OBGraphSym(obmol).GetSymmetry(classes)
+    labels = openbabel.vectorUnsignedInt()
+    openbabel.CanonicalLabels(obmol,classes,labels)
+    return [None] + list(labels)
+
+def reindex_mapping(mapping,mapped_smiles,smiles):
+    """
+    A mapping's atom indices refer to the reactant SMILES the mapper gave back (mapped_smiles). This returns
+    the same mapping over the atoms of smiles, another SMILES string for the same reactants, by matching
+    up the atoms of the two that have the same canonical label (see get_canonical_labels).
+    Any symmetric match is as good as any other, since symmetric atoms have the same bonds.
+    Raises a ValueError if the match isn't exact (same bonds, hydrogens and charges), since a search
+    on a wrong mapping would go on without anything telling it so.
+    """
+
+    if mapped_smiles == smiles:
+        return mapping
+    old_graph = ReactionGraph(mapped_smiles)
+    new_graph = ReactionGraph(smiles)
+    new_atoms = dict((label,atom) for atom,label in enumerate(get_canonical_labels(smiles)) if atom)
+    isomorphism = dict((atom,new_atoms.get(label)) for atom,label in enumerate(get_canonical_labels(mapped_smiles)) if atom)
+    if (len(isomorphism) != len(new_atoms) or None in isomorphism.values()
+            or any(old_graph.elements[atom] != new_graph.elements[new_atom] or old_graph.charges[atom] != new_graph.charges[new_atom] for atom,new_atom in isomorphism.items())
+            or get_edit_count(isomorphism,old_graph,new_graph) != 0):
+        raise ValueError("Could not match the atoms of {} with those of {}.".format(mapped_smiles,smiles))
+    return dict((isomorphism[react_atom],prod_atom) for react_atom,prod_atom in mapping.items())
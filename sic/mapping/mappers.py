@@ -0,0 +1,149 @@
+"""
+Atom-mapper backends that properties.get_mapping can choose from.
+
+Every backend is a function with the same interface:
+
+    map_function(reactants,products) -> (mapping,reactant_smiles,product_smiles)
+
+where reactants and products are Molecules, mapping is {reactant_atom_idx : product_atom_idx}, and the two
+SMILES strings are what the atom indices in the mapping refer to (ReactionState re-reads them for that reason).
+Backends raise a ValueError when the reaction can't be mapped.
+
+Backends can also register a batch version in BATCH_MAPPERS, taking a list of (reactants,products) pairs and
+returning, in order, either the result tuple or the exception for each pair. Backends without one are
+simply called once per pair.
+
+Backends that can fail as a whole (a JVM that won't start or keeps timing out) get a CircuitBreaker in
+BREAKERS, which get_mapper and get_batch_mapper put in front of them. When such a backend fails,
+properties.get_mapping retries with FALLBACK_MAPPER (SIC_FALLBACK_MAPPER in the environment) if one is set,
+and otherwise lets the error through. get_stats returns every breaker's counters.
+
+Every backend has a version in VERSIONS that goes into its mapping cache keys (see sic.mapping.cache.get_key).
+Bump it with any change that can make the backend map a reaction differently, e.g. an upgraded ReactionDecoder
+JAR or a change to graph_mapper, or the cache will keep serving the old mappings.
+
+NOTE: The names here are what get_mechanism, sic.py's --mapper and the server accept.
+"""
+
+import os
+
+from sic import utils
+from sic.mapping import circuit_breaker, graph_mapper, rdt, worker_pool
+
+def map_with_rdt(reactants,products):
+    """
+    Maps a reaction with ReactionDecoder, using the shared pool of warm workers when it is available
+    and a fresh JVM otherwise.
+    """
+
+    input_smiles = "%s>>%s" % (utils.write_mol(reactants),utils.write_mol(products))
+    pool = worker_pool.get_pool()
+    if pool:
+        mapping_string = pool.map(input_smiles)
+    else:
+        mapping_string = rdt.run_rdt(input_smiles)
+    return rdt.parse_mapping_string(mapping_string)
+
+def map_batch_with_rdt(pairs):
+    """
+    Maps a list of (reactants,products) pairs with one ReactionDecoder JVM instead of one JVM per reaction.
+    """
+
+    input_list = ["%s>>%s" % (utils.write_mol(reactants),utils.write_mol(products)) for reactants,products in pairs]
+    mapping_strings = worker_pool.map_batch(input_list)
+    if mapping_strings is None:
+        #no workers, so this is one JVM per reaction after all
+        mapping_strings = []
+        for input_smiles in input_list:
+            try:
+                mapping_strings.append(rdt.run_rdt(input_smiles))
+            except (ValueError,RuntimeError) as e:
+                mapping_strings.append(e)
+    results = []
+    for mapping_string in mapping_strings:
+        if isinstance(mapping_string,Exception):
+            results.append(mapping_string)
+            continue
+        try:
+            results.append(rdt.parse_mapping_string(mapping_string))
+        except (ValueError,IndexError,KeyError) as e:
+            results.append(ValueError("Could not read mapping from Reaction Decoder: {}".format(e)))
+    return results
+
+def map_batch_one_by_one(map_function,pairs):
+    """
+    Batch version of any backend: calls it once per pair, collecting errors instead of raising them.
+    """
+
+    results = []
+    for reactants,products in pairs:
+        try:
+            results.append(map_function(reactants,products))
+        except (ValueError,RuntimeError) as e:
+            results.append(e)
+    return results
+
+MAPPERS = {
+        "rdt": map_with_rdt, #ReactionDecoder, in a JVM
+        "graph": graph_mapper.map_reaction #minimal bond-edit search, in-process
+        }
+
+BATCH_MAPPERS = {
+        "rdt": map_batch_with_rdt
+        }
+
+VERSIONS = {
+        "rdt": 1,
+        "graph": 2 #2: reindex_mapping matches atoms by canonical label
+        }
+
+BREAKERS = {
+        "rdt": circuit_breaker.CircuitBreaker("rdt")
+        }
+
+DEFAULT_MAPPER = os.environ.get("SIC_MAPPER","rdt")
+FALLBACK_MAPPER = os.environ.get("SIC_FALLBACK_MAPPER","") #empty for none, i.e. failures are errors
+
+def get_mapper(name):
+    """
+    Returns the backend function registered under name, behind its circuit breaker if it has one.
+    Raises a ValueError for unknown names.
+    """
+
+    if name not in MAPPERS:
+        raise ValueError("Mapper {} is not supported. Choose one of: {}".format(name,", ".join(sorted(MAPPERS))))
+    map_function = MAPPERS[name]
+    if name in BREAKERS:
+        return lambda reactants,products: BREAKERS[name].call(map_function,reactants,products)
+    return map_function
+
+def get_batch_mapper(name):
+    """
+    Returns a function mapping a list of (reactants,products) pairs with the named backend.
+    """
+
+    map_function = get_mapper(name)
+    if name in BATCH_MAPPERS:
+        if name in BREAKERS:
+            return lambda pairs: BREAKERS[name].call_batch(BATCH_MAPPERS[name],pairs)
+        return BATCH_MAPPERS[name]
+    return lambda pairs: map_batch_one_by_one(map_function,pairs)
+
+def get_fallback(name):
+    """
+    Returns the name of the mapper to use when the named one fails, or None if there isn't one.
+    Only backends with a circuit breaker fall back; the others' errors are about the reaction.
+    """
+
+    if name in BREAKERS and FALLBACK_MAPPER and FALLBACK_MAPPER != name:
+        get_mapper(FALLBACK_MAPPER) #fail loudly on a misspelt SIC_FALLBACK_MAPPER
+        BREAKERS[name].count_fallback()
+        return FALLBACK_MAPPER
+    return None
+
+def get_stats():
+    """
+    Returns {mapper name : counters} for every mapper with a circuit breaker (see CircuitBreaker).
+    """
+
+    return dict((name,breaker.get_stats()) for name,breaker in BREAKERS.items())
@@ -0,0 +1,182 @@
+"""
+Everything needed to talk to the Reaction Decoder Tool (RDT) JAR.
+Holds the one-shot "java -jar" invocation that SiC³ has always used, as well as
+the helpers shared with the persistent worker pool (see worker_pool.py), so that
+both paths produce the same atom-mapped SMILES string for properties.get_mapping to parse.
+
+Every ReactionDecoder run has a deadline, MAPPING_TIMEOUT seconds (SIC_RDT_TIMEOUT in the environment,
+0 for none). A JVM that goes past it is killed along with its whole process group, and the caller gets a
+MappingTimeoutError instead of a server thread that hangs forever.
+"""
+
+import os
+import re
+import signal
+import subprocess
+import tempfile
+from pathlib import Path
+
+# FileName of the Reaction Decoder JAR, located in the sic package directory, up one directory from here.
+REACTION_DECODER_JAR = "rdt-2.5.0-SNAPSHOT-jar-with-dependencies.jar"
+# Java source for the persistent worker, launched in single-file source mode against the JAR's classpath.
+WORKER_SOURCE = "RDTWorker.java"
+MAPPING_TIMEOUT = float(os.environ.get("SIC_RDT_TIMEOUT",60)) #seconds a single mapping may take
+
+class MappingTimeoutError(RuntimeError):
+    """
+    Raised when ReactionDecoder doesn't answer within the mapping deadline. By the time this is
+    raised the process has been killed. A RuntimeError, since the mapper rather than the reaction
+    is what failed as far as we can tell.
+    """
+
+def get_jar_dir():
+    """
+    Returns the directory the ReactionDecoder JAR lives in.
+    """
+
+    return Path(__file__).parent.parent
+
+def get_jar_path():
+    """
+    Returns the path to the ReactionDecoder JAR, raising a RuntimeError if it is missing,
+    since nothing mapping-related can happen without it.
+    """
+
+    jar_path = get_jar_dir().joinpath(REACTION_DECODER_JAR)
+    if not jar_path.exists():
+        raise RuntimeError("Can not find ReactionDecoder JAR", jar_path)
+    return jar_path
+
+def get_worker_command():
+    """
+    Returns the command line that starts one persistent RDT worker.
+    Single-file source launching needs a JDK (not just a JRE), which is why the pool
+    falls back to run_rdt when a worker fails to start.
+    """
+
+    worker_source = Path(__file__).parent.joinpath(WORKER_SOURCE)
+    return ["java","-cp",str(get_jar_path().resolve()),str(worker_source.resolve())] #absolute, since workers run in their own scratch directories
+
+def get_timeout(timeout=None):
+    """
+    Returns the deadline to use in seconds, MAPPING_TIMEOUT unless timeout is given, or None for no deadline.
+    """
+
+    timeout = MAPPING_TIMEOUT if timeout is None else timeout
+    return timeout if timeout > 0 else None
+
+def kill_process_group(process):
+    """
+    Kills a process started with start_new_session=True together with everything it started, then reaps it.
+    """
+
+    try:
+        os.killpg(process.pid,signal.SIGKILL)
+    except (ProcessLookupError,PermissionError):
+        process.kill() #group already gone, make sure the process itself is too
+    process.wait()
+
+def run_with_deadline(command,timeout=None,cwd=None):
+    """
+    Runs command in a session of its own and returns (stdout,stderr), killing the whole process group
+    and raising a MappingTimeoutError if it takes longer than timeout seconds (see get_timeout).
+    """
+
+    timeout = get_timeout(timeout)
+    process = subprocess.Popen(command,stdout=subprocess.PIPE,stderr=subprocess.PIPE,text=True,cwd=cwd,start_new_session=True)
+    try:
+        return process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_process_group(process)
+        raise MappingTimeoutError("ReactionDecoder did not finish within {} seconds.".format(timeout))
+    except BaseException:
+        kill_process_group(process) #e.g. KeyboardInterrupt, don't leave the JVM behind
+        raise
+
+def run_rdt(input_smiles,timeout=None):
+    """
+    Runs a fresh ReactionDecoder JVM on a "reactants>>products" SMILES string and returns the
+    atom-mapped reaction SMILES that RDT selected.
+    Raises a ValueError if RDT complains, since so far that has meant the input was bad.
+
+    RDT writes its results (ECBLAST_smiles_AAM.txt and friends) into its working directory, so every call
+    gets its own scratch directory, which is deleted afterwards whatever happens. This keeps concurrent
+    mappings from reading each other's output files.
+    Raises a MappingTimeoutError if RDT runs past the deadline (see get_timeout).
+    """
+
+    jar_path = get_jar_path().resolve()
+    with tempfile.TemporaryDirectory(prefix="sic_rdt_") as scratch_dir:
+        stdout,stderr = run_with_deadline(["java","-jar",str(jar_path),"-Q","SMI","-q",input_smiles,"-g","-j","AAM","-f","TEXT"],timeout,cwd=scratch_dir)
+        if stderr:
+            # so far seen output here with uneven numbers of atoms, which get_mapping now checks before calling RDT,
+            # but there may be other causes.
+            raise ValueError("Error from Reaction Decoder:\n" + stderr)
+        if not stdout:
+            raise ValueError("Could not find map between reactants and products.")
+        return read_aam_text_file(stdout,scratch_dir)
+
+def read_aam_text_file(rdt_stdout,scratch_dir):
+    """
+    Finds the text file RDT says it wrote its output to, and returns the selected mapping from it.
+    Only files inside scratch_dir are read; anything else would belong to another call.
+    """
+
+    path_prefix = "Output is presented in text format: "
+    AAM_text_file_path = None
+    for stdout_line in rdt_stdout.split('\n'):
+        if stdout_line.startswith(path_prefix):
+            AAM_text_file_path = stdout_line[len(path_prefix):].strip()
+            break
+    # get mapping string out of ECBLAST_smiles_AAM.txt file
+    if not AAM_text_file_path:
+        message = f"No output text file path found in RDT stdout. Looking for \"{path_prefix}\""
+        raise RuntimeError(message, rdt_stdout)
+    scratch_dir = Path(scratch_dir).resolve()
+    AAM_text_file_path = scratch_dir.joinpath(AAM_text_file_path).resolve() #relative paths are relative to RDT's cwd
+    if scratch_dir not in AAM_text_file_path.parents:
+        raise RuntimeError("RDT wrote its output outside of the scratch directory.", str(AAM_text_file_path))
+    with open(AAM_text_file_path) as f:
+        file_content = f.readlines()
+        line_before_aam_mapping = "SELECTED AAM MAPPING\n"
+        mapping_index = file_content.index(line_before_aam_mapping) + 1
+        mapping_string = file_content[mapping_index].strip('\n')
+        print(line_before_aam_mapping + mapping_string)
+    return mapping_string
+
+def parse_mapping_string(mapping_string):
+    """
+    Turns an atom-mapped reaction SMILES from ReactionDecoder into the
+    {reactant_atom_idx : product_atom_idx} dictionary used by get_bond_distance, and returns it along
+    with the mapped reactant and product SMILES.
+    """
+
+    mapping = {}
+    if not mapping_string:
+        raise ValueError("Could not find map between reactants and products.")
+    #remove hydrogen-only maps - these are unlikely but they do come up and mess up the rest of our procedure
+    #also I'm not digging into their code to figure out why they do this only *sometimes*, I'm mad
+    #enough at Java as it is.
+    hydrogen_re = re.compile(r"\[H:[0-9]*\]")
+    mapping_string = hydrogen_re.sub("",mapping_string)
+    #split into reactant and product map
+    react_map,prod_map = mapping_string.split(">>")
+    #look for the [] groups
+    react_groups = re.findall(r"\[[^\]]+\]",react_map)
+    prod_groups = re.findall(r"\[[^\]]+\]",prod_map)
+    internal_mapping = {} #to make up for the H groups we excised. Most of the time this will just be a map from a number to itself, but gotta future-proof.
+    for i in range(len(react_groups)):
+        current_group = react_groups[i]
+        number = int(current_group.split(":")[-1].replace("]","")) 
+        internal_mapping[number] = i+1 #this should usually be the same...
+    #now map against products
+    for j in range(len(prod_groups)):  
+        current_group = prod_groups[j]
+        number = int(current_group.split(":")[-1].replace("]",""))
+        if number <= (i+1) :  # check if the number of atoms in the reactants is the same in the products
+            mapping[internal_mapping[number]] = j+1 #j+1 is the atom index in the product. internal_mapping[number] is the atom index in the reactant
+        else:
+            print("Oops! Wrong input. Please try again -_-")
+            break
+    print("Mapping is made ", (mapping))
+    return (mapping,react_map,prod_map) #so that we can use the actual strings as our input and avoid issues with OBabel's buggy SMILES code
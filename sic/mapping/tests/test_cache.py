@@ -0,0 +1,77 @@
+"""
+Tests the atom-mapping cache: LRU behaviour of the in-memory tier, and that the SQLite tier
+gives back exactly what was stored after the cache is reopened, and that a mapper's cached mappings
+stop being served once its version is bumped.
+"""
+
+import os
+import tempfile
+import unittest
+
+from sic.mapping import mappers
+from sic.mapping.cache import MappingCache, get_key
+
+T_BUTYL = ("CC(C)(C)O.Cl>>CC(C)(C)Cl.O",({1:6,2:2,3:3,4:4,5:5,6:1},"[CH3:1][C:2]([CH3:3])([CH3:4])[OH:5].[ClH:6]","[CH3:1][C:2]([CH3:3])([CH3:4])[Cl:6].[OH2:5]"))
+
+class MappingCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name,"mappings.sqlite3")
+        self.graph_version = mappers.VERSIONS["graph"]
+
+    def tearDown(self):
+        self.directory.cleanup()
+        mappers.VERSIONS["graph"] = self.graph_version
+
+    def testMiss(self):
+        cache = MappingCache(path=None)
+        self.assertIsNone(cache.get(T_BUTYL[0]))
+        self.assertEqual(cache.misses, 1)
+
+    def testLRUEviction(self):
+        cache = MappingCache(path=None,max_entries=2)
+        cache.put("A>>B",({1:1},"A","B"))
+        cache.put("C>>D",({1:1},"C","D"))
+        cache.get("A>>B") #A is now the most recently used
+        cache.put("E>>F",({1:1},"E","F"))
+        self.assertIsNotNone(cache.get("A>>B"))
+        self.assertIsNone(cache.get("C>>D"))
+        self.assertIsNotNone(cache.get("E>>F"))
+
+    def testPersistence(self):
+        """
+        Entries written to disk should come back with integer atom indices after reopening.
+        """
+
+        cache = MappingCache(path=self.path)
+        cache.put(*T_BUTYL)
+        cache.close()
+        reopened = MappingCache(path=self.path)
+        self.assertEqual(reopened.get(T_BUTYL[0]), T_BUTYL[1])
+        reopened.close()
+
+    def testReturnedMappingIsACopy(self):
+        cache = MappingCache(path=None)
+        cache.put(*T_BUTYL)
+        cache.get(T_BUTYL[0])[0][1] = 42
+        self.assertEqual(cache.get(T_BUTYL[0])[0][1], 6)
+
+    def testKeys(self):
+        self.assertNotEqual(get_key(T_BUTYL[0],"rdt"), get_key(T_BUTYL[0],"graph"))
+        self.assertIn(T_BUTYL[0], get_key(T_BUTYL[0],"rdt"))
+
+    def testVersionBump(self):
+        """
+        Mappings made by an older version of a mapper shouldn't be served, even from disk.
+        """
+
+        cache = MappingCache(path=self.path)
+        cache.put(get_key(T_BUTYL[0],"graph"),T_BUTYL[1])
+        cache.close()
+        mappers.VERSIONS["graph"] += 1
+        reopened = MappingCache(path=self.path)
+        self.assertIsNone(reopened.get(get_key(T_BUTYL[0],"graph")))
+        reopened.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests the circuit breaker in front of ReactionDecoder: opening after repeated failures, refusing calls
+while open, letting a trial call through after the reset timeout, and the counters.
+"""
+
+import unittest
+
+from sic.mapping import circuit_breaker, rdt, worker_pool
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def broken(*args):
+    raise RuntimeError("JVM would not start")
+
+def hanging(*args):
+    raise rdt.MappingTimeoutError("too slow")
+
+def busy(*args):
+    raise worker_pool.PoolBusyError("every worker is busy")
+
+def unmappable(*args):
+    raise ValueError("Could not find map between reactants and products.")
+
+def working(*args):
+    return ({1: 1},"C","C")
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = circuit_breaker.CircuitBreaker("test",failure_threshold=3,reset_timeout=10,clock=self.clock)
+
+    def fail(self,times,function=broken):
+        for i in range(times):
+            with self.assertRaises(RuntimeError):
+                self.breaker.call(function)
+
+    def testOpens(self):
+        self.fail(2)
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.fail(1)
+        self.assertEqual(self.breaker.state, circuit_breaker.OPEN)
+        with self.assertRaises(circuit_breaker.CircuitOpenError):
+            self.breaker.call(working)
+        stats = self.breaker.get_stats()
+        self.assertEqual(stats["failures"], 3)
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["opened"], 1)
+
+    def testValueErrorsDontCount(self):
+        """
+        A reaction the mapper can't map says nothing about the mapper.
+        """
+
+        self.fail(2)
+        with self.assertRaises(ValueError):
+            self.breaker.call(unmappable)
+        self.fail(2)
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.assertEqual(self.breaker.get_stats()["input_errors"], 1)
+
+    def testBusyDoesntCount(self):
+        """
+        More requests than workers says nothing about ReactionDecoder.
+        """
+
+        self.fail(2)
+        self.fail(5,busy)
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+        self.assertEqual(self.breaker.consecutive_failures, 2)
+        stats = self.breaker.get_stats()
+        self.assertEqual((stats["busy"],stats["failures"]), (5,2))
+
+    def testTrialCall(self):
+        self.fail(3,hanging)
+        self.assertEqual(self.breaker.get_stats()["timeouts"], 3)
+        self.clock.now = 10
+        self.fail(1) #trial call fails, open for another 10 seconds
+        with self.assertRaises(circuit_breaker.CircuitOpenError):
+            self.breaker.call(working)
+        self.clock.now = 20
+        self.assertEqual(self.breaker.call(working), ({1: 1},"C","C"))
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+
+    def testBatch(self):
+        self.fail(3)
+        results = self.breaker.call_batch(lambda pairs: [working() for pair in pairs],[None,None])
+        self.assertIsInstance(results[0], circuit_breaker.CircuitOpenError)
+        self.assertIsInstance(results[1], circuit_breaker.CircuitOpenError)
+        self.clock.now = 10
+        results = self.breaker.call_batch(lambda pairs: [working() for pair in pairs],[None,None])
+        self.assertEqual(results, [working(),working()])
+        self.assertEqual(self.breaker.state, circuit_breaker.CLOSED)
+
+if __name__ == "__main__":
+    unittest.main()
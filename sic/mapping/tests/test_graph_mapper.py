@@ -0,0 +1,108 @@
+"""
+Tests the in-process minimal bond-edit mapper.
+Mappings are checked through get_bond_distance, since any mapping with the minimal number of bond edits
+is as good as any other as far as the rest of SiC³ is concerned.
+"""
+
+import unittest
+
+from openbabel.pybel import readstring
+
+from sic.mapping import cache, graph_mapper
+from sic.structure import connectivity_table, properties
+
+def prepare(smiles):
+    """
+    Reads a mapper output string the way get_mechanism does: heavy atoms first, then hydrogens.
+    """
+
+    mol = readstring("smi",smiles)
+    mol.removeh()
+    mol.addh()
+    mol.connectivity_table = connectivity_table.ConnectivityTable(mol)
+    return mol
+
+class GraphMapperTest(unittest.TestCase):
+    def checkMapping(self,reactants,products,expected_distance):
+        mapping,react_smiles,prod_smiles = graph_mapper.map_reaction(readstring("smi",reactants),readstring("smi",products))
+        react_mol = prepare(react_smiles)
+        prod_mol = prepare(prod_smiles)
+        #every written-out atom is mapped, one to one, onto an atom of the same element
+        self.assertEqual(sorted(mapping.values()), list(range(1,len(mapping) + 1)))
+        for react_atom,prod_atom in mapping.items():
+            self.assertEqual(react_mol.OBMol.GetAtom(react_atom).GetAtomicNum(), prod_mol.OBMol.GetAtom(prod_atom).GetAtomicNum())
+        self.assertEqual(properties.get_bond_distance(react_mol,prod_mol,mapping), expected_distance)
+
+    def testSubstitution(self):
+        """
+        C-O broken, C-Cl made, one H moved from Cl to O: 4 edits.
+        """
+
+        self.checkMapping("CC(O)(C)C.Cl","CC(Cl)(C)C.O",4)
+
+    def testProtonTransfer(self):
+        self.checkMapping("Cl.[OH-]","O.[Cl-]",2)
+
+    def testAldolAddition(self):
+        """
+        Enolate carbon onto the other aldehyde's carbonyl, alkoxide protonated by water.
+        """
+
+        self.checkMapping("CCC=O.CCC=O.[OH-]","CCC(O)C(C)C=O.[OH-]",4)
+
+    def testUnbalanced(self):
+        with self.assertRaises(ValueError):
+            graph_mapper.map_reaction(readstring("smi","CCO"),readstring("smi","CC"))
+
+    def testBatch(self):
+        """
+        get_mappings should give back results in order, with the unbalanced reaction's error in its place.
+        """
+
+        cache.configure_cache(path=None) #keep test runs out of the on-disk cache
+        pairs = [(readstring("smi","Cl.[OH-]"),readstring("smi","O.[Cl-]")),
+                 (readstring("smi","CCO"),readstring("smi","CC")),
+                 (readstring("smi","CC(O)(C)C.Cl"),readstring("smi","CC(Cl)(C)C.O"))]
+        results = properties.get_mappings(pairs,mapper="graph")
+        self.assertEqual(len(results), 3)
+        self.assertIsNone(results[0]["error"])
+        self.assertIsNone(results[1]["result"])
+        self.assertIsInstance(results[1]["error"], ValueError)
+        self.assertEqual(results[2]["result"], properties.get_mapping(pairs[2][0],pairs[2][1],mapper="graph"))
+
+    def testReindex(self):
+        """
+        A mapping over the mapper's own reactant SMILES should carry over to the same reactants written in another order.
+        """
+
+        #atoms 1,2,3 of "[Cl:1][CH2:2][OH:3]" are 3,2,1 of "OCCl"
+        mapping = graph_mapper.reindex_mapping({1: 5, 2: 6, 3: 7},"[Cl:1][CH2:2][OH:3]","OCCl")
+        self.assertEqual(mapping, {3: 5, 2: 6, 1: 7})
+        self.assertEqual(graph_mapper.reindex_mapping({1: 2},"CO","CO"), {1: 2})
+
+    def testReindexCrowded(self):
+        """
+        Tetra-tert-butylmethane has too many symmetric matches for a bounded search to find an exact one.
+        """
+
+        first = "CC(C)(C)C(C(C)(C)C)(C(C)(C)C)C(C)(C)C"
+        second = "C(C(C)(C)C)(C(C)(C)C)(C(C)(C)C)C(C)(C)C"
+        identity = dict((atom,atom) for atom in range(1,18))
+        mapping = graph_mapper.reindex_mapping(identity,first,second)
+        self.assertEqual(graph_mapper.get_edit_count(mapping,graph_mapper.ReactionGraph(second),graph_mapper.ReactionGraph(first)), 0)
+
+    def testReindexMismatch(self):
+        with self.assertRaises(ValueError):
+            graph_mapper.reindex_mapping({1: 1, 2: 2, 3: 3},"CCO","COC")
+        with self.assertRaises(ValueError):
+            graph_mapper.reindex_mapping({1: 1, 2: 2, 3: 3, 4: 4, 5: 5},"C[N+](C)(C)C","C[N](C)(C)C") #only the charge is different
+
+    def testAsync(self):
+        cache.configure_cache(path=None)
+        reactants,products = readstring("smi","Cl.[OH-]"),readstring("smi","O.[Cl-]")
+        expected = properties.get_mapping(readstring("smi","Cl.[OH-]"),readstring("smi","O.[Cl-]"),mapper="graph")
+        future = properties.get_mapping_async(reactants,products,mapper="graph")
+        self.assertEqual(future.result(timeout=60), expected)
+
+if __name__ == "__main__":
+    unittest.main()
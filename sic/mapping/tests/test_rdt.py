@@ -0,0 +1,69 @@
+"""
+Tests reading ReactionDecoder's text output, which must only ever come from the calling process's
+own scratch directory, and the deadline on RDT processes.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from sic.mapping import rdt
+
+AAM_FILE = """//
+SELECTED AAM MAPPING
+[CH3:1][OH:2]>>[CH3:1][OH:2]
+//
+"""
+
+class ReadOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.scratch.name,"ECBLAST_smiles_AAM.txt"),"w") as f:
+            f.write(AAM_FILE)
+
+    def tearDown(self):
+        self.scratch.cleanup()
+
+    def testRelativePath(self):
+        stdout = "Output is presented in text format: ECBLAST_smiles_AAM.txt\n"
+        self.assertEqual(rdt.read_aam_text_file(stdout,self.scratch.name), "[CH3:1][OH:2]>>[CH3:1][OH:2]")
+
+    def testAbsolutePath(self):
+        path = os.path.join(self.scratch.name,"ECBLAST_smiles_AAM.txt")
+        stdout = "Output is presented in text format: %s\n" % path
+        self.assertEqual(rdt.read_aam_text_file(stdout,self.scratch.name), "[CH3:1][OH:2]>>[CH3:1][OH:2]")
+
+    def testOutsideScratchDirectory(self):
+        """
+        A file belonging to somebody else (e.g. a concurrent call) should never be read.
+        """
+
+        with tempfile.TemporaryDirectory() as other:
+            stdout = "Output is presented in text format: %s\n" % os.path.join(other,"ECBLAST_smiles_AAM.txt")
+            with self.assertRaises(RuntimeError):
+                rdt.read_aam_text_file(stdout,self.scratch.name)
+
+    def testNoPath(self):
+        with self.assertRaises(RuntimeError):
+            rdt.read_aam_text_file("Nothing useful here\n",self.scratch.name)
+
+class DeadlineTest(unittest.TestCase):
+    def testFinishes(self):
+        stdout,stderr = rdt.run_with_deadline([sys.executable,"-c","print('mapped')"],timeout=30)
+        self.assertEqual(stdout, "mapped\n")
+
+    def testTimeout(self):
+        """
+        A process that hangs, and keeps a child of its own around, should be killed at the deadline.
+        """
+
+        hang = "import subprocess,sys,time; subprocess.Popen([sys.executable,'-c','import time; time.sleep(60)']); time.sleep(60)"
+        start = time.monotonic()
+        with self.assertRaises(rdt.MappingTimeoutError):
+            rdt.run_with_deadline([sys.executable,"-c",hang],timeout=1)
+        self.assertLess(time.monotonic() - start, 30)
+
+if __name__ == "__main__":
+    unittest.main()
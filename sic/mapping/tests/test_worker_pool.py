@@ -0,0 +1,101 @@
+"""
+Tests the ReactionDecoder worker pool's plumbing: request/response handling, errors,
+and restarting workers that died.
+A small Python stand-in speaks the RDTWorker.java protocol, so these tests don't need Java or the JAR.
+"""
+
+import sys
+import unittest
+
+from sic.mapping import rdt, worker_pool
+
+FAKE_WORKER = """
+import sys
+import time
+print("READY", flush=True)
+for line in sys.stdin:
+    line = line.rstrip("\\n")
+    if line == "PING":
+        print("PONG", flush=True)
+    elif line == "MAP bad>>input":
+        print("ERR Unbalanced reaction", flush=True)
+    elif line == "MAP slow>>input":
+        time.sleep(60)
+    elif line.startswith("MAP "):
+        print("OK mapped:" + line[4:], flush=True)
+"""
+
+class WorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = worker_pool.RDTWorkerPool(2,command=[sys.executable,"-c",FAKE_WORKER],timeout=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def testMap(self):
+        self.assertEqual(self.pool.map("CO>>OC"), "mapped:CO>>OC")
+
+    def testErrorResponse(self):
+        """
+        An ERR from the worker is RDT refusing the reaction, which callers see as a ValueError.
+        """
+
+        with self.assertRaises(ValueError):
+            self.pool.map("bad>>input")
+        #the worker is still usable afterwards
+        self.assertEqual(self.pool.map("CO>>OC"), "mapped:CO>>OC")
+
+    def testRestartAfterCrash(self):
+        """
+        Kills every worker behind the pool's back; the next requests should still be answered.
+        """
+
+        for worker in self.pool.workers:
+            worker.process.kill()
+            worker.process.wait()
+        self.assertEqual(self.pool.map("CO>>OC"), "mapped:CO>>OC")
+        self.assertEqual(self.pool.map("CCO>>OCC"), "mapped:CCO>>OCC")
+
+    def testMapMany(self):
+        """
+        A batch goes through one worker, and errors come back in place of their results.
+        """
+
+        results = self.pool.map_many(["CO>>OC","bad>>input","CCO>>OCC"])
+        self.assertEqual(results[0], "mapped:CO>>OC")
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], "mapped:CCO>>OCC")
+
+    def testTimeout(self):
+        """
+        A request that hangs times out instead of holding on to the worker, and the worker is replaced.
+        """
+
+        with self.assertRaises(rdt.MappingTimeoutError):
+            self.pool.map("slow>>input")
+        self.assertEqual(self.pool.map("CO>>OC"), "mapped:CO>>OC")
+        self.assertEqual(self.pool.map("CCO>>OCC"), "mapped:CCO>>OCC")
+
+    def testBusy(self):
+        """
+        With every worker taken, a request gives up with a PoolBusyError rather than a mapping timeout.
+        """
+
+        taken = [self.pool.get_idle_worker() for worker in self.pool.workers]
+        try:
+            with self.assertRaises(worker_pool.PoolBusyError):
+                self.pool.map("CO>>OC")
+        finally:
+            for worker in taken:
+                self.pool.idle.put(worker)
+        self.assertEqual(self.pool.map("CO>>OC"), "mapped:CO>>OC")
+
+    def testHealthCheck(self):
+        self.pool.workers[0].process.kill()
+        self.pool.workers[0].process.wait()
+        self.assertEqual(self.pool.health_check(), 2)
+        for worker in self.pool.workers:
+            self.assertTrue(worker.is_alive())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,388 @@
+"""
+Pool of long-lived ReactionDecoder workers.
+
+Starting a JVM and loading RDT takes far longer than mapping a textbook reaction, so instead of
+running "java -jar" for every mapping we keep a few RDTWorker.java processes warm and feed them
+requests over stdin/stdout (see RDTWorker.java for the line protocol).
+
+Workers that crash are restarted and the request retried, and workers that have been idle for a while
+are pinged before being trusted with a request. Every request has the same deadline as a one-shot run
+(rdt.MAPPING_TIMEOUT); a worker that misses it is killed and the request is not retried, since whatever
+made RDT hang would most likely do it again. The pool size comes from the SIC_RDT_POOL_SIZE environment
+variable (0 disables the pool), or from configure_pool() in runserver.py.
+If the workers can't be started at all (e.g. only a JRE is installed), get_pool() returns None and
+callers go back to the one-shot rdt.run_rdt.
+"""
+
+import atexit
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from sic.mapping import rdt
+
+DEFAULT_POOL_SIZE = int(os.environ.get("SIC_RDT_POOL_SIZE",2))
+IDLE_PING_INTERVAL = 30.0 #seconds a worker can sit unused before we ping it ahead of a request
+MAX_RESTARTS = int(os.environ.get("SIC_RDT_RETRIES",1)) #how many times a request is retried on a fresh worker after a crash
+STARTUP_TIMEOUT = 120.0 #seconds for a JVM to compile RDTWorker.java and load RDT
+
+class RDTWorker(object):
+    """
+    One persistent ReactionDecoder process, running in a scratch directory of its own so that
+    nothing RDT writes to its working directory is shared with other workers or one-shot runs.
+    Raises RuntimeError for anything that means the process itself is broken (rdt.MappingTimeoutError
+    if it stopped answering, after which it has been killed), and ValueError when RDT answered but could
+    not map the reaction, same as rdt.run_rdt.
+    The process's stdout is read on a thread of its own, so that waiting for an answer can time out.
+    """
+
+    def __init__(self,command,timeout=None):
+        self.command = command
+        self.timeout = timeout
+        self.process = None
+        self.responses = None
+        self.scratch_dir = None
+        self.last_used = 0.0
+        self.start()
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        pid = self.process.pid if self.process else None
+        return "RDTWorker<PID:{},Alive:{}>".format(pid,self.is_alive())
+
+    def start(self):
+        """
+        Starts the process and waits for it to announce that it is ready.
+        """
+
+        self.scratch_dir = tempfile.mkdtemp(prefix="sic_rdt_worker_")
+        try:
+            #a session of its own, so a timeout can kill the JVM and anything it started in one go
+            self.process = subprocess.Popen(self.command,stdin=subprocess.PIPE,stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL,text=True,bufsize=1,cwd=self.scratch_dir,
+                                            start_new_session=True)
+        except OSError:
+            self.stop()
+            raise
+        self.responses = queue.Queue()
+        threading.Thread(target=read_lines,args=(self.process.stdout,self.responses),daemon=True).start()
+        try:
+            greeting = self.read_response(STARTUP_TIMEOUT)
+        except RuntimeError:
+            self.stop()
+            raise
+        if greeting.strip() != "READY":
+            self.stop()
+            raise RuntimeError("ReactionDecoder worker failed to start.", self.command)
+        self.last_used = time.monotonic()
+
+    def stop(self):
+        """
+        Stops the process, politely first, and removes its scratch directory.
+        """
+
+        if self.process is not None:
+            if self.process.poll() is None:
+                try:
+                    self.process.stdin.close() #EOF on stdin ends the worker's read loop
+                    self.process.wait(timeout=5)
+                except (OSError,subprocess.TimeoutExpired):
+                    rdt.kill_process_group(self.process)
+            self.process = None
+        if self.scratch_dir is not None:
+            shutil.rmtree(self.scratch_dir,ignore_errors=True)
+            self.scratch_dir = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def read_response(self,timeout=None):
+        """
+        Waits up to timeout seconds (see rdt.get_timeout) for the next line from the process.
+        If none comes, the process is killed and a rdt.MappingTimeoutError raised.
+        """
+
+        timeout = rdt.get_timeout(timeout)
+        try:
+            response = self.responses.get(timeout=timeout)
+        except queue.Empty:
+            rdt.kill_process_group(self.process)
+            raise rdt.MappingTimeoutError("ReactionDecoder worker did not answer within {} seconds.".format(timeout))
+        if response is None:
+            raise RuntimeError("ReactionDecoder worker exited in the middle of a request.")
+        return response.rstrip("\n")
+
+    def request(self,line):
+        """
+        Sends a single protocol line and returns the single line that comes back.
+        """
+
+        if "\n" in line:
+            raise ValueError("Requests to the ReactionDecoder worker must be a single line.", line)
+        if not self.is_alive():
+            raise RuntimeError("ReactionDecoder worker is not running.")
+        try:
+            self.process.stdin.write(line + "\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            raise RuntimeError("Lost connection to ReactionDecoder worker.") from e
+        response = self.read_response(self.timeout)
+        self.last_used = time.monotonic()
+        return response
+
+    def ping(self):
+        """
+        Returns True if the worker answers a PING.
+        """
+
+        try:
+            return self.request("PING") == "PONG"
+        except RuntimeError:
+            return False
+
+    def map(self,input_smiles):
+        """
+        Maps a "reactants>>products" SMILES string, returning the atom-mapped reaction SMILES.
+        """
+
+        response = self.request("MAP " + input_smiles)
+        if response.startswith("OK "):
+            return response[len("OK "):]
+        if response.startswith("ERR "):
+            raise ValueError("Error from Reaction Decoder:\n" + response[len("ERR "):])
+        raise RuntimeError("Unexpected response from ReactionDecoder worker.", response)
+
+class PoolBusyError(RuntimeError):
+    """
+    Raised when no worker became free within the mapping deadline. Says nothing about ReactionDecoder
+    itself, only that there were more requests than workers, so the circuit breaker doesn't count it.
+    """
+
+class RDTWorkerPool(object):
+    """
+    A fixed number of RDTWorkers handed out one request at a time.
+    Safe to share between the Flask server's threads: a request blocks until a worker is free, but no
+    longer than the mapping deadline, after which it gets a PoolBusyError.
+    timeout is passed on to the workers (see rdt.get_timeout).
+    """
+
+    def __init__(self,size=DEFAULT_POOL_SIZE,command=None,max_restarts=MAX_RESTARTS,timeout=None):
+        if size < 1:
+            raise ValueError("An RDT worker pool needs at least one worker.", size)
+        self.command = command if command else rdt.get_worker_command()
+        self.max_restarts = max_restarts
+        self.timeout = timeout
+        self.workers = []
+        self.idle = queue.Queue()
+        try:
+            for i in range(size):
+                worker = RDTWorker(self.command,timeout)
+                self.workers.append(worker)
+                self.idle.put(worker)
+        except Exception:
+            self.shutdown()
+            raise
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "RDTWorkerPool<Workers:{},Idle:{}>".format(len(self.workers),self.idle.qsize())
+
+    def map(self,input_smiles):
+        """
+        Maps a "reactants>>products" SMILES string on the next free worker.
+        A worker that turns out to be dead is restarted and the request is tried again, up to
+        max_restarts times. ValueErrors (RDT could not map this reaction) and timeouts are never retried.
+        """
+
+        worker = self.get_idle_worker()
+        try:
+            return map_with_restarts(worker,input_smiles,self.max_restarts)
+        finally:
+            self.idle.put(worker)
+
+    def map_many(self,input_smiles_list):
+        """
+        Maps a list of "reactants>>products" strings on a single worker, in order.
+        Returns a list of the same length holding either the mapped reaction SMILES or the exception
+        raised for that reaction, so one bad reaction doesn't sink the whole batch.
+        """
+
+        worker = self.get_idle_worker()
+        try:
+            return map_all(worker,input_smiles_list,self.max_restarts)
+        finally:
+            self.idle.put(worker)
+
+    def get_idle_worker(self):
+        """
+        Takes the next free worker, waiting no longer than the mapping deadline for one.
+        """
+
+        timeout = rdt.get_timeout(self.timeout)
+        try:
+            return self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolBusyError("No ReactionDecoder worker became free within {} seconds.".format(timeout))
+
+    def health_check(self):
+        """
+        Pings every worker that isn't busy and restarts the ones that don't answer.
+        Returns the number of idle workers that are healthy afterwards.
+        """
+
+        checked = []
+        while True:
+            try:
+                checked.append(self.idle.get_nowait())
+            except queue.Empty:
+                break
+        healthy = 0
+        for worker in checked:
+            try:
+                if not worker.ping():
+                    worker.restart()
+                healthy += 1
+            except RuntimeError:
+                pass #left dead, map() restarts it on its next use
+            finally:
+                self.idle.put(worker)
+        return healthy
+
+    def shutdown(self):
+        """
+        Stops all workers.
+        """
+
+        for worker in self.workers:
+            worker.stop()
+
+def map_with_restarts(worker,input_smiles,max_restarts=MAX_RESTARTS):
+    """
+    Maps one reaction on a worker, restarting it if it turns out to be dead or stops answering,
+    up to max_restarts times. A request that times out is not retried; the worker is left stopped
+    and gets restarted on its next use.
+    """
+
+    attempt = 0
+    while True:
+        try:
+            stale = time.monotonic() - worker.last_used > IDLE_PING_INTERVAL
+            if not worker.is_alive() or (stale and not worker.ping()):
+                worker.restart()
+            return worker.map(input_smiles)
+        except rdt.MappingTimeoutError:
+            worker.stop()
+            raise
+        except RuntimeError:
+            if attempt >= max_restarts:
+                raise
+            attempt += 1
+            worker.stop() #is_alive() is now False, so the next pass restarts it
+
+def map_all(worker,input_smiles_list,max_restarts=MAX_RESTARTS):
+    """
+    Maps every reaction in a list on one worker. Errors are returned in place of the results they
+    belong to rather than raised.
+    """
+
+    results = []
+    for input_smiles in input_smiles_list:
+        try:
+            results.append(map_with_restarts(worker,input_smiles,max_restarts))
+        except (ValueError,RuntimeError) as e:
+            results.append(e)
+    return results
+
+def read_lines(stream,lines):
+    """
+    Puts every line read from stream on the lines queue, then None when the stream ends.
+    Runs on a thread for each worker process.
+    """
+
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+def map_batch(input_smiles_list):
+    """
+    Maps a list of "reactants>>products" strings with a single JVM: a worker from the shared pool
+    if there is one, or a worker started just for this batch otherwise.
+    Returns the same kind of list as RDTWorkerPool.map_many, or None if no worker could be started,
+    in which case the caller has to fall back to rdt.run_rdt.
+    """
+
+    pool = get_pool()
+    if pool:
+        return pool.map_many(input_smiles_list)
+    if _pool_unavailable:
+        return None #workers already failed to start once, don't pay for it again
+    try:
+        worker = RDTWorker(rdt.get_worker_command())
+    except (OSError,RuntimeError) as e:
+        print("Could not start a ReactionDecoder worker for the batch: {}".format(e))
+        return None
+    try:
+        return map_all(worker,input_smiles_list)
+    finally:
+        worker.stop()
+
+_pool = None
+_pool_unavailable = False #set when workers can't be started, so we don't retry on every mapping
+_pool_size = DEFAULT_POOL_SIZE
+_pool_lock = threading.Lock()
+
+def configure_pool(size):
+    """
+    Sets the number of workers for the shared pool, shutting down the current one if any.
+    A size of 0 turns the pool off and makes get_mapping launch a JVM per reaction.
+    """
+
+    global _pool_size, _pool_unavailable
+    with _pool_lock:
+        _shutdown_locked()
+        _pool_size = size
+        _pool_unavailable = False
+
+def get_pool():
+    """
+    Returns the shared RDTWorkerPool, starting it the first time it is asked for.
+    Returns None if the pool is turned off or its workers can't be started.
+    """
+
+    global _pool, _pool_unavailable
+    with _pool_lock:
+        if _pool is None and _pool_size > 0 and not _pool_unavailable:
+            try:
+                _pool = RDTWorkerPool(_pool_size)
+            except (OSError,RuntimeError) as e:
+                print("Could not start ReactionDecoder worker pool, mapping with one JVM per reaction: {}".format(e))
+                _pool_unavailable = True
+        return _pool
+
+def shutdown_pool():
+    """
+    Stops the shared pool's workers. Registered with atexit so no JVMs outlive us.
+    """
+
+    with _pool_lock:
+        _shutdown_locked()
+
+def _shutdown_locked():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+atexit.register(shutdown_pool)
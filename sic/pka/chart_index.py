@@ -0,0 +1,147 @@
+"""
+Prefilter for the pKa chart: an index of what each chart pattern needs to find in a molecule before it
+can possibly match, so get_all_pka only runs the patterns a molecule could satisfy.
+
+A pattern's requirements are a Counter of atom features, one set per pattern atom:
+
+- ("element",Z): an atom with atomic number Z
+- ("charge",Z,charge): an atom with atomic number Z and that formal charge (Z is 0 for "any element")
+- ("hydrogens",Z,count): an atom with atomic number Z and that many hydrogens in total, from SMARTS H<n>
+
+Only what the SMARTS pins down is a requirement. Atoms written with alternatives ("[C,CH,CH2]"),
+negations ("[Br!H1]") or recursive SMARTS only require what OpenBabel reports for the whole expression,
+and a charge of 0 is never a requirement since OpenBabel can't tell "uncharged" apart from "any charge".
+That makes the filter safe: a molecule whose signature (the same Counter over its own atoms) doesn't
+cover a pattern's requirements can't contain a match for it, since a match puts each pattern atom on a
+different molecule atom with those features.
+
+Looking a molecule up doesn't go through the whole chart either. Each pattern is filed under one
+anchor feature, its rarest requirement, and only the patterns filed under features the molecule has
+get their requirements checked.
+"""
+
+import re
+from collections import Counter
+
+from sic.structure import patterns
+from sic.structure.atom_snapshot import AtomSnapshot
+
+ATOM_TOKEN = re.compile(r"\[[^\]]*\]|Cl|Br|[BCNOPSFIbcnops*]") #SMARTS atoms, in the order OpenBabel numbers them
+HYDROGEN_COUNT = re.compile(r"(?<!!)H(\d*)")
+ELEMENT_RARITY = {0:-1, 1:0, 6:1, 8:2, 7:3} #anything else counts as rarer than nitrogen
+FEATURE_RARITY = {"element":0, "hydrogens":1, "charge":2}
+
+def get_hydrogen_counts(pattern,size):
+    """
+    Returns the H<n> count each atom of a SMARTS pattern requires (None where it doesn't require one),
+    read off the SMARTS text since OBSmartsPattern doesn't expose it.
+    Returns all None if the text can't be lined up with the pattern's size atoms.
+    """
+
+    tokens = ATOM_TOKEN.findall(pattern)
+    if len(tokens) != size:
+        return [None] * size
+    counts = []
+    for token in tokens:
+        expression = token[1:-1].lstrip("0123456789") #skip isotopes
+        if not token.startswith("[") or "," in expression or "$" in expression:
+            counts.append(None)
+            continue
+        if expression.startswith("H"):
+            expression = expression[1:] #[H], [H+]... the H is the element
+        hydrogens = HYDROGEN_COUNT.findall(expression)
+        counts.append(int(hydrogens[0] or 1) if len(hydrogens) == 1 else None)
+    return counts
+
+def get_requirements(pattern):
+    """
+    Returns the Counter of atom features a molecule needs for pattern to match it.
+    """
+
+    obsmarts = patterns.get_pattern(pattern).obsmarts
+    size = obsmarts.NumAtoms()
+    requirements = Counter()
+    for i,hydrogens in enumerate(get_hydrogen_counts(pattern,size)):
+        element = obsmarts.GetAtomicNum(i)
+        charge = obsmarts.GetCharge(i)
+        if element:
+            requirements[("element",element)] += 1
+        if charge:
+            requirements[("charge",element,charge)] += 1
+        if hydrogens is not None:
+            requirements[("hydrogens",element,hydrogens)] += 1
+    return requirements
+
+def get_signature(molecule,atoms=None,snapshot=None):
+    """
+    Returns the Counter of atom features of molecule, or of just the atom indices in atoms if given.
+    Charge and hydrogen features are counted both for the atom's element and for element 0.
+    The features are read from snapshot (an AtomSnapshot of molecule) if given.
+    """
+
+    if snapshot is None:
+        snapshot = AtomSnapshot(molecule)
+    signature = Counter()
+    if atoms is None:
+        atoms = range(1,len(snapshot.atomic_nums))
+    for atom_idx in atoms:
+        element = snapshot.atomic_nums[atom_idx]
+        charge = snapshot.charges[atom_idx]
+        hydrogens = snapshot.hydrogens[atom_idx]
+        signature[("element",element)] += 1
+        if charge:
+            signature[("charge",element,charge)] += 1
+            signature[("charge",0,charge)] += 1
+        signature[("hydrogens",element,hydrogens)] += 1
+        signature[("hydrogens",0,hydrogens)] += 1
+    return signature
+
+def get_anchor(requirements):
+    """
+    Returns the requirement a pattern is filed under: a charge if it has one (charged atoms are rare in
+    any state), otherwise the rarest element, and on that element a hydrogen count before the bare element.
+    None if the pattern requires nothing.
+    """
+
+    if not requirements:
+        return None
+    return max(requirements,key=lambda feature: (feature[0] == "charge",ELEMENT_RARITY.get(feature[1],len(ELEMENT_RARITY)),FEATURE_RARITY[feature[0]]))
+
+class ChartIndex(object):
+    """
+    Requirements and anchors for every pattern of a pKa chart (a {SMARTS : pKa values} dictionary).
+    requirements can be given as {pattern : requirements} if they were worked out already (see chart_tables).
+    """
+
+    def __init__(self,chart,requirements=None):
+        self.order = dict((pattern,position) for position,pattern in enumerate(chart))
+        if requirements is None:
+            requirements = dict((pattern,get_requirements(pattern)) for pattern in chart)
+        self.requirements = requirements
+        self.anchored = {} #{anchor feature : [patterns]}
+        self.unanchored = [] #patterns with no requirements, always candidates
+        for pattern,requirements in self.requirements.items():
+            anchor = get_anchor(requirements)
+            if anchor is None:
+                self.unanchored.append(pattern)
+            else:
+                self.anchored.setdefault(anchor,[]).append(pattern)
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "ChartIndex<Patterns:{},Anchors:{},Unanchored:{}>".format(len(self.order),len(self.anchored),len(self.unanchored))
+
+    def get_candidates(self,signature):
+        """
+        Returns the patterns whose requirements signature covers, in chart order.
+        """
+
+        candidates = list(self.unanchored)
+        for feature in signature:
+            for pattern in self.anchored.get(feature,()):
+                if not self.requirements[pattern] - signature:
+                    candidates.append(pattern)
+        candidates.sort(key=self.order.__getitem__)
+        return candidates
@@ -0,0 +1,112 @@
+"""
+Prebuilt tables for the pKa chart: what get_all_pka works out about every chart pattern before it can use
+the chart (each pattern's radius and elements for incremental updates, and its chart_index requirements).
+
+They are written to chart_tables.json by running
+
+    python3 -m sic.pka.chart_tables
+
+and read back when pka is imported, so new processes (command line runs, server workers) don't redo it.
+The file records ARTIFACT_VERSION and a digest of the chart it was built from; if either doesn't match,
+or the file is missing or unreadable, pka builds the tables itself like before, so editing the chart
+never needs the file to be rebuilt first, it just loses the head start until it is.
+
+The compiled SMARTS themselves can't be saved (they're OpenBabel objects), but compiling the whole chart
+and the segmentation tables is quick; see patterns.compile_all.
+"""
+
+import hashlib
+import json
+from collections import Counter
+from pathlib import Path
+
+from sic.structure import patterns
+from . import chart_index
+
+ARTIFACT_VERSION = 1 #bump when the format or the way the tables are worked out changes
+ARTIFACT_PATH = Path(__file__).with_name("chart_tables.json")
+
+def get_pattern_info(pattern):
+    """
+    Returns (radius,elements) for a chart pattern: the furthest a matched atom can be from another atom
+    in the same match, in bonds, and a Counter of the atomic numbers the pattern's atoms must have
+    (atoms that allow more than one element aren't counted).
+    A pattern in several disconnected pieces can match anywhere, so its radius is None.
+    """
+
+    obsmarts = patterns.get_pattern(pattern).obsmarts
+    size = obsmarts.NumAtoms()
+    radius = None if "." in pattern else size - 1
+    elements = Counter(obsmarts.GetAtomicNum(i) for i in range(size))
+    del elements[0]
+    return radius,elements
+
+def get_digest(chart):
+    """
+    Returns a digest of the chart's patterns (in order) and values, which changes whenever the chart does.
+    """
+
+    content = json.dumps([[pattern,chart[pattern]] for pattern in chart],sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def build(chart):
+    """
+    Works out the tables for chart: {"pattern_info" : {pattern : (radius,elements)},
+    "requirements" : {pattern : requirements Counter}}.
+    """
+
+    return {"pattern_info": dict((pattern,get_pattern_info(pattern)) for pattern in chart),
+            "requirements": dict((pattern,chart_index.get_requirements(pattern)) for pattern in chart)}
+
+def write(chart,path=ARTIFACT_PATH):
+    """
+    Builds the tables for chart and saves them to path as JSON.
+    """
+
+    tables = build(chart)
+    entries = {}
+    for pattern in chart:
+        radius,elements = tables["pattern_info"][pattern]
+        entries[pattern] = {"radius": radius,
+                            "elements": sorted(elements.items()),
+                            "requirements": sorted([list(feature),count] for feature,count in tables["requirements"][pattern].items())}
+    #one pattern per line, so a chart change shows up as a readable diff
+    lines = ["{}: {}".format(json.dumps(pattern),json.dumps(entries[pattern],sort_keys=True)) for pattern in chart]
+    with open(path,"w") as artifact_file:
+        artifact_file.write('{{"version": {}, "digest": "{}", "patterns": {{\n'.format(ARTIFACT_VERSION,get_digest(chart)))
+        artifact_file.write(",\n".join(lines))
+        artifact_file.write("\n}}\n")
+
+def load(chart,path=ARTIFACT_PATH):
+    """
+    Returns the tables for chart saved at path, in the same form as build, or None if there are none
+    for this exact chart and ARTIFACT_VERSION.
+    """
+
+    try:
+        with open(path) as artifact_file:
+            artifact = json.load(artifact_file)
+        if artifact["version"] != ARTIFACT_VERSION or artifact["digest"] != get_digest(chart):
+            return None
+        entries = artifact["patterns"]
+        tables = {"pattern_info": {}, "requirements": {}}
+        for pattern in chart:
+            entry = entries[pattern]
+            tables["pattern_info"][pattern] = (entry["radius"],Counter(dict((element,count) for element,count in entry["elements"])))
+            tables["requirements"][pattern] = Counter(dict((tuple(feature),count) for feature,count in entry["requirements"]))
+        return tables
+    except (OSError,ValueError,KeyError,TypeError):
+        return None
+
+def get_tables(chart):
+    """
+    Returns the saved tables for chart if they're up to date, otherwise builds them.
+    """
+
+    tables = load(chart)
+    return tables if tables is not None else build(chart)
+
+if __name__ == "__main__":
+    from .pka_chart import PKA_CHART
+    write(PKA_CHART)
+    print("Wrote tables for {} chart patterns to {}".format(len(PKA_CHART),ARTIFACT_PATH))
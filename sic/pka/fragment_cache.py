@@ -0,0 +1,120 @@
+"""
+pKa chart matches cached per molecular fragment.
+
+A reaction state is a dot-separated set of fragments (water, hydronium, the substrate, counter-ions), and the
+same fragments turn up in state after state, search after search, and more than once in the same state.
+Since every chart pattern is connected, a fragment's matches only depend on the fragment itself, so
+get_all_pka keeps them here under the fragment's canonical SMILES.
+
+The SMILES is written with explicit hydrogens, and the cached matches are stored as positions in that SMILES
+rather than atom indices: position k of a fragment is the k-th atom written, whatever its index in the molecule.
+Two fragments with the same SMILES have the same atoms at the same positions, which is all a cache hit needs.
+
+Aromatic fragments are never cached. Their SMILES doesn't say which Kekule structure the molecule has,
+and chart patterns like the benzene ones match specific single and double bonds.
+"""
+
+import collections
+import threading
+
+from sic.structure import struct_ops
+
+DEFAULT_MAX_ENTRIES = 4096
+
+class FragmentCache(object):
+    """
+    Maps fragment SMILES to {pattern : [matches as tuples of positions]}, keeping the most recently used
+    max_entries fragments. Patterns that don't match the fragment are left out.
+    Safe to share between threads; cached entries are never modified.
+    The edit cache (see get_edit_cache) uses the same class with other keys and values.
+    """
+
+    def __init__(self,max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict() #oldest first, so popitem(last=False) evicts
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "FragmentCache<Entries:{},Hits:{},Misses:{}>".format(len(self.entries),self.hits,self.misses)
+
+    def get(self,key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self,key,matches):
+        with self.lock:
+            self.entries[key] = matches
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+def split_fragments(molecule):
+    """
+    Splits a molecule into its connected fragments, returning a list of (key,atoms) pairs: key is the
+    fragment's canonical SMILES with explicit hydrogens (None if the fragment can't be cached), and atoms
+    lists the fragment's atom indices in the order that SMILES writes them.
+    Molecules without a connectivity table come back as a single fragment that isn't cached.
+    """
+
+    smiles = molecule.write("can",opt={"h":None,"O":None}).split()[0]
+    order = [int(atom_idx) for atom_idx in molecule.data["SMILES Atom Order"].split()]
+    #writing the order leaves these behind on the OBMol, and they would follow it into every copy
+    for data_key in ("SMILES Atom Order","OpenBabel Symmetry Classes"):
+        if data_key in molecule.data:
+            del molecule.data[data_key]
+    if not hasattr(molecule,"connectivity_table"):
+        return [(None,order)]
+    #the SMILES writes one fragment after another, so each run of atoms from the same fragment is one piece
+    pieces = smiles.split(".")
+    runs = []
+    fragment = set()
+    seen = set()
+    for atom_idx in order:
+        if atom_idx not in fragment:
+            if atom_idx in seen:
+                return [(None,order)] #fragments not written one after the other, shouldn't happen but then nothing is cached
+            fragment = struct_ops.get_fragment_atoms(molecule,atom_idx)
+            seen.update(fragment)
+            runs.append([])
+        runs[-1].append(atom_idx)
+    if len(runs) != len(pieces):
+        return [(None,order)]
+    obmol = molecule.OBMol
+    fragments = []
+    for piece,atoms in zip(pieces,runs):
+        aromatic = any(obmol.GetAtom(atom_idx).IsAromatic() for atom_idx in atoms)
+        fragments.append((None if aromatic else piece,atoms))
+    return fragments
+
+_cache = FragmentCache()
+_edit_cache = FragmentCache()
+
+def get_cache():
+    """
+    Returns the shared FragmentCache.
+    """
+
+    return _cache
+
+def get_edit_cache():
+    """
+    Returns the shared cache of pka.get_pka_after_break answers, which maps
+    (fragment SMILES, positions of the broken bond's start and end, position of the atom asked about)
+    to (pKa,), since None is a valid answer.
+    """
+
+    return _edit_cache
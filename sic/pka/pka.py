@@ -7,47 +7,136 @@ which it makes sense to do so (hydrogens for pKa_HA
 and O,S,N, and halogens for pKa_BH), this module
 will go through the species in the pKa
 chart and attempt to map them to the parts of the molecule.
-"""
 
-from openbabel import pybel
+Every state in a search is its parent with two or three bonds changed, so the chart's matches are kept
+on the molecule (molecule.pka_matches) and carried over by struct_ops.copy_molecule. When the molecule's
+edit log (see struct_ops.record_edit) says which atoms changed since then, only the patterns that could
+match near those atoms are run again, and the index is rebuilt from the old and new matches.
+
+Matches are also cached per connected fragment, under the fragment's canonical SMILES (see fragment_cache),
+so fragments that have been seen before (water, hydronium, counter-ions...) are never matched again.
+Of the chart, only the patterns whose elements, charges and hydrogen counts the new fragments actually have
+are run at all (see chart_index).
 
+Cross-checks often need the pKa an atom would have after breaking one bond (a leaving group once it has left).
+get_pka_after_break answers that from the one fragment the bond is in, without copying the molecule,
+and remembers the answer for that fragment and bond.
+"""
+
+from sic.structure import patterns, struct_ops
+from sic.structure.atom_snapshot import AtomSnapshot
+from . import chart_index, chart_tables, fragment_cache
 from .pka_chart import PKA_CHART
+from .pka_index import PkaIndex
 
 LONE_PAIR_ATOMS = set([6,7,8,9,15,16,17,35,53]) #atomic numbers that can have lone pairs commonly. Excludes boron , this is special.
 
-def get_all_pka(molecule):
+def get_all_pka(molecule,snapshot=None):
     """
     For a particular molecule, find the pKa_HA values for all hydrogens,
     and all pKa_BH values for all atoms with lone pairs.
-    After running this method, molecule should have a pka_index attribute,
+    After running this method, molecule should have a pka_index attribute (a PkaIndex),
     which maps atom indices to their pKa values, specifically
     the pKa_HA value for H atoms, and pKa_BH value for non-H atoms.
     Certain species (carbocations, multiple bonds) are ignored by this method,
     and require separate checks.
+    Fragments whose matches are in the fragment cache aren't matched at all. For the rest, if the molecule
+    was copied from one that already had its pKa values (and its bonds were only changed through struct_ops since),
+    only the chart patterns near the changed atoms are matched again.
+    Atom properties are read from snapshot (an AtomSnapshot of molecule) if given, otherwise one is taken here.
+    """
+    if snapshot is None:
+        snapshot = AtomSnapshot(molecule)
+    pka_cache = fragment_cache.get_cache()
+    matches = {} #{pattern : groups}, only for patterns with matches
+    missing = [] #(key,atoms) for the fragments that aren't cached
+    fragments = fragment_cache.split_fragments(molecule)
+    for key,atoms in fragments:
+        cached = pka_cache.get(key) if key else None
+        if cached is None:
+            missing.append((key,atoms))
+            continue
+        for pattern,groups in cached.items():
+            matches.setdefault(pattern,[]).extend(tuple(atoms[position] for position in group) for group in groups)
+    if missing:
+        missing_atoms = set(atom for key,atoms in missing for atom in atoms)
+        candidates = CHART_INDEX.get_candidates(chart_index.get_signature(molecule,missing_atoms,snapshot))
+        if hasattr(molecule,"pka_matches") and hasattr(molecule,"edit_log"):
+            found = update_matches(molecule,missing_atoms,candidates,snapshot)
+        else:
+            found = dict((pattern,patterns.get_pattern(pattern).findall(molecule)) for pattern in candidates) #compiled once per thread, not once per state
+        for key,atoms in missing:
+            positions = dict((atom_idx,position) for position,atom_idx in enumerate(atoms))
+            fragment_matches = {}
+            for pattern,groups in found.items():
+                own_groups = [group for group in groups if group[0] in positions] #patterns are connected, so one atom says which fragment
+                if own_groups:
+                    matches.setdefault(pattern,[]).extend(own_groups)
+                    fragment_matches[pattern] = [tuple(positions[atom_idx] for atom_idx in group) for group in own_groups]
+            if key:
+                pka_cache.put(key,fragment_matches)
+    if not hasattr(molecule,"edit_log"):
+        molecule.edit_log = [] #start tracking bond edits so the next update can be incremental
+    molecule.pka_matches = matches
+    molecule.pka_fragments = fragments
+    molecule.pka_synced = len(molecule.edit_log)
+    build_index(molecule,matches,snapshot)
+    #return nothing because this just modifies state
+
+def update_matches(molecule,atoms,candidates=PKA_CHART,snapshot=None):
+    """
+    Returns the chart matches for molecule, reusing molecule.pka_matches for every pattern that can't
+    match differently after the bond edits made since they were found. Only the patterns in candidates
+    are looked at; the rest are known not to match among atoms.
+    A match can only have changed if it contains a changed atom, so its atoms all lie within the pattern's
+    radius of the changed atoms; patterns whose elements aren't all found in that neighbourhood are skipped.
+    Only the matches among atoms (a set of whole fragments) have to be right; the caller ignores the rest.
+    The changed atoms and their surroundings come from snapshot (see AtomSnapshot.get_changes) if given.
+    """
+
+    if snapshot is None:
+        snapshot = AtomSnapshot(molecule)
+    #elements_within[r] counts the elements of every atom at most r bonds from a changed atom
+    changed,elements_within = snapshot.get_changes(molecule,molecule.pka_synced,MAX_RADIUS)
+    if not changed & atoms:
+        return molecule.pka_matches #those fragments were there, untouched, in the molecule the matches came from
+    matches = {}
+    for pattern in candidates:
+        radius,elements = PATTERN_INFO[pattern]
+        if radius is None or not elements - elements_within[radius]:
+            matches[pattern] = patterns.get_pattern(pattern).findall(molecule)
+        elif pattern in molecule.pka_matches:
+            matches[pattern] = molecule.pka_matches[pattern]
+    return matches
+
+def build_index(molecule,matches,snapshot=None):
+    """
+    Fills in molecule.pka_index from the matches of every chart pattern, in chart order, so that the
+    most specific patterns (lower down) win. Elements are read from snapshot (an AtomSnapshot of molecule) if given.
     """
     #the below looks like O(scary), but the lists are small enough that we don't have to care.
-    #I know the access method isn't super great, but it's what we lose for the sake of sequential access
-    molecule.pka_index = {} #This is cleared and recalculated at each time in order to keep it consistent with changes in bonds
-    for pattern in PKA_CHART:
-        smarts = pybel.Smarts(pattern)
-        indices = smarts.findall(molecule)
-        obmol = molecule.OBMol
+    if snapshot is None:
+        snapshot = AtomSnapshot(molecule)
+    atomic_nums = snapshot.atomic_nums
+    pka_index = PkaIndex(len(atomic_nums) - 1) #This is cleared and recalculated at each time in order to keep it consistent with changes in bonds
+    for pattern in sorted(matches,key=CHART_INDEX.order.__getitem__):
+        indices = matches[pattern]
         for group in indices:
             h_atom = False
             for atom_idx in group:
-                atom = obmol.GetAtom(atom_idx)
-                if atom.GetAtomicNum() == 1: # get all hydrogens, they should all be bonded to the same atom.
+                element = atomic_nums[atom_idx]
+                if element == 1: # get all hydrogens, they should all be bonded to the same atom.
                     h_atom = atom_idx
-                    molecule.pka_index[atom_idx] = PKA_CHART[pattern]["pKa_HA"] 
+                    pka_index.set_ha(atom_idx,PKA_CHART[pattern]["pKa_HA"])
             if h_atom:
                 #get atom bonded to H if there is one
                 bonded_to_h = molecule.connectivity_table.get_atoms_bonded(h_atom) 
-                molecule.pka_index[next(iter(bonded_to_h))] = PKA_CHART[pattern]["pKa_BH"] #this should ONLY have one element in the set, so it works out
+                pka_index.set_bh(next(iter(bonded_to_h)),PKA_CHART[pattern]["pKa_BH"]) #this should ONLY have one element in the set, so it works out
             else:
                 for atom_idx in group:
-                    if atom.GetAtomicNum() in LONE_PAIR_ATOMS:
-                        molecule.pka_index[atom_idx] = PKA_CHART[pattern]["pKa_BH"]
-    #return nothing because this just modifies state
+                    if element in LONE_PAIR_ATOMS:
+                        pka_index.set_bh(atom_idx,PKA_CHART[pattern]["pKa_BH"])
+    molecule.pka_index = pka_index
 
 def get_pka(atom,molecule):
     """
@@ -62,8 +151,46 @@ def get_pka(atom,molecule):
     We assume that pka_index is an attribute of molecule. If this is not the case, then this method will
     raise an AttributeError.
     """
-    index = atom
-    if index in molecule.pka_index:
-        return molecule.pka_index[index]
+    return molecule.pka_index.get(atom)
+
+def get_pka_after_break(atom,start,end,molecule):
+    """
+    Returns the pKa get_pka would give atom after struct_ops.break_bond(start,end,molecule) and get_all_pka,
+    without changing molecule. Only the fragment holding the bond is copied and matched, and the answer is
+    kept in the edit cache under that fragment's SMILES, so the same question about the same fragment
+    (from sibling reactions in a state, or in later states) is only worked out once.
+
+    molecule should have had get_all_pka run on it since its last bond edit if atom can be in another
+    fragment than the bond, since atom's pKa is then read straight off molecule.
+    Raises a ValueError if start and end aren't bonded, same as break_bond.
+    """
+
+    if hasattr(molecule,"pka_fragments") and molecule.pka_synced == len(molecule.edit_log):
+        fragments = molecule.pka_fragments
     else:
-        return None
+        fragments = fragment_cache.split_fragments(molecule)
+    key,atoms = next((key,atoms) for key,atoms in fragments if start in atoms)
+    if atom not in atoms:
+        return get_pka(atom,molecule) #breaking a bond somewhere else doesn't change anything here
+    edit_cache = fragment_cache.get_edit_cache()
+    query = None
+    if key and end in atoms:
+        query = (key,atoms.index(start),atoms.index(end),atoms.index(atom))
+        cached = edit_cache.get(query)
+        if cached is not None:
+            return cached[0]
+    fragment,new_indices = struct_ops.extract_fragment(molecule,atoms)
+    if end not in new_indices:
+        raise ValueError("Bond not found between {} and {}.".format(start,end))
+    struct_ops.break_bond(new_indices[start],new_indices[end],fragment)
+    get_all_pka(fragment)
+    value = get_pka(new_indices[atom],fragment)
+    if query:
+        edit_cache.put(query,(value,))
+    return value
+
+patterns.compile_all(PKA_CHART)
+_tables = chart_tables.get_tables(PKA_CHART) #prebuilt if chart_tables.json is up to date
+PATTERN_INFO = _tables["pattern_info"] #{pattern : (radius,elements)}, see chart_tables.get_pattern_info
+CHART_INDEX = chart_index.ChartIndex(PKA_CHART,_tables["requirements"])
+MAX_RADIUS = max(radius for radius,elements in PATTERN_INFO.values() if radius is not None)
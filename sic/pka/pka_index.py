@@ -0,0 +1,61 @@
+"""
+The per-atom pKa values get_all_pka works out for a molecule (molecule.pka_index).
+
+Every state in a search has one, so the values are kept in a flat float array indexed by atom index instead of
+a dictionary of Python floats. pka.build_index makes a new one every time, and nothing changes it after that,
+so the copies copy_molecule makes share their original's (like the pKa matches).
+"""
+
+import math
+from array import array
+from collections.abc import Mapping
+
+MISSING = float("nan") #stands in for None, "not in the chart" or "doesn't apply"
+
+class PkaIndex(Mapping):
+    """
+    {atom_idx : pKa} for the atoms of one molecule: pKa_HA for hydrogens and pKa_BH for everything else,
+    kept in the array values (index 0 is unused, atom indices start at 1) with MISSING where there's no value.
+    An atom only ever has the value it was given last, whichever kind it was, so one array holds both.
+    Reads like the dictionary it replaces; atoms without a value aren't in it.
+
+    Only set values while building it (see pka.build_index): once it's on a molecule, copies share it.
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self,size):
+        self.values = array("d",[MISSING]) * (size + 1)
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "PkaIndex<Atoms:{},Values:{}>".format(len(self.values) - 1,len(self))
+
+    def set_ha(self,atom_idx,value):
+        """
+        Sets the pKa_HA of a hydrogen. None removes it.
+        """
+        self.values[atom_idx] = MISSING if value is None else value
+
+    def set_bh(self,atom_idx,value):
+        """
+        Sets the pKa_BH of a non-hydrogen atom. None removes it.
+        """
+        self.values[atom_idx] = MISSING if value is None else value
+
+    def __getitem__(self,atom_idx):
+        if 0 < atom_idx < len(self.values):
+            value = self.values[atom_idx]
+            if not math.isnan(value):
+                return value
+        raise KeyError(atom_idx)
+
+    def __iter__(self):
+        for atom_idx in range(1,len(self.values)):
+            if not math.isnan(self.values[atom_idx]):
+                yield atom_idx
+
+    def __len__(self):
+        return sum(1 for atom_idx in self)
@@ -0,0 +1,59 @@
+"""
+Tests that asking for the pKa an atom would have after breaking a bond gives the same answer as
+copying the molecule, breaking the bond and running get_all_pka on the copy.
+"""
+
+import unittest
+
+from sic.pka import fragment_cache, pka
+from sic.structure import connectivity_table, struct_ops
+from sic.tests import molecules
+
+def make_molecule(smiles):
+    mol = molecules.make_molecule(smiles)
+    pka.get_all_pka(mol)
+    return mol
+
+def pka_after_copy(atom,start,end,mol):
+    new_mol = struct_ops.copy_molecule(mol)
+    struct_ops.break_bond(start,end,new_mol)
+    pka.get_all_pka(new_mol)
+    return pka.get_pka(atom,new_mol)
+
+class BreakQueryTest(unittest.TestCase):
+    def setUp(self):
+        fragment_cache.get_edit_cache().clear()
+
+    def testLeavingGroups(self):
+        """
+        Every heavy atom bond broken both ways, in molecules with a few fragments, a double bond and a ring.
+        """
+
+        for smiles in ("CCBr.[OH-]","CC(C)(C)[OH2+].O","C=CC(=O)C.[NH2-]","C1CCOC1.Cl","c1ccccc1CCl"):
+            mol = make_molecule(smiles)
+            obmol = mol.OBMol
+            for start in range(1,obmol.NumAtoms() + 1):
+                for end in mol.connectivity_table.get_atoms_bonded(start):
+                    if obmol.GetAtom(start).GetAtomicNum() == 1 or obmol.GetAtom(end).GetAtomicNum() == 1:
+                        continue
+                    for atom in (start,end):
+                        self.assertEqual(pka.get_pka_after_break(atom,start,end,mol), pka_after_copy(atom,start,end,mol), (smiles,atom,start,end))
+
+    def testMemoized(self):
+        mol = make_molecule("CCBr.CCBr")
+        hits = fragment_cache.get_edit_cache().hits #the cache is shared, other tests may have hit it already
+        self.assertEqual(pka.get_pka_after_break(3,2,3,mol), pka.get_pka_after_break(6,5,6,mol))
+        self.assertEqual(fragment_cache.get_edit_cache().hits, hits + 1)
+        self.assertEqual(mol.write("can").split()[0], "CCBr.CCBr") #left alone
+
+    def testOtherFragment(self):
+        mol = make_molecule("CCBr.[OH3+]")
+        self.assertEqual(pka.get_pka_after_break(4,2,3,mol), pka.get_pka(4,mol))
+
+    def testNoBond(self):
+        mol = make_molecule("CCBr.O")
+        with self.assertRaises(ValueError):
+            pka.get_pka_after_break(1,1,3,mol)
+
+if __name__ == "__main__":
+    unittest.main()
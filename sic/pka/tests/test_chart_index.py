@@ -0,0 +1,51 @@
+"""
+Tests that the chart prefilter only leaves out patterns that can't match, and that pKa values come out
+the same as matching the whole chart.
+"""
+
+import unittest
+
+from sic.pka import chart_index, fragment_cache, pka
+from sic.pka.pka_chart import PKA_CHART
+from sic.structure import patterns
+from sic.tests.molecules import make_molecule
+
+class ChartIndexTest(unittest.TestCase):
+    def testRequirements(self):
+        requirements = chart_index.get_requirements("[NH-][CX4]")
+        self.assertEqual(requirements[("element",7)], 1)
+        self.assertEqual(requirements[("charge",7,-1)], 1)
+        self.assertEqual(requirements[("hydrogens",7,1)], 1)
+        self.assertEqual(chart_index.get_anchor(requirements), ("charge",7,-1))
+        #alternatives and negations don't pin anything down
+        self.assertEqual(chart_index.get_requirements("[C,CH,CH2]"), chart_index.get_requirements("[#6]"))
+        self.assertEqual(chart_index.get_requirements("[Br!H1]"), {("element",35): 1})
+
+    def testHydrocarbon(self):
+        candidates = pka.CHART_INDEX.get_candidates(chart_index.get_signature(make_molecule("CCCC")))
+        self.assertNotIn("[SX4](=O)(=O)([O][H])[O-]", candidates)
+        self.assertLess(len(candidates), len(PKA_CHART) // 4)
+
+    def testNoMatchesLeftOut(self):
+        """
+        Every pattern that matches a molecule has to be a candidate for it.
+        """
+
+        for smiles in ("CC(=O)O.O","C[N+](=O)[O-]","OS(=O)(=O)O.[OH-]","CC[O-].[Na+]","C=CC[NH3+].[Cl-]","c1ccccc1[O-]","CC#N.[H-]"):
+            mol = make_molecule(smiles)
+            candidates = set(pka.CHART_INDEX.get_candidates(chart_index.get_signature(mol)))
+            for pattern in PKA_CHART:
+                if patterns.get_pattern(pattern).findall(mol):
+                    self.assertIn(pattern, candidates, smiles)
+
+    def testSameValues(self):
+        fragment_cache.get_cache().clear()
+        mol = make_molecule("CC(=O)[O-].[OH3+].CCS")
+        pka.get_all_pka(mol)
+        full_matches = dict((pattern,patterns.get_pattern(pattern).findall(mol)) for pattern in PKA_CHART)
+        prefiltered = dict(mol.pka_index)
+        pka.build_index(mol,full_matches)
+        self.assertEqual(prefiltered, mol.pka_index)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Tests that the saved pKa chart tables come back the same as building them, and that tables saved for
+another chart (or another format version) are never used.
+"""
+
+import os
+import tempfile
+import unittest
+
+from sic.pka import chart_tables
+from sic.pka.pka_chart import PKA_CHART
+
+SMALL_CHART = {"[OX2H1+]": {"pKa_HA": -2, "pKa_BH": None}, "[NH2-]": {"pKa_HA": None, "pKa_BH": 35}}
+
+class ChartTablesTest(unittest.TestCase):
+    def setUp(self):
+        handle,self.path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def testRoundTrip(self):
+        chart_tables.write(PKA_CHART,self.path)
+        self.assertEqual(chart_tables.load(PKA_CHART,self.path), chart_tables.build(PKA_CHART))
+
+    def testChartChanged(self):
+        chart_tables.write(SMALL_CHART,self.path)
+        changed = dict(SMALL_CHART)
+        changed["[NH2-]"] = {"pKa_HA": None, "pKa_BH": 36}
+        self.assertIsNone(chart_tables.load(changed,self.path))
+        self.assertIsNotNone(chart_tables.load(SMALL_CHART,self.path))
+
+    def testVersionChanged(self):
+        chart_tables.write(SMALL_CHART,self.path)
+        version = chart_tables.ARTIFACT_VERSION
+        chart_tables.ARTIFACT_VERSION = version + 1
+        try:
+            self.assertIsNone(chart_tables.load(SMALL_CHART,self.path))
+        finally:
+            chart_tables.ARTIFACT_VERSION = version
+
+    def testUnreadable(self):
+        with open(self.path,"w") as artifact_file:
+            artifact_file.write("{not json")
+        self.assertIsNone(chart_tables.load(SMALL_CHART,self.path))
+        self.assertEqual(chart_tables.get_tables(SMALL_CHART).keys(), {"pattern_info","requirements"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Tests that pKa values looked up from the fragment cache land on the right atoms, whatever order
+the atoms of a fragment have in the molecule.
+"""
+
+import unittest
+
+from sic.pka import fragment_cache, pka
+from sic.structure import connectivity_table
+from sic.tests.molecules import make_molecule
+
+def get_values(mol):
+    """
+    pKa values by (element, charge, number of bonded H) for an order-independent comparison.
+    """
+
+    values = set()
+    for atom in mol:
+        hydrogens = sum(1 for bonded in mol.connectivity_table.get_atoms_bonded(atom.idx) if mol.OBMol.GetAtom(bonded).GetAtomicNum() == 1)
+        values.add((atom.atomicnum,atom.formalcharge,hydrogens,pka.get_pka(atom.idx,mol)))
+    return values
+
+class FragmentCacheTest(unittest.TestCase):
+    def setUp(self):
+        fragment_cache.get_cache().clear()
+
+    def testDuplicateFragments(self):
+        """
+        Two hydronium ions in one state: the second comes from the cache and gets the same values.
+        """
+
+        mol = make_molecule("[OH3+].CCO.[OH3+]")
+        pka.get_all_pka(mol)
+        self.assertGreaterEqual(fragment_cache.get_cache().hits, 1)
+        self.assertEqual(pka.get_pka(1,mol), pka.get_pka(5,mol))
+        for atom in mol:
+            if atom.atomicnum == 1 and mol.OBMol.GetAtom(next(iter(mol.connectivity_table.get_atoms_bonded(atom.idx)))).GetFormalCharge() == 1:
+                self.assertEqual(pka.get_pka(atom.idx,mol), 0.0)
+
+    def testDifferentAtomOrder(self):
+        """
+        Cached matches are stored by position in the fragment's SMILES, so a hit on a molecule written in
+        another order must still give every atom its own value.
+        """
+
+        first = make_molecule("OCC[O-].Cl")
+        pka.get_all_pka(first)
+        second = make_molecule("Cl.[O-]CCO")
+        pka.get_all_pka(second)
+        self.assertGreater(fragment_cache.get_cache().hits, 0)
+        self.assertEqual(get_values(first), get_values(second))
+        fragment_cache.get_cache().clear()
+        uncached = make_molecule("Cl.[O-]CCO")
+        pka.get_all_pka(uncached)
+        self.assertEqual(uncached.pka_index, second.pka_index)
+
+    def testAromaticNotCached(self):
+        mol = make_molecule("c1ccccc1O")
+        for key,atoms in fragment_cache.split_fragments(mol):
+            self.assertIsNone(key)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Tests that updating the pKa index of a copied molecule after a few bond edits gives the same
+index as working it out from scratch.
+"""
+
+import unittest
+
+from sic.pka import pka
+from sic.structure import struct_ops
+from sic.tests.molecules import make_molecule
+
+def get_full_index(mol):
+    fresh = struct_ops.copy_molecule(mol)
+    del fresh.pka_matches #forces every pattern to be matched again
+    pka.get_all_pka(fresh)
+    return fresh.pka_index
+
+class IncrementalPkaTest(unittest.TestCase):
+    def checkEdit(self,smiles,edit):
+        """
+        Runs get_all_pka on smiles, copies it, applies edit(copy) and compares the incremental index with a full one.
+        """
+
+        mol = make_molecule(smiles)
+        pka.get_all_pka(mol)
+        copy = struct_ops.copy_molecule(mol)
+        edit(copy)
+        self.assertTrue(copy.edit_log)
+        pka.get_all_pka(copy)
+        self.assertEqual(copy.pka_index, get_full_index(copy))
+        return mol,copy
+
+    def testProtonTransfer(self):
+        """
+        HCl + water: Cl-H breaks and O-H forms, so both the chloride and hydronium change.
+        """
+
+        def edit(mol):
+            struct_ops.make_bond(2,3,mol) #water O (2) onto the HCl hydrogen (3)
+            struct_ops.break_bond(3,1,mol) #Cl (1) leaves with the electrons
+        mol,copy = self.checkEdit("Cl.O",edit)
+        self.assertEqual(pka.get_pka(2,copy), None) #hydronium O has no pKa_BH
+        self.assertEqual(pka.get_pka(3,copy), 0.0) #and its hydrogens are acidic
+        self.assertNotEqual(mol.pka_index, copy.pka_index)
+
+    def testUnchangedParent(self):
+        """
+        The parent's index must not change when the copy is updated.
+        """
+
+        mol = make_molecule("CCO.Cl")
+        pka.get_all_pka(mol)
+        before = dict(mol.pka_index)
+        copy = struct_ops.copy_molecule(mol)
+        struct_ops.make_bond(3,4,copy)
+        pka.get_all_pka(copy)
+        self.assertEqual(mol.pka_index, before)
+
+    def testRing(self):
+        """
+        Breaking a ring bond can change atoms far from the bond, so the whole fragment is looked at again.
+        """
+
+        def edit(mol):
+            struct_ops.break_bond(1,2,mol)
+        self.checkEdit("C1CCCCC1O",edit)
+
+    def testNoEdits(self):
+        mol = make_molecule("CC(=O)O")
+        pka.get_all_pka(mol)
+        copy = struct_ops.copy_molecule(mol)
+        pka.get_all_pka(copy)
+        self.assertEqual(copy.pka_index, mol.pka_index)
+
+if __name__ == "__main__":
+    unittest.main()
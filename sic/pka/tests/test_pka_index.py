@@ -0,0 +1,45 @@
+"""
+Tests that PkaIndex reads like the dictionary it replaced, and that copies made by copy_molecule share it
+until get_all_pka builds them one of their own.
+"""
+
+import unittest
+
+from openbabel.pybel import readstring
+
+from sic.pka import pka
+from sic.pka.pka_index import PkaIndex
+from sic.structure import connectivity_table, struct_ops
+
+class PkaIndexTest(unittest.TestCase):
+    def testMapping(self):
+        index = PkaIndex(4)
+        index.set_ha(2,15.7)
+        index.set_bh(3,-1.74)
+        index.set_bh(4,None)
+        self.assertEqual(index, {2: 15.7, 3: -1.74})
+        self.assertNotIn(4, index)
+        self.assertIsNone(index.get(5))
+        self.assertIsNone(index.get(0))
+        #an atom keeps the last value it was given, whichever kind it was
+        index.set_bh(2,4.0)
+        self.assertEqual(index[2], 4.0)
+        index.set_ha(2,None)
+        self.assertNotIn(2, index)
+
+    def testCopyMolecule(self):
+        mol = readstring("smi","CCO.[OH3+]")
+        mol.addh()
+        mol.connectivity_table = connectivity_table.ConnectivityTable(mol)
+        pka.get_all_pka(mol)
+        copy = struct_ops.copy_molecule(mol)
+        self.assertIs(copy.pka_index, mol.pka_index)
+        before = dict(mol.pka_index)
+        struct_ops.make_bond(3,11,copy) #ethanol's O (3) onto a hydronium hydrogen (11)
+        struct_ops.break_bond(11,4,copy) #hydronium's O (4) keeps the electrons
+        pka.get_all_pka(copy)
+        self.assertIsNot(copy.pka_index, mol.pka_index)
+        self.assertEqual(dict(mol.pka_index), before)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+The interaction table (interactions.INTERACTIONS) indexed by source and sink subtype, so that
+generate_choices only matches the sinks that can react with the sources a molecule has, and only
+looks at the source-sink pairs that have an interaction at all, instead of every source against every sink.
+"""
+
+from .interactions import INTERACTIONS
+
+class InteractionIndex(object):
+    """
+    Indexes a {(source subtype,sink subtype) : [interactions]} table by subtype:
+
+    - sink_partners: {source subtype : set of sink subtypes it has interactions with}
+    - source_partners: {sink subtype : set of source subtypes it has interactions with}
+    """
+
+    def __init__(self,interactions=INTERACTIONS):
+        self.interactions = interactions
+        self.sink_partners = {}
+        self.source_partners = {}
+        for source_type,sink_type in interactions:
+            self.sink_partners.setdefault(source_type,set()).add(sink_type)
+            self.source_partners.setdefault(sink_type,set()).add(source_type)
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "InteractionIndex<Pairs:{},Sources:{},Sinks:{}>".format(len(self.interactions),len(self.sink_partners),len(self.source_partners))
+
+    def get_sink_types(self,source_types):
+        """
+        Returns the set of sink subtypes that have an interaction with at least one of source_types.
+        """
+
+        sink_types = set()
+        for source_type in source_types:
+            sink_types.update(self.sink_partners.get(source_type,()))
+        return sink_types
+
+    def get_pairs(self,sources,sinks):
+        """
+        Yields (source,sink,[interactions]) for every source and sink that have interactions, without looking
+        at the pairs that don't. With sinks grouped by subtype (as segmentation.segment_molecule gives them),
+        the pairs come in the same order as going over every sink for each source in turn.
+        """
+
+        sinks_by_type = {} #{sink subtype : [sinks]}, in the order the subtypes first turn up in sinks
+        for sink in sinks:
+            sinks_by_type.setdefault(sink.subtype,[]).append(sink)
+        for source in sources:
+            partners = self.sink_partners.get(source.subtype,())
+            for sink_type,typed_sinks in sinks_by_type.items():
+                if sink_type in partners:
+                    possible_interactions = self.interactions[(source.subtype,sink_type)]
+                    for sink in typed_sinks:
+                        yield source,sink,possible_interactions
+
+INTERACTION_INDEX = InteractionIndex()
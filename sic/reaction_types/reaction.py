@@ -11,7 +11,8 @@ class Reaction(object):
     will be involved, this is left open for strange reaction types.
 
     A Reaction has a type, which is stored as a static string for
-    all instances.
+    all instances, and bond_edits, the most bonds (counting each unit of bond order)
+    its rearrangement makes or breaks.
 
     A Reaction has a cross check, and a reversible rearrangement.
 
@@ -39,6 +40,7 @@ class Reaction(object):
     # "two_products" = True only for reactions that produce two equally products. This is whenthe Mark rule is equal for both carbons in Elimenations or Additions reactions
     """
     reaction_type = None
+    bond_edits = None
     def __init__(self, sources, sinks, second_product = False):  
         """
         Attaches sources and sinks to this object, and sets the initial cross check
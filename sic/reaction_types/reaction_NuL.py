@@ -10,6 +10,7 @@ from sic.structure import struct_ops
 class NuL(Reaction):
 
     reaction_type = "NuL"
+    bond_edits = 4
     def __init__(self, sources, sinks):
         Reaction.__init__(self, sources, sinks)
         # For the sink, Y-L, if the two halogens are different, measure the electronegativity of both Halogens.
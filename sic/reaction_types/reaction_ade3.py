@@ -8,6 +8,7 @@ from sic.structure import struct_ops, properties
 class ADE3(Reaction):
 
     reaction_type = "ADE3"
+    bond_edits = 4
     def __init__(self, sources, sinks,second_product = False ):
         Reaction.__init__(self, sources, sinks,second_product)
         # "mark" should be the carbon with the heighest carbon degree on one side ofthe double bond, and "ant_mark" is the carbon that has less smaller carbon degree
@@ -9,6 +9,7 @@ from sic.structure import scoring, struct_ops
 class ADN(Reaction):
 
     reaction_type = "ADN"
+    bond_edits = 2
     def __init__(self, sources, sinks):
         Reaction.__init__(self, sources, sinks)
         # Since we have two types of sinks,"Z=C" and "C=C",
@@ -36,13 +37,9 @@ class ADN(Reaction):
         pKa_BHNu = pka.get_pka(nucleophile.get_atom(source_sbtype),nucleophile.molecule)
         #for the ewg-C1 it's harder because the pKa changes based on whether it's bonded to the C2
         #we need to break the bond C1=C2 double bond
-        #for now, we copy the molecule, break the bond there
-        # use a smart pattern to find "ewg-C-" part of the molecule, and recalc pKa
+        #get_pka_after_break breaks it on a copy of just that fragment and recalcs pKa there
         # for the Z=C, break the double bond, make a C-Nu bond 
-        new_mol = struct_ops.copy_molecule(nucleophile.molecule)
-        struct_ops.break_bond(sink.get_atom(self.S_atom),sink.get_atom(self.F_atom),new_mol)
-        pka.get_all_pka(new_mol)
-        pKa_BH = pka.get_pka(sink.get_atom(self.F_atom),new_mol) # get
+        pKa_BH = pka.get_pka_after_break(sink.get_atom(self.F_atom),sink.get_atom(self.S_atom),sink.get_atom(self.F_atom),nucleophile.molecule)
         if pKa_BHNu is None or pKa_BH is None:
             self.cross_check_score = 0.0
             return self.cross_check_score
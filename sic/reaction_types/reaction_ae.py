@@ -10,6 +10,7 @@ from sic.structure import struct_ops, properties
 class AE(Reaction):
 
     reaction_type = "AE"
+    bond_edits = 3
     def __init__(self, sources, sinks,second_product = False):
         Reaction.__init__(self, sources, sinks, second_product)
         # For the source "C=C", mark should be the carbon with the heighest carbon degree on one side ofthe double bond, and "ant_mark" is the carbon that has less smaller carbon degree
@@ -13,6 +13,7 @@ class AN(Reaction):
     """
 
     reaction_type = "AN"
+    bond_edits = 1
 
     def cross_check(self):
         """
@@ -15,6 +15,7 @@ class DN(Reaction):
     """
 
     reaction_type = "DN"
+    bond_edits = 1
     def cross_check(self):
         """
         For a DN, you want to check:
@@ -34,11 +35,12 @@ class DN(Reaction):
             self.cross_check_score = 0.0
             return self.cross_check_score
         #same check for pKa of L as in SN2, but this time there's no ΔpKa, we're just checking L pKa.
-        new_mol = struct_ops.copy_molecule(sink.molecule)
-        struct_ops.break_bond(sink.get_atom("C"),sink.get_atom("L"),new_mol) #this works because we use indices, not direct atom.OBAtom refs
         #need to break L, C because otherwise C gets a - charge and L gets a + (and an implicit H by SMILES standards...)
-        pka.get_all_pka(new_mol)
-        pKa_BHL = pka.get_pka(sink.get_atom("L"),new_mol)
+        pKa_BHL = pka.get_pka_after_break(sink.get_atom("L"),sink.get_atom("C"),sink.get_atom("L"),sink.molecule)
+        if pKa_BHL is None:
+            #None generally means either "infinite" or "not in our pKa chart", same as in SN2
+            self.cross_check_score = 0.0
+            return self.cross_check_score
         if pKa_BHL > 6:
             self.cross_check_score = 0.0
         elif pKa_BHL < -6:
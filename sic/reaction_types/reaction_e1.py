@@ -11,6 +11,7 @@ class E1(Reaction):
     """
     
     reaction_type = "E1"
+    bond_edits = 3
 
     def cross_check(self):
         """
@@ -11,6 +11,7 @@ class E2(Reaction):
     """
 
     reaction_type = "E2"
+    bond_edits = 4
 
     def cross_check(self):
         """
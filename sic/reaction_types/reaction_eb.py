@@ -11,6 +11,7 @@ class EB(Reaction):
     """
 
     reaction_type = "EB"
+    bond_edits = 2
 
     def cross_check(self):
         """
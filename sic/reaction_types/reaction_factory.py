@@ -19,6 +19,9 @@ from .reaction_proton_transfer import ProtonTransfer
 from .reaction_sn2 import SN2
 from sic import utils
 
+#no reaction changes more bonds than this, which bounds how fast a mechanism can close a bond distance (see ReactionState.get_steps_left)
+MAX_BOND_EDITS = max(reaction.bond_edits for reaction in (ADE3,ADN,AE,AN,DN,E1,E2,EB,NuL,ProtonTransfer,SN2))
+
 def produce_reaction(r_type,sources,sinks,mol=False,second_product = False):
     """
     Returns the correct reaction type given sources and sinks.
@@ -12,6 +12,7 @@ class ProtonTransfer(Reaction):
     """
 
     reaction_type = "proton_transfer"
+    bond_edits = 3
 
     def cross_check(self):
         """
@@ -12,6 +12,7 @@ class SN2(Reaction):
     """
 
     reaction_type = "SN2"
+    bond_edits = 2
 
     def cross_check(self):
         """
@@ -41,13 +42,9 @@ class SN2(Reaction):
         pKa_BHNu = pka.get_pka(nucleophile.get_atom("Y"),nucleophile.molecule)
         #for the L it's harder because the pKa changes based on whether it's bonded to the C
         #we need to break the bond, see how that affects the pKa, and then use that number
-        #for now, we copy the molecule, break the bond there, and recalc pKa
-        new_mol = struct_ops.copy_molecule(nucleophile.molecule) #the molecule passed in is arbitrary - remember it's the same for source and sink
-        struct_ops.break_bond(sink.get_atom("C"),sink.get_atom("L"),new_mol) #this works because we use indices, not direct atom.OBAtom refs
+        #get_pka_after_break does that on a copy of just the C-L fragment, and remembers the answer
         #need to break L, C because otherwise C gets a - charge and L gets a + (and an implicit H by SMILES standards...)
-        pka.get_all_pka(new_mol)
-        pKa_BHL = pka.get_pka(sink.get_atom("L"),new_mol)
-        #hope the garbage collector kills new_mol here and move on
+        pKa_BHL = pka.get_pka_after_break(sink.get_atom("L"),sink.get_atom("C"),sink.get_atom("L"),nucleophile.molecule) #the molecule passed in is arbitrary - remember it's the same for source and sink
         if pKa_BHNu is None or pKa_BHL is None:
             #None generally means either "infinite" or "not in our pKa chart".
             #If running debug mode, print which are None
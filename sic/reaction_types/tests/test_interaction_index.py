@@ -0,0 +1,50 @@
+"""
+Tests that the interaction index gives the same source-sink pairs, in the same order, as going over
+every source and sink and looking each pair up in the interaction table, and that segmenting with it
+finds every sink that has a partner.
+"""
+
+import unittest
+
+from sic.reaction_types.interaction_index import INTERACTION_INDEX
+from sic.reaction_types.interactions import INTERACTIONS
+from sic.segmentation import segmentation
+from sic.tests.molecules import make_molecule
+
+def get_all_pairs(sources,sinks):
+    pairs = []
+    for source in sources:
+        for sink in sinks:
+            if (source.subtype,sink.subtype) in INTERACTIONS:
+                pairs.append((source,sink,INTERACTIONS[(source.subtype,sink.subtype)]))
+    return pairs
+
+class InteractionIndexTest(unittest.TestCase):
+    def testPartners(self):
+        self.assertEqual(INTERACTION_INDEX.get_sink_types(["DUM"]), set(["C-L"]))
+        self.assertIn("Y-L", INTERACTION_INDEX.get_sink_types(["Y","C=C"]))
+        self.assertNotIn("Y-L", INTERACTION_INDEX.get_sink_types(["Y"]))
+        self.assertEqual(INTERACTION_INDEX.get_sink_types(["nothing"]), set())
+
+    def testSamePairs(self):
+        for smiles in ("C=C.IBr","CCBr.[OH-]","CC(=O)C=C.[C-]#N","CC[O+](C)C.O","CC=O.Cl"):
+            full = segmentation.segment_molecule(make_molecule(smiles))
+            pairs = list(INTERACTION_INDEX.get_pairs(full["sources"],full["sinks"]))
+            self.assertEqual(pairs, get_all_pairs(full["sources"],full["sinks"]), smiles)
+
+    def testSegmentWithIndex(self):
+        """
+        Only sinks without partners are left out.
+        """
+
+        for smiles in ("C=C.IBr","CCO.ClCl","CCBr.[OH-]"):
+            mol = make_molecule(smiles)
+            full = segmentation.segment_molecule(make_molecule(smiles))
+            planned = segmentation.segment_molecule(mol,INTERACTION_INDEX)
+            self.assertEqual([source.atoms for source in planned["sources"]], [source.atoms for source in full["sources"]])
+            partners = INTERACTION_INDEX.get_sink_types(set(source.subtype for source in full["sources"]))
+            self.assertEqual([sink.atoms for sink in planned["sinks"]], [sink.atoms for sink in full["sinks"] if sink.subtype in partners], smiles)
+        self.assertNotIn("Y-L", [sink.subtype for sink in planned["sinks"]]) #bromoethane and hydroxide have no C=C
+
+if __name__ == "__main__":
+    unittest.main()
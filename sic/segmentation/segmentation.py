@@ -3,29 +3,56 @@ While the sources and sinks "modules" contain the actual expressions used
 for matching, this module contains the logic used to actually perform the
 matching on a molecule and generate the data structures other parts of SiC³
 will use to make sure things are rearranged properly when a reaction occurs.
+
+Only a very small section of the molecule changes at each step, so with SIC_INCREMENTAL_SEGMENTATION=1
+segment_molecule keeps the matches of every pattern on the molecule (molecule.segment_groups, carried over by
+struct_ops.copy_molecule like the pKa matches). After bond edits, matches containing a changed atom are dropped
+and only the patterns that could match near the changed atoms are run again (see find_groups).
+It's off by default: the edits a search makes nearly always touch the heteroatoms and hydrogens the patterns
+look for, so most of them are run again anyway, and finding the changed atoms costs more than the rest saves.
+Set SIC_CHECK_SEGMENTATION=1 to check every incremental result against a full segmentation.
 """
 
+import os
+
 from . import source, sink
 from .sinks import SINKS
 from .sources import SOURCES
-from openbabel import pybel
+from sic.pka import chart_tables
+from sic.structure import patterns
+from sic.structure.atom_snapshot import AtomSnapshot
 
-#TODO: Potentially use the fact that only a very small section of the molecule changes
-#at each step in order to optimize segmentation into sources/sinks
-def segment_molecule(molecule):
+INCREMENTAL = os.environ.get("SIC_INCREMENTAL_SEGMENTATION","") not in ("","0") #see find_groups
+CHECK_INCREMENTAL = os.environ.get("SIC_CHECK_SEGMENTATION","") not in ("","0") #debug mode, see find_groups
+
+def segment_molecule(molecule,interaction_index=None,snapshot=None):
     """
     Segments a molecule into sets of sources and sinks by iterating over all
     source and sink molecular regular expressions this program knows about,
     and creating a data structure that "tags" atoms by their source and sink
     characteristics.
 
+    If an interaction_index (see reaction_types.interaction_index) is given, the sources are found first
+    and only the sinks that have an interaction with one of them are looked for.
+    If snapshot (an AtomSnapshot of molecule) is given, atom properties are read from it rather than from OpenBabel.
+
     Returns an object with two properties:
 
     - sources: List of all sources in the molecule, as Source objects
     - sinks: List of all sinks in the molecule, as Sink objects
     """
 
-    result = {"sources" : label_sources(molecule), "sinks" : label_sinks(molecule)}
+    atomic_nums = snapshot.atomic_nums if snapshot else None
+    if interaction_index is None:
+        groups = find_groups(molecule,snapshot=snapshot)
+        result = {"sources" : label_sources(molecule,groups,atomic_nums), "sinks" : label_sinks(molecule,groups,atomic_nums=atomic_nums)}
+    else:
+        sources = label_sources(molecule,find_groups(molecule,list(SOURCES.values()),snapshot),atomic_nums)
+        #a DUM source is added below for any C-L, so C-L always has a partner
+        partners = interaction_index.get_sink_types(set(source.subtype for source in sources) | set(["DUM"]))
+        sink_types = [sink_type for sink_type in SINKS if sink_type in partners]
+        groups = find_groups(molecule,[SINKS[sink_type] for sink_type in sink_types],snapshot)
+        result = {"sources" : sources, "sinks" : label_sinks(molecule,groups,sink_types,atomic_nums)}
     #do any additional processing here
     for sink in result["sinks"]:
         #check for C-Ls that might fall apart
@@ -35,10 +62,75 @@ def segment_molecule(molecule):
             break
     return result
 
-def label_sources(molecule):
+def find_groups(molecule,smarts_list=None,snapshot=None):
+    """
+    Returns {SMARTS : matches} for every source and sink pattern (or only those in smarts_list).
+    With INCREMENTAL on, they're kept on the molecule (molecule.segment_groups, with molecule.segment_synced
+    saying how far into the edit log each pattern's matches are up to date).
+
+    If the molecule was copied from one that was already segmented, its matches are updated instead:
+    a match containing an atom whose bonds changed since (struct_ops.get_changed_atoms) is dropped, and
+    a pattern is only run again if the atoms within its radius of the changed atoms have all the elements
+    it requires (like pka.update_matches), since any new match has to contain a changed atom. Matches elsewhere
+    can't have changed, because every pattern only looks at the atoms it matches.
+    Patterns that weren't asked for are left as they were, to be updated whenever they are.
+    The changed atoms and their surroundings come from snapshot (see AtomSnapshot.get_changes) if given.
+    """
+
+    if smarts_list is None:
+        smarts_list = list(PATTERN_INFO)
+    if not INCREMENTAL:
+        return dict((smarts,patterns.get_pattern(smarts).findall(molecule)) for smarts in smarts_list)
+    if hasattr(molecule,"segment_groups") and hasattr(molecule,"edit_log"):
+        groups = update_groups(molecule,smarts_list,snapshot or AtomSnapshot(molecule))
+        if CHECK_INCREMENTAL:
+            full_groups = dict((smarts,patterns.get_pattern(smarts).findall(molecule)) for smarts in smarts_list)
+            assert groups == full_groups, "Incremental segmentation of {} differs from a full one: {} != {}".format(molecule.write("can").strip(),groups,full_groups)
+        #both may be shared with copies, so they're replaced rather than changed in place
+        segment_groups = dict(molecule.segment_groups)
+        segment_synced = dict(molecule.segment_synced)
+    else:
+        groups = dict((smarts,patterns.get_pattern(smarts).findall(molecule)) for smarts in smarts_list)
+        segment_groups = {}
+        segment_synced = {}
+    if not hasattr(molecule,"edit_log"):
+        molecule.edit_log = [] #start tracking bond edits so the next segmentation can be incremental
+    segment_groups.update(groups)
+    segment_synced.update((smarts,len(molecule.edit_log)) for smarts in groups)
+    molecule.segment_groups = segment_groups
+    molecule.segment_synced = segment_synced
+    return groups
+
+def update_groups(molecule,smarts_list,snapshot):
+    """
+    The incremental part of find_groups, for a molecule with segment_groups.
+    """
+
+    old_groups = molecule.segment_groups
+    changes = {} #{edit log position : (changed atoms,elements_within)}, usually just the one
+    groups = {}
+    for smarts in smarts_list:
+        if smarts not in old_groups:
+            groups[smarts] = patterns.get_pattern(smarts).findall(molecule) #never matched for this molecule's ancestors
+            continue
+        synced = molecule.segment_synced[smarts]
+        if synced not in changes:
+            changes[synced] = snapshot.get_changes(molecule,synced,MAX_RADIUS)
+        changed,elements_within = changes[synced]
+        radius,elements = PATTERN_INFO[smarts]
+        if not changed:
+            groups[smarts] = old_groups[smarts]
+        elif not elements - elements_within[radius]:
+            groups[smarts] = patterns.get_pattern(smarts).findall(molecule)
+        else:
+            groups[smarts] = [group for group in old_groups[smarts] if changed.isdisjoint(group)]
+    return groups
+
+def label_sources(molecule,groups=None,atomic_nums=None):
     """
     Handles the logic of actually looking at the SMILES patterns and producing a list of sources
-    based on a molecule.
+    based on a molecule. groups can be given as {SMARTS : matches} (see find_groups) if the patterns
+    were already matched, and atomic_nums as every atom's atomic number (see AtomSnapshot).
 
     Exists to remove clutter from segment_molecule.
     While superficially similar to label_sinks in the basic sense, merging them could get problematic and
@@ -46,18 +138,21 @@ def label_sources(molecule):
     """
 
     sources = []
-    mol_atoms = molecule.atoms #so that we don't do a list processing every time, given that molecule.atoms would regenerate itself
     for source_type in SOURCES:
-        smarts = pybel.Smarts(SOURCES[source_type])
-        groups = smarts.findall(molecule)
-        for group in groups:            
-            sources.append(source.Source(source_type,group,molecule))
+        if groups is None:
+            matches = patterns.get_pattern(SOURCES[source_type]).findall(molecule)
+        else:
+            matches = groups[SOURCES[source_type]]
+        for group in matches:
+            sources.append(source.Source(source_type,group,molecule,atomic_nums))
     return sources
 
-def label_sinks(molecule):
+def label_sinks(molecule,groups=None,sink_types=SINKS,atomic_nums=None):
     """
     Handles the logic of actually looking at the SMILES patterns and producing a list of sinks 
-    based on a molecule.
+    based on a molecule. groups can be given as {SMARTS : matches} (see find_groups) if the patterns
+    were already matched, and atomic_nums as every atom's atomic number (see AtomSnapshot).
+    Only the sink subtypes in sink_types are looked for.
 
     Exists to remove clutter from segment_molecule.
     While superficially similar to label_sources in the basic sense, merging them could get problematic and
@@ -65,10 +160,18 @@ def label_sinks(molecule):
     """
 
     sinks = []
-    mol_atoms = molecule.atoms
     for sink_type in SINKS:
-        smarts = pybel.Smarts(SINKS[sink_type])
-        groups = smarts.findall(molecule)
-        for group in groups:
-            sinks.append(sink.Sink(sink_type,group,molecule))
+        if sink_type not in sink_types:
+            continue
+        if groups is None:
+            matches = patterns.get_pattern(SINKS[sink_type]).findall(molecule)
+        else:
+            matches = groups[SINKS[sink_type]]
+        for group in matches:
+            sinks.append(sink.Sink(sink_type,group,molecule,atomic_nums))
     return sinks
+
+patterns.compile_all(list(SOURCES.values()) + list(SINKS.values()))
+#{SMARTS : (radius,elements)} for every source and sink pattern, see chart_tables.get_pattern_info
+PATTERN_INFO = dict((smarts,chart_tables.get_pattern_info(smarts)) for smarts in list(SOURCES.values()) + list(SINKS.values()))
+MAX_RADIUS = max(radius for radius,elements in PATTERN_INFO.values())
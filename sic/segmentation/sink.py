@@ -15,19 +15,24 @@ class Sink(object):
     - molecule: a reference to the molecule object related to this sink, for
       convenience in defining structure-modification functions
     """
-    def __init__(self,subtype,atoms,molecule):
+    def __init__(self,subtype,atoms,molecule,atomic_nums=None):
         """
         Initializes the Sink of a particular subtype with a tuple of atom indices
         obtained from the smarts.findall function, and attaches the reference
         to the molecule as well.
         Depending on the subtype, the atoms will be assigned different keys.
+        atomic_nums can be given as a list of every atom's atomic number (see AtomSnapshot) to save asking OpenBabel.
         """
         self.subtype = subtype
         self.atoms = {}
         self.molecule = molecule
+        if atomic_nums is not None:
+            get_atomic_num = atomic_nums.__getitem__
+        else:
+            get_atomic_num = lambda atom_idx: molecule.OBMol.GetAtom(atom_idx).GetAtomicNum()
         for atom in atoms:
             if subtype == "H-L":
-                if molecule.OBMol.GetAtom(atom).GetAtomicNum() == 1: #to avoid molecule.atoms which is a list comprehension on OBMol
+                if get_atomic_num(atom) == 1: #to avoid molecule.atoms which is a list comprehension on OBMol
                     self.atoms["H"] = atom
                 else:
                     self.atoms["L"] = atom #H-H we pretend not to care about
@@ -35,12 +40,12 @@ class Sink(object):
                 self.atoms["C+"] = atom #only one atom to care about
             elif subtype == "C-L":
                 #TODO: Figure out what to do if L is also a C, though C-C bonds don't break often.
-                if molecule.OBMol.GetAtom(atom).GetAtomicNum() == 6:
+                if get_atomic_num(atom) == 6:
                     self.atoms["C"] = atom
                 else:
                     self.atoms["L"] = atom
             elif subtype == "ewg(O)-C=C" or subtype == "ewg(N)-C=C": # Each "ewg-C=C" source has 4 atoms:(F, S, C1 , C2). F = first, S= second , C1 and C2 are the C-atoms of the double bond
-                if molecule.OBMol.GetAtom(atoms[1]).GetAtomicNum() == 8:
+                if get_atomic_num(atoms[1]) == 8:
                     self.atoms["F"] = atoms[1]
                     self.atoms["S"] = atom
                 else:
@@ -51,7 +56,7 @@ class Sink(object):
                 self.atoms["C2"] = atoms[3]
                 break
             elif subtype == "Z=C":
-                if molecule.OBMol.GetAtom(atom).GetAtomicNum() == 6:
+                if get_atomic_num(atom) == 6:
                     self.atoms["C"] = atom
                 else:
                     self.atoms["Z"] = atom
@@ -15,28 +15,33 @@ class Source(object):
     - molecule: a reference to the molecule object related to this source, for
       convenience in defining structure-modification functions
     """
-    def __init__(self,subtype,atoms,molecule):
+    def __init__(self,subtype,atoms,molecule,atomic_nums=None):
         """
         Initializes the Source of a particular subtype with a tuple of atom indices
         obtained from the smarts.findall function, and attaches the reference
         to the molecule as well.
         Depending on the subtype, the atoms will be assigned different keys.
+        atomic_nums can be given as a list of every atom's atomic number (see AtomSnapshot) to save asking OpenBabel.
         """
         self.subtype = subtype
         self.atoms = {}
         self.molecule = molecule
+        if atomic_nums is not None:
+            get_atomic_num = atomic_nums.__getitem__
+        else:
+            get_atomic_num = lambda atom_idx: molecule.OBMol.GetAtom(atom_idx).GetAtomicNum()
         for atom in atoms:
             if subtype == "Y":
                 self.atoms["Y"] = atom #only one atom total
             elif subtype == "C-":
                 self.atoms["C-"] = atom
             elif subtype == "C=C":
-                if molecule.OBMol.GetAtom(atom).GetAtomicNum() == 6:
+                if get_atomic_num(atom) == 6:
                     self.atoms["C1"] = atom
                     self.atoms["C2"] = atoms[-1]
                 break
             elif subtype == "Z=C":
-                if molecule.OBMol.GetAtom(atom).GetAtomicNum() == 6:
+                if get_atomic_num(atom) == 6:
                     self.atoms["C"] = atom
                 else:
                     self.atoms["Z"] = atom
@@ -0,0 +1,77 @@
+"""
+Tests that segmenting a copied molecule after a few bond edits finds the same pattern matches
+as segmenting it from scratch.
+"""
+
+import unittest
+
+from sic.segmentation import segmentation
+from sic.structure import patterns, struct_ops
+from sic.tests.molecules import make_molecule
+
+def get_full_groups(mol):
+    return dict((smarts,patterns.get_pattern(smarts).findall(mol)) for smarts in segmentation.PATTERN_INFO)
+
+class IncrementalSegmentationTest(unittest.TestCase):
+    def setUp(self):
+        self.incremental = segmentation.INCREMENTAL
+        segmentation.INCREMENTAL = True
+
+    def tearDown(self):
+        segmentation.INCREMENTAL = self.incremental
+
+    def checkEdit(self,smiles,edit):
+        """
+        Segments smiles, copies it, applies edit(copy) and compares the incremental matches with a full segmentation.
+        """
+
+        mol = make_molecule(smiles)
+        segmentation.segment_molecule(mol)
+        copy = struct_ops.copy_molecule(mol)
+        edit(copy)
+        self.assertTrue(copy.edit_log)
+        segmentation.segment_molecule(copy)
+        self.assertEqual(copy.segment_groups, get_full_groups(copy))
+        return mol,copy
+
+    def testProtonTransfer(self):
+        """
+        HCl + water: the chloride becomes a lone pair source and hydronium an acidic H.
+        """
+
+        def edit(mol):
+            struct_ops.make_bond(2,3,mol) #water O (2) onto the HCl hydrogen (3)
+            struct_ops.break_bond(3,1,mol) #Cl (1) leaves with the electrons
+        mol,copy = self.checkEdit("Cl.O",edit)
+        self.assertNotEqual(mol.segment_groups, copy.segment_groups)
+        self.assertEqual(mol.segment_groups, get_full_groups(mol)) #the parent's matches are left alone
+
+    def testDistantChange(self):
+        """
+        Matches far from the edit are carried over.
+        """
+
+        def edit(mol):
+            struct_ops.make_bond(8,17,mol) #water O (8) onto the HBr hydrogen (17)
+            struct_ops.break_bond(17,7,mol) #Br (7) leaves
+        self.checkEdit("C=CCCC(=O).Br.O",edit)
+
+    def testRing(self):
+        def edit(mol):
+            struct_ops.break_bond(1,2,mol)
+        self.checkEdit("C1CC=CCC1O",edit)
+
+    def testRingBond(self):
+        mol = make_molecule("C1CCCCC1O")
+        self.assertTrue(struct_ops.is_ring_bond(mol,1,2))
+        self.assertFalse(struct_ops.is_ring_bond(mol,6,7))
+
+    def testNoEdits(self):
+        mol = make_molecule("CC(=O)O")
+        segmentation.segment_molecule(mol)
+        copy = struct_ops.copy_molecule(mol)
+        segmentation.segment_molecule(copy)
+        self.assertEqual(copy.segment_groups, mol.segment_groups)
+
+if __name__ == "__main__":
+    unittest.main()
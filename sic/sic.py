@@ -15,15 +15,19 @@ import logging #for debug logs - worry about this later
 import traceback
 
 from sic.brain import decision_engine
+from sic.mapping import circuit_breaker, rdt, worker_pool
 from sic.sic_io import sic_io#for parsing SiC-format input files
 
-def find_mechanism(reac,prod,solv=False):
+def find_mechanism(reac,prod,solv=False,mapper=None,search=None,**search_options):
     """
     Where the magic happens. Finds the mechanism by copying the current reaction state into a
     new set of Molecule objects, generating choices, and picking the best one.
     Most of the work is done outside of this module, but the core is left here so that
     other programs (such as SiGC) can access the full functionality without
     having to import a bunch of stuff.
+    mapper picks the atom mapping backend by name (see sic/mapping/mappers.py), None for the default.
+    search picks how the mechanism is searched for by name (see decision_engine.SEARCHES), None for the default,
+    and any other keyword arguments are its options (e.g. width and depth for the beam search, see decision_engine.SEARCH_OPTIONS).
     """
 
     if not reac: 
@@ -34,11 +38,14 @@ def find_mechanism(reac,prod,solv=False):
     products = sic_io.create_state_smiles(prod)
     solvent = sic_io.create_state_smiles(solv) if solv else False
     try:
-        mech = decision_engine.get_mechanism(reactants,products,solvent=solvent)
+        mech = decision_engine.get_mechanism(reactants,products,solvent=solvent,mapper=mapper,search=search,**search_options)
     except ValueError as e:
         traceback.print_exception(e)
         # TODO: add more debugging levels so this doesn't have to print exceptions to the interface.
         return "ValueError Exception Caught:\n" + str(e).replace('\\n', '\n')
+    except (rdt.MappingTimeoutError,circuit_breaker.CircuitOpenError,worker_pool.PoolBusyError) as e:
+        traceback.print_exception(e)
+        return "Could not map the reaction right now, please try again later:\n" + str(e)
     return sic_io.write_up_mechanism(mech,solvent=solvent)
 
 #not sure why you'd want to import this package, but it's good practice to wrap all argparse calls in this
@@ -54,6 +61,11 @@ if __name__ == "__main__":
             Not currently implemented, and will raise a NotImplementedError",action="append")
     parser.add_argument("-g","--graphics",help="Produces a graphical representation of reactant, product, solvent, and intermediate \
             molecules. Not currently implemented, and will raise a NotImplementedError",action="store_true")
+    parser.add_argument("-m","--mapper",help="Atom mapper to use: rdt (ReactionDecoder, the default) or graph (in-process, no Java needed)")
+    parser.add_argument("--search",help="Mechanism search to use: greedy (the default), astar (best-first, finds the shortest mechanism) \
+            or beam (keeps the --beam-width most promising intermediates at each step)")
+    parser.add_argument("--beam-width",help="How many intermediates the beam search keeps at each step",type=int)
+    parser.add_argument("--beam-depth",help="How many steps the beam search takes before giving up",type=int)
     args = parser.parse_args()
     react_obj = False #will get filled in the if block below
     if args.solvent:
@@ -70,7 +82,12 @@ if __name__ == "__main__":
         else:
             print("Reactants and Products need to be provided, whether by input file or by arguments, in order for SiC³ to find a mechanism.")
             exit(1)
-    print(find_mechanism(react_obj["reactants"],react_obj["products"],solv=(react_obj["solvent"] if "solvent" in react_obj else False)))
+    search_options = {}
+    if args.beam_width is not None:
+        search_options["width"] = args.beam_width
+    if args.beam_depth is not None:
+        search_options["depth"] = args.beam_depth
+    print(find_mechanism(react_obj["reactants"],react_obj["products"],solv=(react_obj["solvent"] if "solvent" in react_obj else False),mapper=args.mapper,search=args.search,**search_options))
 
 
 
@@ -9,6 +9,7 @@ import os
 from flask import Flask, render_template, request
 
 from sic import sic
+from sic.mapping import cache, mappers
 
 app = Flask(__name__)
 
@@ -28,4 +29,21 @@ def accept_reaction():
         """
 
         if request.method == "POST":
-            return sic.find_mechanism(request.json["reactants"],request.json["products"],solv=request.json["solvent"]).replace("\n","<br>")
+            search_options = {}
+            for option in ("width","depth"):
+                value = request.json.get("beam_" + option)
+                if value is not None:
+                    try:
+                        search_options[option] = int(value)
+                    except (TypeError,ValueError):
+                        return "beam_{} has to be a whole number.".format(option),400
+            return sic.find_mechanism(request.json["reactants"],request.json["products"],solv=request.json["solvent"],mapper=request.json.get("mapper"),search=request.json.get("search"),**search_options).replace("\n","<br>")
+
+@app.route("/mapping_stats")
+def mapping_stats():
+        """
+        Shows the atom mappers' failure counters and the mapping cache's hit rate, for keeping an eye on mapping under load.
+        """
+
+        mapping_cache = cache.get_cache()
+        return {"mappers": mappers.get_stats(), "cache": {"hits": mapping_cache.hits, "misses": mapping_cache.misses}}
@@ -0,0 +1,78 @@
+"""
+The per-atom properties that pKa assignment, segmentation and generate_choices keep looking up (atomic numbers,
+formal charges, hydrogen counts and bonded atoms), read from OpenBabel once per state, instead of going through
+SWIG (obmol.GetAtom(atom_idx).GetAtomicNum() and the like) every time one of them needs one.
+
+A state's molecule is its parent's with a few bonds changed through struct_ops, which never adds or removes atoms
+and only changes the charges and hydrogens of the two atoms of each bond it edits (see struct_ops.make_bond and
+break_bond), so a state's snapshot is made from its parent's by reading only those atoms again.
+"""
+
+from collections import Counter
+
+from sic.structure import struct_ops
+
+class AtomSnapshot(object):
+    """
+    Per-atom properties of a molecule, as lists indexed by atom index (index 0 isn't an atom, like in OpenBabel):
+
+    - atomic_nums: the atomic number of every atom
+    - charges: the formal charge of every atom
+    - hydrogens: the number of hydrogens on every atom, explicit or implicit
+    - neighbors: the molecule's connectivity table, {atom_idx : set of bonded atoms} (None if it has none)
+
+    If parent (the snapshot of the molecule this one was copied from) is given, and the molecule's edit log
+    carries on from where it was when parent was taken, only the atoms of the bonds edited since are read again.
+    A snapshot is of the molecule as it is when it's taken; it doesn't follow later edits.
+    """
+
+    def __init__(self,molecule,parent=None):
+        obmol = molecule.OBMol
+        size = obmol.NumAtoms() + 1
+        self.edit_log = list(getattr(molecule,"edit_log",()))
+        self.neighbors = molecule.connectivity_table.connectivity_table if hasattr(molecule,"connectivity_table") else None
+        self.changes = {} #see get_changes
+        from_parent = parent is not None and len(parent.atomic_nums) == size and self.edit_log[:len(parent.edit_log)] == parent.edit_log
+        if from_parent:
+            self.atomic_nums = parent.atomic_nums #atoms never change element, so this is shared
+            self.charges = list(parent.charges)
+            self.hydrogens = list(parent.hydrogens)
+            atoms = set(atom_idx for bond in self.edit_log[len(parent.edit_log):] for atom_idx in bond)
+        else:
+            self.atomic_nums = [0] * size
+            self.charges = [0] * size
+            self.hydrogens = [0] * size
+            atoms = range(1,size)
+        for atom_idx in atoms:
+            atom = obmol.GetAtom(atom_idx)
+            if not from_parent:
+                self.atomic_nums[atom_idx] = atom.GetAtomicNum()
+            self.charges[atom_idx] = atom.GetFormalCharge()
+            self.hydrogens[atom_idx] = atom.ExplicitHydrogenCount() + atom.GetImplicitHCount()
+
+    def __repr__(self):
+        """
+        Returns a string representation of this object for easy debugging.
+        """
+        return "AtomSnapshot<Atoms:{},Edits:{}>".format(len(self.atomic_nums) - 1,len(self.edit_log))
+
+    def get_changes(self,molecule,since,radius):
+        """
+        Returns (changed,elements_within) for the bond edits logged since position since of molecule's edit log:
+        the atoms struct_ops.get_changed_atoms gives, and a list of radius + 1 Counters where the r-th counts the
+        elements of every atom at most r bonds from them (empty Counters if nothing changed).
+        The changed atoms and their surroundings are only looked for once per position, out to the largest radius
+        asked for so far, so pKa assignment and segmentation share them.
+        """
+
+        if since not in self.changes or self.changes[since][2] < radius:
+            changed = struct_ops.get_changed_atoms(molecule,since)
+            self.changes[since] = (changed,struct_ops.get_atoms_within(molecule,changed,radius),radius)
+        changed,distances,searched = self.changes[since]
+        elements_within = [Counter() for r in range(radius + 1)]
+        for atom_idx,distance in distances.items():
+            if distance <= radius:
+                elements_within[distance][self.atomic_nums[atom_idx]] += 1
+        for r in range(1,radius + 1):
+            elements_within[r].update(elements_within[r - 1])
+        return changed,elements_within
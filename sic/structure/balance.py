@@ -0,0 +1,81 @@
+"""
+Atom and charge balance checks for a reaction, done straight from the parsed Molecules.
+
+A reaction whose two sides don't have the same atoms or the same total charge can't be mapped and
+can't be reached by any mechanism, so we reject it before ReactionDecoder or the search ever see it.
+Hydrogens count, whether they are explicit atoms or implicit on their heavy atom.
+"""
+
+from collections import Counter
+
+from openbabel import openbabel
+
+HYDROGEN = 1
+
+class UnbalancedReactionError(ValueError):
+    """
+    Raised when reactants and products don't balance. Still a ValueError, so existing callers
+    (e.g. sic.find_mechanism) handle it as before, but carries the report from check_balance
+    so callers can tell the user exactly what is off.
+    """
+
+    def __init__(self,report):
+        self.report = report
+        ValueError.__init__(self,describe_imbalance(report))
+
+def get_tally(mol):
+    """
+    Returns a Counter of {atomic number : number of atoms} for a Molecule, including implicit hydrogens,
+    and the molecule's total formal charge.
+    """
+
+    elements = Counter()
+    charge = 0
+    for atom in openbabel.OBMolAtomIter(mol.OBMol):
+        elements[atom.GetAtomicNum()] += 1
+        elements[HYDROGEN] += atom.GetImplicitHCount()
+        charge += atom.GetFormalCharge()
+    return elements,charge
+
+def check_balance(reactants,products):
+    """
+    Compares the element and formal charge tallies of the reactant and product Molecules.
+    Returns a dictionary with the following keys:
+
+    - balanced: True if both sides have the same atoms and the same total charge
+    - elements: {element symbol : (count in reactants, count in products)}, only for the elements that differ
+    - charge: (total charge of reactants, total charge of products)
+    """
+
+    react_elements,react_charge = get_tally(reactants)
+    prod_elements,prod_charge = get_tally(products)
+    element_differences = {}
+    for atomicnum in sorted(set(react_elements) | set(prod_elements)):
+        if react_elements[atomicnum] != prod_elements[atomicnum]:
+            element_differences[openbabel.GetSymbol(atomicnum)] = (react_elements[atomicnum],prod_elements[atomicnum])
+    return {"balanced": not element_differences and react_charge == prod_charge,
+            "elements": element_differences,
+            "charge": (react_charge,prod_charge)}
+
+def validate_balance(reactants,products):
+    """
+    Raises an UnbalancedReactionError if the reactants and products don't balance.
+    """
+
+    report = check_balance(reactants,products)
+    if not report["balanced"]:
+        raise UnbalancedReactionError(report)
+    return report
+
+def describe_imbalance(report):
+    """
+    Writes a check_balance report out as a message for the user.
+    """
+
+    problems = []
+    for symbol,(react_count,prod_count) in report["elements"].items():
+        problems.append("{}: {} in reactants, {} in products".format(symbol,react_count,prod_count))
+    react_charge,prod_charge = report["charge"]
+    if react_charge != prod_charge:
+        problems.append("charge: {:+d} in reactants, {:+d} in products".format(react_charge,prod_charge))
+    return "Reactants and products are not balanced ({}).".format("; ".join(problems))
@@ -52,12 +52,16 @@ class ConnectivityTable(object):
         obmol = self.molecule.OBMol
         set_to_remove = self.get_bond_set(start_atom,end_atom)
         num_bonds = self.closer_to_product_table[set_to_remove]
-        if num_bonds > 1: #if it's got BO > 1, subtract 1 from closer_to_product table but not from the other
+        if num_bonds > 1 and "H" not in set_to_remove: #if it's got BO > 1, subtract 1 from closer_to_product table but not from the other
             self.closer_to_product_table[set_to_remove] -= 1
         else: #full remove
             self.connectivity_table[start_atom].remove(end_atom)
             self.connectivity_table[end_atom].remove(start_atom)
-            del self.closer_to_product_table[set_to_remove]
+            #bonds to H are all counted under one key per atom, so there the count is how many H are left, not a bond order
+            if num_bonds > 1:
+                self.closer_to_product_table[set_to_remove] -= 1
+            else:
+                del self.closer_to_product_table[set_to_remove]
 
     def __init__(self,mol):
         """
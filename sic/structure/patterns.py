@@ -0,0 +1,54 @@
+"""
+Compiled SMARTS patterns, shared by everything that matches the same expressions over and over:
+pKa assignment runs the whole PKA_CHART on every state (and again inside cross-checks), and
+segmentation runs all of SOURCES and SINKS.
+
+Making a pybel.Smarts parses the SMARTS string, which costs more than matching it against a textbook-sized
+molecule, so get_pattern parses each string once and hands back the same compiled pattern afterwards.
+
+An OBSmartsPattern keeps the results of its last match inside itself, so a compiled pattern can't be shared
+between threads (the server runs searches side by side). Each thread gets a registry of its own instead.
+"""
+
+import threading
+
+from openbabel import pybel
+
+_registry = threading.local()
+
+def get_registry():
+    """
+    Returns this thread's {SMARTS string : pybel.Smarts} dictionary.
+    """
+
+    if not hasattr(_registry,"patterns"):
+        _registry.patterns = {}
+    return _registry.patterns
+
+def get_pattern(smarts):
+    """
+    Returns the compiled pybel.Smarts for a SMARTS string, compiling it the first time this thread asks for it.
+    Raises an IOError for invalid SMARTS, same as pybel.Smarts.
+    """
+
+    patterns = get_registry()
+    pattern = patterns.get(smarts)
+    if pattern is None:
+        pattern = patterns[smarts] = pybel.Smarts(smarts)
+    return pattern
+
+def compile_all(smarts_strings):
+    """
+    Compiles every SMARTS string in smarts_strings up front, e.g. a pattern table at import time,
+    so the first state searched doesn't pay for it.
+    """
+
+    for smarts in smarts_strings:
+        get_pattern(smarts)
+
+def clear():
+    """
+    Forgets this thread's compiled patterns, so the next get_pattern calls compile them again.
+    """
+
+    get_registry().clear()
@@ -2,85 +2,117 @@
 Methods for getting properties of a structure rather than performing operations on it.
 Examines the degree of a carbon, for example.
 """
-import re
-from subprocess import run
-from pathlib import Path
+import concurrent.futures
+import threading
+
+from openbabel import openbabel
 
 from sic import utils
+from sic.mapping import cache, mappers
+from sic.structure import balance, struct_ops
 
 
-# FileName of the Reaction Decoder JAR, located next to runserver.py, up one directory from here.
-REACTION_DECODER_JAR = "rdt-2.5.0-SNAPSHOT-jar-with-dependencies.jar"
 HYDROGEN = 1
+MAPPING_THREADS = 4 #background threads for get_mapping_async; mappings mostly wait on a JVM, so threads are enough
+
+_mapping_executor = None
+_mapping_executor_lock = threading.Lock()
 
-def get_mapping(reactants,products):
+def get_mapping(reactants,products,mapper=None):
     """
     Gets the mapping between reactants and products.
-    TODO: Replace this with an algorithm that doesn't rely on ReactionDecoder.
-    Returns also the "ReactionDecoder canonical form" of reactants and products, since OpenBabel's canonical SMILES code
-    fails for charged species.
+    Returns also the "mapper canonical form" of reactants and products (for ReactionDecoder, the "ReactionDecoder canonical form"),
+    since OpenBabel's canonical SMILES code fails for charged species. The mapping's atom indices refer to these strings.
+    mapper picks the backend by name (see sic.mapping.mappers.MAPPERS), and defaults to mappers.DEFAULT_MAPPER.
+    Results are cached under the reactants>>products string (see sic.mapping.cache), so a reaction
+    that has been seen before is never mapped again.
+    Reactions that aren't balanced raise a balance.UnbalancedReactionError before any mapper runs.
+    If the mapper itself fails (a RuntimeError, e.g. ReactionDecoder timing out or its circuit breaker being open),
+    the reaction is mapped with mappers.FALLBACK_MAPPER when one is configured.
     """
 
-    mapping = {}
+    mapper = mapper if mapper else mappers.DEFAULT_MAPPER
+    map_function = mappers.get_mapper(mapper)
     #write out reactants/products string
     input_smiles = "%s>>%s" % (utils.write_mol(reactants),utils.write_mol(products))
-    jar_dir = Path(__file__).parent.parent
-    jar_path = jar_dir.joinpath(REACTION_DECODER_JAR)
-    if not Path(jar_path).exists():
-        raise RuntimeError("Can not find ReactionDecoder JAR", jar_path)
-    rdt_process = run(["java","-jar",jar_path,"-Q","SMI","-q",input_smiles,"-g","-j","AAM","-f","TEXT"], capture_output=True, text=True, cwd=jar_dir)
-    mapping_string = None
-    if rdt_process.stderr:
-        # TODO: so far seen output here with uneven numbers of atoms,
-        # this could probably be checked prior to calling RDT, and there may be other possible checks.
-        raise ValueError("Error from Reaction Decoder:\n" + rdt_process.stderr)
-    if rdt_process.stdout:
-        path_prefix = "Output is presented in text format: "
-        AAM_text_file_path = None
-        for stdout_line in rdt_process.stdout.split('\n'):
-            if stdout_line.startswith(path_prefix):
-                AAM_text_file_path = stdout_line[len(path_prefix):]
-                break
-        # get mapping string out of ECBLAST_smiles_AAM.txt file
-        if not AAM_text_file_path:
-            message = f"No output text file path found in RDT stdout. Looking for \"{path_prefix}\""
-            raise RuntimeError(message, rdt_process.stdout)
-        with open(AAM_text_file_path) as f:
-            file_content = f.readlines()
-            line_before_aam_mapping = "SELECTED AAM MAPPING\n"
-            mapping_index = file_content.index(line_before_aam_mapping) + 1
-            mapping_string = file_content[mapping_index].strip('\n')
-            print(line_before_aam_mapping + mapping_string)
-    if mapping_string:
-        #remove hydrogen-only maps - these are unlikely but they do come up and mess up the rest of our procedure
-        #also I'm not digging into their code to figure out why they do this only *sometimes*, I'm mad
-        #enough at Java as it is.
-        hydrogen_re = re.compile(r"\[H:[0-9]*\]")
-        mapping_string = hydrogen_re.sub("",mapping_string)
-        #split into reactant and product map
-        react_map,prod_map = mapping_string.split(">>")
-        #look for the [] groups
-        react_groups = re.findall(r"\[[^\]]+\]",react_map)
-        prod_groups = re.findall(r"\[[^\]]+\]",prod_map)
-        internal_mapping = {} #to make up for the H groups we excised. Most of the time this will just be a map from a number to itself, but gotta future-proof.
-        for i in range(len(react_groups)):
-            current_group = react_groups[i]
-            number = int(current_group.split(":")[-1].replace("]","")) 
-            internal_mapping[number] = i+1 #this should usually be the same...
-        #now map against products
-        for j in range(len(prod_groups)):  
-            current_group = prod_groups[j]
-            number = int(current_group.split(":")[-1].replace("]",""))
-            if number <= (i+1) :  # check if the number of atoms in the reactants is the same in the products
-                mapping[internal_mapping[number]] = j+1 #j+1 is the atom index in the product. internal_mapping[number] is the atom index in the reactant
-            else:
-                print("Oops! Wrong input. Please try again -_-")
-                break
-    else:
-        raise ValueError("Could not find map between reactants and products.")
-    print("Mapping is made ", (mapping))
-    return (mapping,react_map,prod_map) #so that we can use the actual strings as our input and avoid issues with OBabel's buggy SMILES code
+    cache_key = cache.get_key(input_smiles,mapper)
+    mapping_cache = cache.get_cache()
+    cached = mapping_cache.get(cache_key)
+    if cached:
+        return cached
+    balance.validate_balance(reactants,products)
+    try:
+        result = map_function(reactants,products)
+    except RuntimeError as e:
+        fallback = mappers.get_fallback(mapper)
+        if not fallback:
+            raise
+        print("{} mapper failed ({}), mapping with {} instead".format(mapper,e,fallback))
+        return get_mapping(reactants,products,mapper=fallback) #cached under the fallback's key, not this mapper's
+    mapping_cache.put(cache_key,result)
+    return result
+
+def get_mapping_async(reactants,products,mapper=None):
+    """
+    Starts get_mapping on a background thread and returns a concurrent.futures.Future for its result,
+    so callers can get on with work that doesn't need the mapping in the meantime.
+    The Molecules passed in belong to the background thread from then on; don't use them again.
+    """
+
+    global _mapping_executor
+    with _mapping_executor_lock:
+        if _mapping_executor is None:
+            _mapping_executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAPPING_THREADS,thread_name_prefix="sic_mapping")
+    return _mapping_executor.submit(get_mapping,reactants,products,mapper)
+
+def get_mappings(pairs,mapper=None):
+    """
+    Batch version of get_mapping for bulk runs (grading, pre-warming the cache): takes a list of
+    (reactants,products) Molecule pairs and maps all of the ones that aren't cached in one go,
+    which for ReactionDecoder means one JVM for the whole list rather than one per reaction.
+
+    Returns a list in the same order as pairs, with a dictionary for each pair:
+
+    - result: the (mapping,reactants,products) tuple get_mapping would have returned, or None
+    - error: the exception get_mapping would have raised, or None
+    """
 
+    mapper = mapper if mapper else mappers.DEFAULT_MAPPER
+    batch_function = mappers.get_batch_mapper(mapper)
+    mapping_cache = cache.get_cache()
+    results = [None] * len(pairs)
+    keys = []
+    to_map = [] #indices into pairs that aren't cached
+    for i,(reactants,products) in enumerate(pairs):
+        input_smiles = "%s>>%s" % (utils.write_mol(reactants),utils.write_mol(products))
+        keys.append(cache.get_key(input_smiles,mapper))
+        cached = mapping_cache.get(keys[i])
+        if cached:
+            results[i] = {"result": cached, "error": None}
+            continue
+        report = balance.check_balance(reactants,products)
+        if report["balanced"]:
+            to_map.append(i)
+        else:
+            results[i] = {"result": None, "error": balance.UnbalancedReactionError(report)}
+    if to_map:
+        mapped = batch_function([pairs[i] for i in to_map])
+        failed = [] #indices into pairs for the fallback mapper, if any
+        for i,outcome in zip(to_map,mapped):
+            if isinstance(outcome,RuntimeError):
+                failed.append(i)
+                results[i] = {"result": None, "error": outcome}
+            elif isinstance(outcome,Exception):
+                results[i] = {"result": None, "error": outcome}
+            else:
+                mapping_cache.put(keys[i],outcome)
+                results[i] = {"result": outcome, "error": None}
+        fallback = mappers.get_fallback(mapper) if failed else None
+        if fallback:
+            print("{} mapper failed on {} reactions, mapping them with {} instead".format(mapper,len(failed),fallback))
+            for i,outcome in zip(failed,get_mappings([pairs[i] for i in failed],mapper=fallback)):
+                results[i] = outcome
+    return results
 
 def get_carbon_degree(s_obj,carbon_label=False):
     """
@@ -142,6 +174,17 @@ def get_adjacent_ch(s_obj,carbon_label=False):
                 return bonded_atom #return first one found
     return False 
 
+def get_symmetry_classes(mol):
+    """
+    Takes in a Molecule object and returns a list with the graph symmetry class of each of its atoms,
+    indexed by atom index (index 0 is unused, atom indices start at 1).
+    Two atoms with the same class can be swapped without changing the molecule, e.g. the hydrogens of a methyl group.
+    """
+
+    classes = openbabel.vectorUnsignedInt()
+    openbabel.OBGraphSym(mol.OBMol).GetSymmetry(classes)
+    return [None] + list(classes)
+
 def remap_bonds(table,mapping):
     """
     Takes as input a closer_to_product_table, and returns a set of frozenset bonds
@@ -159,6 +202,53 @@ def remap_bonds(table,mapping):
         result_table[frozenset(atomlist)] = table[bond] #TODO: bug? what if the two atoms don't have a bond in the product?
     return result_table
 
+def get_atom_bonds(table):
+    """
+    Takes as input a closer_to_product_table and returns {atom_idx : {bond : order}} with the bonds of every non-H atom.
+    """
+
+    atom_bonds = {}
+    for bond,order in table.items():
+        for atom in bond:
+            if atom != "H":
+                atom_bonds.setdefault(atom,{})[bond] = order
+    return atom_bonds
+
+def get_spectator_fragments(mol1,mol2,mapping):
+    """
+    Takes in a reactant Molecule, a product Molecule and a mapping between them (same format as get_bond_distance),
+    and returns the spectator fragments of mol1, as a list of sets of atom indices.
+    A fragment is a spectator if its heavy atoms are mapped onto a whole fragment of mol2 with exactly the same bonds
+    (counting hydrogens per atom, like get_bond_distance) and formal charges, i.e. nothing has to happen to it.
+    Fragments of hydrogens only (H+, H-, H2) are never spectators, since they can't be mapped.
+    Both Molecule objects need a connectivity_table.
+    """
+
+    mol1_bonds = get_atom_bonds(mol1.connectivity_table.closer_to_product_table)
+    mol2_bonds = get_atom_bonds(mol2.connectivity_table.closer_to_product_table)
+    spectators = []
+    seen = set()
+    obmol1 = mol1.OBMol
+    obmol2 = mol2.OBMol
+    for atom_idx in range(1,obmol1.NumAtoms() + 1):
+        if atom_idx in seen:
+            continue
+        fragment = struct_ops.get_fragment_atoms(mol1,atom_idx)
+        seen.update(fragment)
+        heavy_atoms = [atom for atom in fragment if obmol1.GetAtom(atom).GetAtomicNum() != HYDROGEN]
+        if not heavy_atoms or any(atom not in mapping for atom in heavy_atoms):
+            continue
+        if any(obmol1.GetAtom(atom).GetFormalCharge() != obmol2.GetAtom(mapping[atom]).GetFormalCharge() for atom in heavy_atoms):
+            continue
+        fragment_bonds = {}
+        image_bonds = {} #every bond of the atoms the fragment is mapped onto
+        for atom in heavy_atoms:
+            fragment_bonds.update(mol1_bonds.get(atom,{}))
+            image_bonds.update(mol2_bonds.get(mapping[atom],{}))
+        if remap_bonds(fragment_bonds,mapping) == image_bonds:
+            spectators.append(fragment)
+    return spectators
+
 def get_bond_distance(mol1,mol2,mapping):
     """
     Gets the difference in bonds between two Molecule objects, using a 1:1 atom-to-atom mapping between them.
@@ -201,3 +291,24 @@ def get_bond_distance(mol1,mol2,mapping):
             difference_counter += mol2_bonds[bond] 
     return difference_counter
 
+
+def get_state_key(mol):
+    """
+    Returns a hashable key for mol that two molecules of the same mechanism (same atom indexing) share exactly when
+    get_bond_distance can't tell them apart and their atoms carry the same charges: the bonds and bond orders of the
+    closer_to_product table (which only counts hydrogens per atom, so molecules that only differ in which hydrogen went
+    where share a key) and every charged atom, heavy atoms by index and hydrogens just by charge.
+    Like get_bond_distance, assumes mol has a connectivity table.
+    """
+
+    bonds = frozenset((bond,order) for bond,order in mol.connectivity_table.closer_to_product_table.items() if order)
+    charges = []
+    hydrogen_charges = []
+    for atom in openbabel.OBMolAtomIter(mol.OBMol):
+        charge = atom.GetFormalCharge()
+        if charge:
+            if atom.GetAtomicNum() == HYDROGEN:
+                hydrogen_charges.append(charge)
+            else:
+                charges.append((atom.GetIdx(),charge))
+    return (bonds,tuple(charges),tuple(sorted(hydrogen_charges)))
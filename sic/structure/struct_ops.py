@@ -18,14 +18,229 @@ def copy_molecule(mol):
     intermediate = openbabel.OBMol(mol.OBMol) #Molecule's constructor only takes OBMol objects, so first copy the one from the original
     #using the OBMol constructor, which copies all atoms
     new_mol = pybel.Molecule(intermediate) #add it to a new Molecule object
+    copy_attributes(mol,new_mol)
+    if hasattr(mol,"connectivity_table"):
+        new_mol.connectivity_table = ConnectivityTable(new_mol)
+    return new_mol
+
+def copy_attributes(mol,new_mol):
+    """
+    Gives new_mol (a copy of mol, or of a molecule mol was copied from and edited since) the pKa values and
+    search bookkeeping copy_molecule copies, but not a connectivity table.
+    """
+
     #copy the properties only in the case when they aren't there, to prevent strange bugs
     #when people call this function as a utility for other purposes.
     if hasattr(mol,"pka_index"):
-        new_mol.pka_index = mol.pka_index
-    if hasattr(mol,"connectivity_table"):
-        new_mol.connectivity_table = ConnectivityTable(new_mol)
+        new_mol.pka_index = mol.pka_index #never changed once built (see PkaIndex), so the copy can share it
+    if hasattr(mol,"pka_matches"):
+        #never modified in place, so the copy can share them until its own get_all_pka
+        new_mol.pka_matches = mol.pka_matches
+        new_mol.pka_synced = mol.pka_synced
+    if hasattr(mol,"segment_groups"):
+        new_mol.segment_groups = mol.segment_groups #same as pka_matches
+        new_mol.segment_synced = mol.segment_synced
+    if hasattr(mol,"edit_log"):
+        new_mol.edit_log = list(mol.edit_log)
+
+def get_molecule_table(molecule):
+    """
+    Returns molecule's atoms and bonds as plain tuples, which unlike OpenBabel's objects can be pickled (e.g. to send
+    to another process), for read_molecule_table to turn back into a Molecule with the same atom indices, hydrogens
+    included, and its bonds in the same order, as a copy_molecule copy would have:
+    (title, dimension, atoms, bonds, aromatic), with (atomic number, isotope, formal charge, implicit hydrogens, aromatic)
+    for every atom and (start, end, bond order, aromatic) for every bond.
+    Aromaticity is only given if OpenBabel already worked it out for molecule (aromatic is False otherwise).
+    The dimension has to go along too: molecules read from SMILES have none, and OpenBabel would otherwise find
+    stereocentres in the (all zero) coordinates of a rebuilt one.
+    """
+
+    obmol = molecule.OBMol
+    aromatic = obmol.HasAromaticPerceived()
+    atoms = tuple((atom.GetAtomicNum(),atom.GetIsotope(),atom.GetFormalCharge(),atom.GetImplicitHCount(),aromatic and atom.IsAromatic())
+                  for atom in openbabel.OBMolAtomIter(obmol))
+    bonds = tuple((bond.GetBeginAtomIdx(),bond.GetEndAtomIdx(),bond.GetBondOrder(),aromatic and bond.IsAromatic())
+                  for bond in openbabel.OBMolBondIter(obmol))
+    return (obmol.GetTitle(),obmol.GetDimension(),atoms,bonds,aromatic)
+
+def read_molecule_table(table):
+    """
+    Builds the Molecule get_molecule_table gave table for, with a connectivity table but nothing else the program
+    attaches to molecules (see copy_attributes).
+    """
+
+    title,dimension,atoms,bonds,aromatic = table
+    obmol = openbabel.OBMol()
+    obmol.BeginModify()
+    for atomic_num,isotope,charge,implicit_hydrogens,atom_aromatic in atoms:
+        atom = obmol.NewAtom()
+        atom.SetAtomicNum(atomic_num)
+        atom.SetIsotope(isotope)
+        atom.SetFormalCharge(charge)
+        atom.SetImplicitHCount(implicit_hydrogens)
+    for start,end,order,bond_aromatic in bonds:
+        obmol.AddBond(start,end,order)
+    obmol.EndModify()
+    obmol.SetTitle(title)
+    obmol.SetDimension(dimension)
+    if aromatic:
+        for atom,row in zip(openbabel.OBMolAtomIter(obmol),atoms):
+            atom.SetAromatic(row[4])
+        for bond,row in zip(openbabel.OBMolBondIter(obmol),bonds):
+            bond.SetAromatic(row[3])
+        obmol.SetAromaticPerceived()
+    new_mol = pybel.Molecule(obmol)
+    new_mol.connectivity_table = ConnectivityTable(new_mol)
     return new_mol
 
+def copy_stereo(mol,new_mol):
+    """
+    Gives new_mol (see copy_attributes) the stereo OpenBabel has worked out for mol, and makes it take that as
+    its own like OBMol's operator= does, so it writes the same SMILES a copy_molecule copy would have.
+    """
+
+    for data in mol.OBMol.GetAllData(openbabel.StereoData):
+        new_mol.OBMol.CloneData(data)
+    if mol.OBMol.HasChiralityPerceived():
+        new_mol.OBMol.SetChiralityPerceived()
+
+def extract_fragment(molecule,atoms):
+    """
+    Copies just the atoms in atoms (e.g. a connected fragment from get_fragment_atoms) and the bonds between
+    them into a new Molecule with its own connectivity table, for when copy_molecule would copy far more than needed.
+    Returns (new Molecule, {atom_idx in molecule : atom_idx in the new Molecule}).
+    Atoms keep their relative order, and nothing else the program attaches to molecule is copied.
+    Aromaticity is copied over if OpenBabel already worked it out for molecule, like copying the OBMol would,
+    so bond edits on the fragment behave the same as on a copy_molecule copy.
+    """
+
+    obmol = molecule.OBMol
+    table = molecule.connectivity_table.connectivity_table
+    fragment = openbabel.OBMol()
+    new_indices = {}
+    fragment.BeginModify()
+    for atom_idx in sorted(atoms):
+        atom = obmol.GetAtom(atom_idx)
+        new_atom = fragment.NewAtom()
+        new_atom.SetAtomicNum(atom.GetAtomicNum())
+        new_atom.SetIsotope(atom.GetIsotope())
+        new_atom.SetFormalCharge(atom.GetFormalCharge())
+        new_atom.SetImplicitHCount(atom.GetImplicitHCount())
+        new_indices[atom_idx] = new_atom.GetIdx()
+    bonds = []
+    for atom_idx in new_indices:
+        for bonded in table.get(atom_idx,()):
+            if atom_idx < bonded and bonded in new_indices:
+                bond = obmol.GetBond(atom_idx,bonded)
+                fragment.AddBond(new_indices[atom_idx],new_indices[bonded],bond.GetBondOrder())
+                bonds.append((bond,fragment.GetBond(new_indices[atom_idx],new_indices[bonded])))
+    fragment.EndModify()
+    if obmol.HasAromaticPerceived():
+        for atom_idx,new_idx in new_indices.items():
+            fragment.GetAtom(new_idx).SetAromatic(obmol.GetAtom(atom_idx).IsAromatic())
+        for bond,new_bond in bonds:
+            new_bond.SetAromatic(bond.IsAromatic())
+        fragment.SetAromaticPerceived()
+    new_mol = pybel.Molecule(fragment)
+    new_mol.connectivity_table = ConnectivityTable(new_mol)
+    return new_mol,new_indices
+
+def record_edit(start,end,molecule):
+    """
+    Notes that the bond between start and end changed, so that whatever keeps results for a molecule
+    (e.g. pka.get_all_pka) can update only what the edit could have affected (see get_changed_atoms).
+    Molecules only keep an edit log once something has started one by setting molecule.edit_log to a list.
+    """
+
+    if hasattr(molecule,"edit_log"):
+        molecule.edit_log.append((start,end))
+
+def get_changed_atoms(molecule,since=0):
+    """
+    Returns the set of atoms whose surroundings changed in the edits logged since position since of
+    molecule.edit_log: both ends of every edited bond, plus the whole fragment for every edited bond
+    that is or was in a ring, since ring membership and aromaticity can change for every atom in the ring.
+    """
+
+    edits = set(molecule.edit_log[since:])
+    changed = set()
+    for start,end in edits:
+        changed.update((start,end))
+    for start,end in edits:
+        if is_ring_bond(molecule,start,end): #or was one before it broke
+            changed.update(get_fragment_atoms(molecule,start))
+    return changed
+
+def is_ring_bond(molecule,start,end):
+    """
+    Returns True if start and end are still connected without a bond between them, i.e. a bond between them
+    is (or would be) part of a ring.
+    Searches from both ends at once and stops as soon as either side runs out of atoms, so telling a bond
+    to a hydrogen or a small group apart from a ring bond doesn't walk the rest of the molecule.
+    """
+
+    table = molecule.connectivity_table.connectivity_table
+    seen = [set([start]),set([end])]
+    to_visit = [[start],[end]]
+    while to_visit[0] and to_visit[1]:
+        side = 0 if len(to_visit[0]) <= len(to_visit[1]) else 1
+        own,other = seen[side],seen[1 - side]
+        current = to_visit[side].pop()
+        for bonded in table.get(current,()):
+            if bonded in own or (current in (start,end) and bonded in (start,end)):
+                continue
+            if bonded in other:
+                return True
+            own.add(bonded)
+            to_visit[side].append(bonded)
+    return False
+
+def get_fragment_atoms(molecule,atom,ignore_bond=None):
+    """
+    Returns the set of atoms in the same connected fragment as atom, using the molecule's connectivity table.
+    If ignore_bond is a (start,end) pair, the search acts as if that bond wasn't there.
+    """
+
+    table = molecule.connectivity_table.connectivity_table
+    ignored = set(ignore_bond) if ignore_bond else set()
+    fragment = set([atom])
+    to_visit = [atom]
+    while to_visit:
+        current = to_visit.pop()
+        for bonded in table.get(current,()):
+            if bonded in fragment or (current in ignored and bonded in ignored):
+                continue
+            fragment.add(bonded)
+            to_visit.append(bonded)
+    return fragment
+
+def get_atoms_within(molecule,atoms,radius):
+    """
+    Returns {atom_idx : number of bonds to the nearest of atoms} for every atom at most radius bonds away from them.
+    """
+
+    table = molecule.connectivity_table.connectivity_table
+    distances = dict((atom,0) for atom in atoms)
+    layer = list(distances)
+    for distance in range(1,radius + 1):
+        next_layer = []
+        for current in layer:
+            for bonded in table.get(current,()):
+                if bonded not in distances:
+                    distances[bonded] = distance
+                    next_layer.append(bonded)
+        layer = next_layer
+    return distances
+
+def forget_rings(obmol):
+    """
+    Makes OpenBabel find an OBMol's rings again the next time it needs them. It keeps the rings it found,
+    with pointers to their bonds, through AddBond and DeleteBond, so after either they're out of date,
+    and writing SMILES from a molecule whose saved rings point to deleted bonds can crash the process.
+    """
+
+    obmol.UnsetFlag(openbabel.OB_SSSR_MOL | openbabel.OB_LSSR_MOL | openbabel.OB_RINGFLAGS_MOL | openbabel.OB_RINGTYPES_MOL | openbabel.OB_CLOSURE_MOL)
+
 def make_bond(start,end,molecule):
     """
     Makes a bond between two atoms by updating connectivity tables in a modified Pybel Molecule object.
@@ -55,11 +270,13 @@ def make_bond(start,end,molecule):
         if not success:
             raise ValueError("AddBond failed for bond between %s (atomno: %s) and %s (atomno: %s)."
                                 %(start,start_atom.GetAtomicNum(),end,end_atom.GetAtomicNum()))
+        forget_rings(obmol)
     start_atom.SetFormalCharge(start_atom.GetFormalCharge() + 1)
     end_atom.SetFormalCharge(end_atom.GetFormalCharge() - 1)
     #update the connectivity table if the molecule has one - it always should, but callers of this library might not think of that.
     if hasattr(molecule,"connectivity_table"):
         molecule.connectivity_table.add_bond(start,end)
+    record_edit(start,end,molecule)
 
 def break_bond(start,end,molecule):
     """
@@ -85,6 +302,7 @@ def break_bond(start,end,molecule):
             if not success:
                 raise ValueError("DeleteBond failed for bond between %s (atomno: %s) and %s (atomno: %s)."
                                             %(start,start_atom.GetAtomicNum(),end,end_atom.GetAtomicNum()))
+            forget_rings(obmol)
     else:
         raise ValueError("Bond not found between %s (atomno: %s) and %s (atomno: %s)."
                 %(start,start_atom.GetAtomicNum(),end,end_atom.GetAtomicNum()))
@@ -92,3 +310,4 @@ def break_bond(start,end,molecule):
     end_atom.SetFormalCharge(obmol.GetAtom(end).GetFormalCharge() - 1)
     if hasattr(molecule,"connectivity_table"):
         molecule.connectivity_table.remove_bond(start,end) # 
+    record_edit(start,end,molecule)
@@ -0,0 +1,46 @@
+"""
+Tests the atom and charge balance checks that run before mapping.
+"""
+
+import unittest
+
+from openbabel.pybel import readstring
+
+from sic.structure import balance
+
+class BalanceTest(unittest.TestCase):
+    def testBalanced(self):
+        report = balance.check_balance(readstring("smi","CC(O)(C)C.Cl"),readstring("smi","CC(Cl)(C)C.O"))
+        self.assertTrue(report["balanced"])
+        self.assertEqual(report["elements"], {})
+
+    def testExplicitHydrogens(self):
+        """
+        Explicit and implicit hydrogens should count the same.
+        """
+
+        reactants = readstring("smi","Cl.[OH-]")
+        reactants.addh()
+        self.assertTrue(balance.check_balance(reactants,readstring("smi","O.[Cl-]"))["balanced"])
+
+    def testMissingAtoms(self):
+        """
+        Solvent that takes part in the reaction but is left off the reactants (in.11) should be caught.
+        """
+
+        report = balance.check_balance(readstring("smi","CC(C)(Cl)C"),readstring("smi","[Cl-].OC(C)(C)C.[OH3+]"))
+        self.assertFalse(report["balanced"])
+        self.assertEqual(report["elements"]["O"], (0,2))
+        self.assertEqual(report["elements"]["H"], (9,13))
+
+    def testCharge(self):
+        report = balance.check_balance(readstring("smi","[OH-]"),readstring("smi","[OH2]"))
+        self.assertFalse(report["balanced"])
+        self.assertEqual(report["charge"], (-1,0))
+
+    def testValidateRaises(self):
+        with self.assertRaises(ValueError):
+            balance.validate_balance(readstring("smi","CCO"),readstring("smi","CC"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -60,5 +60,19 @@ class ConnectivityTableTest(unittest.TestCase):
         self.assertNotIn(5, ctable.get_atoms_bonded(2))
         self.assertNotIn(2, ctable.get_atoms_bonded(5))
 
+    def testRemoveOneOfSeveralHydrogens(self):
+        """
+        Bonds to H are counted together per atom in the closer to product table, so taking one H off water
+        leaves a count of 1 there, but that H still has to go from the regular table.
+        """
+
+        ctable = self.mol.connectivity_table #typing is hard
+        O = self.sources[0].get_atom("Y")
+        H = next(atom for atom in ctable.get_atoms_bonded(O) if self.mol.OBMol.GetAtom(atom).GetAtomicNum() == 1)
+        struct_ops.break_bond(O,H,self.mol)
+        self.assertNotIn(H, ctable.get_atoms_bonded(O))
+        self.assertNotIn(O, ctable.get_atoms_bonded(H))
+        self.assertEqual(ctable.get_bond_degree(frozenset([O,"H"])), 1)
+
 if __name__ == "__main__":
     unittest.main()
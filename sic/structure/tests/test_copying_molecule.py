@@ -84,6 +84,23 @@ class MoleculeCopyAndModifyTest(unittest.TestCase):
         struct_ops.break_bond(H,L,copy_mol)
         self.assertEqual(copy_mol.write("can"), self.prod_mol.write("can"))
         self.assertNotEqual(self.orig_mol.write("can"), copy_mol.write("can"))
+    def testExtractFragment(self):
+        """
+        Extracting one fragment copies its atoms, charges and bonds, and leaves the original alone.
+        """
+
+        orig_mol = pybel.readstring("smi","CC(=O)[O-].[Na+]")
+        orig_mol.addh()
+        orig_mol.connectivity_table = connectivity_table.ConnectivityTable(orig_mol)
+        orig_smiles = orig_mol.write("can",opt={"h":None}).split()[0]
+        atoms = struct_ops.get_fragment_atoms(orig_mol,1)
+        fragment,new_indices = struct_ops.extract_fragment(orig_mol,atoms)
+        self.assertEqual(fragment.write("can",opt={"h":None}).split()[0], orig_smiles.split(".")[0])
+        self.assertEqual(len(new_indices), len(fragment.atoms))
+        for atom_idx,new_idx in new_indices.items():
+            self.assertEqual(fragment.OBMol.GetAtom(new_idx).GetAtomicNum(), orig_mol.OBMol.GetAtom(atom_idx).GetAtomicNum())
+        struct_ops.break_bond(new_indices[2],new_indices[3],fragment)
+        self.assertEqual(orig_mol.write("can",opt={"h":None}).split()[0], orig_smiles)
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,38 @@
+"""
+Tests the compiled SMARTS registry: patterns are compiled once per thread and match like fresh ones.
+"""
+
+import threading
+import unittest
+
+from openbabel import pybel
+
+from sic.structure import patterns
+
+class PatternsTest(unittest.TestCase):
+    def testReused(self):
+        self.assertIs(patterns.get_pattern("[OX2H]"), patterns.get_pattern("[OX2H]"))
+
+    def testMatches(self):
+        mol = pybel.readstring("smi","OCCO")
+        self.assertEqual(patterns.get_pattern("[OX2H]").findall(mol), pybel.Smarts("[OX2H]").findall(mol))
+
+    def testClear(self):
+        pattern = patterns.get_pattern("[OX2H]")
+        patterns.clear()
+        self.assertIsNot(patterns.get_pattern("[OX2H]"), pattern)
+
+    def testPerThread(self):
+        """
+        Compiled patterns hold their last match, so threads must not share them.
+        """
+
+        pattern = patterns.get_pattern("[OX2H]")
+        other = []
+        thread = threading.Thread(target=lambda: other.append(patterns.get_pattern("[OX2H]")))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], pattern)
+
+if __name__ == "__main__":
+    unittest.main()
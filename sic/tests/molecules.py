@@ -0,0 +1,18 @@
+"""
+Molecules for the unit tests, set up the way the tests need them.
+"""
+
+from openbabel.pybel import readstring
+
+from sic.structure import connectivity_table
+
+def make_molecule(smiles):
+    """
+    Reads smiles into a Molecule with explicit hydrogens and a connectivity table,
+    which is all most of the code under test needs.
+    """
+
+    mol = readstring("smi",smiles)
+    mol.addh()
+    mol.connectivity_table = connectivity_table.ConnectivityTable(mol)
+    return mol
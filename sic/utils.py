@@ -48,13 +48,12 @@ def deepcopy_ignoring_mol(item,new_mol):
     not support it directly.
     """
 
-    new_mol_atoms = new_mol.atoms #for copying Atom objects
     if isinstance(item,dict):
         return dict([(kv[0], deepcopy_ignoring_mol(kv[1],new_mol)) for kv in list(item.items())])
     elif isinstance(item,Molecule):
         return new_mol
     elif isinstance(item,Atom):
-        return new_mol_atoms[item.idx-1]
+        return new_mol.atoms[item.idx-1] #Molecule.atoms makes every Atom object, so only for Atoms
     elif isinstance(item,Source):
         item.molecule = new_mol
         return item